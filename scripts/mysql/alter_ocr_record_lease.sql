@@ -0,0 +1,7 @@
+-- 已有库升级：OCR记录处理租约（多个拉取实例通过 SELECT ... FOR UPDATE SKIP LOCKED 领取互不重叠的记录）
+alter table t_gec_file_ocr_record
+    modify ai_status tinyint null comment 'AI状态 0:未处理 1:处理成功 -1:处理失败 2:处理中',
+    add column ai_lease_owner varchar(64) null comment 'AI处理租约持有者（拉取实例标识）' after ai_content,
+    add column ai_lease_until datetime    null comment 'AI处理租约到期时间' after ai_lease_owner;
+
+create index idx_ai_status_lease on t_gec_file_ocr_record (ai_status, ai_lease_until);
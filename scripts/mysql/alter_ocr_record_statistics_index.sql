@@ -0,0 +1,2 @@
+-- 已有库升级：状态统计的覆盖索引（/api/ocr-records/statistics 按电站编号关联后在索引内完成聚合，无需回表）
+create index idx_business_status on t_gec_file_ocr_record (business_id, is_delete, ai_status);
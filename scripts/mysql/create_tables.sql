@@ -9,7 +9,9 @@ create table t_gec_file_ocr_record
     name            varchar(100)                       null comment '文件名字',
     content         text                               null comment '文件扫描内容',
     ai_task_id      varchar(200)                       null comment 'AI任务ID',
-    ai_status       tinyint                            null comment 'AI状态 0:未处理 1:处理成功 -1:处理失败',
+    ai_status       tinyint                            null comment 'AI状态 0:未处理 1:处理成功 -1:处理失败 2:处理中',
+    ai_lease_owner  varchar(64)                        null comment 'AI处理租约持有者（拉取实例标识）',
+    ai_lease_until  datetime                           null comment 'AI处理租约到期时间',
     ai_content      text                               null comment 'AI文件扫描内容',
     url             varchar(350)                       null comment '文件url',
     job_id          varchar(200)                       null comment '任务id',
@@ -29,5 +31,10 @@ create table t_gec_file_ocr_record
 )
     comment '文件ocr扫描记录表' row_format = DYNAMIC;
 
+create index idx_ai_status_lease on t_gec_file_ocr_record (ai_status, ai_lease_until);
+
+-- 状态统计的覆盖索引（按电站编号关联后只读取 is_delete、ai_status，无需回表）
+create index idx_business_status on t_gec_file_ocr_record (business_id, is_delete, ai_status);
+
 
 
@@ -1,7 +1,14 @@
+import logging
+import importlib.util
 from celery import Celery
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from src.configs.logging_config import setup_celery_logging, LogConfig
+from src.tools.payload_stats import install_size_histogram
+
+# 安装了msgpack时任务与结果可使用二进制序列化，安装了zstandard时可使用zstd压缩
+MSGPACK_AVAILABLE = importlib.util.find_spec("msgpack") is not None
+ZSTD_AVAILABLE = importlib.util.find_spec("zstandard") is not None
 
 
 
@@ -10,16 +17,38 @@ class CeleryConfig(BaseSettings):
     CELERY_TASK_QUEUE_CHANNEL: str = "task_queue"
     """Celery 核心配置类（从环境变量或 .env 文件加载配置）"""
 
+    # 任务投递方式：pubsub（频道发布，默认）| stream（Redis Stream消费组，持久化、每条只分发一次）
+    CELERY_TASK_TRANSPORT: str = "pubsub"
+    CELERY_TASK_STREAM: str = "task_stream"  # 任务Stream键名（不裁剪，已确认的条目会立即删除，长度即积压量）
+    CELERY_TASK_STREAM_GROUP: str = "task_dispatchers"  # 分发器消费组名
+    CELERY_TASK_STREAM_DEAD_LETTER: str = "task_stream:dead"  # 无法解析或投递失败的条目转存的死信Stream
+    CELERY_TASK_STREAM_DEAD_LETTER_MAXLEN: int = 10000  # 死信Stream长度上限（近似裁剪，只保留最近的条目）
+    CELERY_TASK_STREAM_BATCH: int = 100  # 每次读取的条目数
+    CELERY_TASK_STREAM_BLOCK_MS: int = 2000  # 无新条目时阻塞等待时间（毫秒，须小于Redis socket_timeout）
+    CELERY_TASK_STREAM_CLAIM_IDLE_MS: int = 60000  # 已读取未确认超过该时间的条目由其他分发器接管（毫秒）
+    CELERY_TASK_PUBLISH_CHUNK: int = 500  # 批量发布时每个Redis pipeline包含的任务数
+
+    # OCR任务按发布时的分类投递到独立队列（需启动对应队列的Worker，见 src/celery_app/queue_worker.py）
+    CELERY_OCR_QUEUE_ROUTING: bool = False
+    # 各队列Worker配置：并发数、预取倍数、单任务最大执行时间（秒，软超时为其90%）
+    CELERY_OCR_QUEUE_PROFILES: Dict[str, Dict[str, int]] = {
+        "ocr_image": {"concurrency": 8, "prefetch_multiplier": 4, "time_limit": 120},  # 纯图片记录：短任务、高并发
+        "ocr_pdf": {"concurrency": 4, "prefetch_multiplier": 1, "time_limit": 900},  # 普通PDF记录
+        "ocr_pdf_large": {"concurrency": 2, "prefetch_multiplier": 1, "time_limit": 3000},  # 大PDF记录：长任务、不预取
+    }
+
     # 消息代理地址（用于任务队列）
     CELERY_BROKER_URL: str = "redis://:123456@localhost:6379/0"
     # 结果存储地址（用于任务结果持久化）
     CELERY_RESULT_BACKEND: str = "redis://:123456@localhost:6379/0"
-    # 任务序列化格式（确保跨进程通信数据一致性）
+    # 任务序列化格式：json | msgpack（二进制，体积更小，需另行安装msgpack，未安装时回退为json）
     CELERY_TASK_SERIALIZER: str = "json"
-    # 允许接收的内容类型（限制客户端可发送的任务数据格式）
+    # 允许接收的内容类型（始终包含json与所用序列化格式，滚动升级期间新旧格式的消息都能处理）
     CELERY_ACCEPT_CONTENT: list[str] = ["json"]
     # 结果序列化格式（与任务序列化保持一致）
     CELERY_RESULT_SERIALIZER: str = "json"
+    # 任务消息压缩：空（不压缩）| zlib | zstd（需安装zstandard，未安装时回退为zlib）
+    CELERY_TASK_COMPRESSION: Optional[str] = None
     # 任务结果过期时间（秒），自动清理旧结果释放存储
     CELERY_RESULT_EXPIRES: int = 3600
     # 时区设置（任务时间展示使用上海时区）
@@ -34,6 +63,7 @@ class CeleryConfig(BaseSettings):
     CELERY_TASK_ACKS_LATE: bool = True  # 任务执行完成后再确认（避免Worker崩溃丢失任务）
     CELERY_TASK_QUEUES_MAX_LENGTH: int = 5  # 队列最大长度（需配合Broker配置生效）
     CELERY_TASK_TIME_LIMIT: int = 300  # 单个任务最大执行时间（秒）
+    CELERY_BROKER_VISIBILITY_TIMEOUT: int = 3600  # Redis broker：已取出未确认的消息超过该时间（秒）重新投递
 
     # 新增：连接池大小（默认无连接池，频繁创建连接易断开）
     CELERY_BROKER_POOL_LIMIT: int  # 无默认值，从环境变量获取
@@ -42,6 +72,22 @@ class CeleryConfig(BaseSettings):
     CELERY_FETCH_TASKS_INTERVAL: int  # 任务执行间隔(秒)
     CELERY_FETCH_TASKS_LIMIT: int    # 任务数量限制
     CELERY_FETCH_TASKS_AI_STATUS: int  # AI状态筛选值
+    # 拉取背压：按积压量（排队+处理中）与完成速率确定每轮拉取数量，CELERY_FETCH_TASKS_LIMIT 为单轮上限
+    CELERY_FETCH_BACKPRESSURE: bool = True
+    CELERY_FETCH_TARGET_BACKLOG: int = 50  # 目标积压量（排队+处理中的OCR任务数）
+    CELERY_FETCH_HIGH_WATER: int = 200  # 积压量达到该值时跳过本轮拉取
+    CELERY_FETCH_RATE_WINDOW: int = 300  # 完成速率统计窗口（秒）
+    # 领取记录：SELECT ... FOR UPDATE SKIP LOCKED 置为处理中（ai_status=2）并写入租约，多个拉取实例互不重叠
+    # 需MySQL 8.0+，且已有库需先执行 scripts/mysql/alter_ocr_record_lease.sql；未启用时不访问租约列
+    CELERY_FETCH_CLAIM: bool = False
+    CELERY_FETCH_LEASE_SECONDS: int = 7200  # 领取租约时长（秒），应覆盖排队与处理时间，到期未完成由回收任务重置
+    CELERY_FETCH_LEASE_REAP_INTERVAL: int = 300  # 回收到期租约的定时任务间隔（秒）
+    CELERY_FETCH_PARTITIONS: int = 1  # 拉取分区总数（按记录id取模）
+    CELERY_FETCH_PARTITION: int = 0  # 本实例负责的分区序号
+    # 增量扫描：按id区间从Redis中保存的游标继续扫描，到达表尾后环绕，每条待处理记录最终都会被访问
+    CELERY_FETCH_SCAN: bool = True
+    CELERY_FETCH_SCAN_RANGE: int = 5000  # 每次查询覆盖的id区间大小
+    CELERY_FETCH_SCAN_MAX_RANGES: int = 20  # 每轮最多扫描的区间数
 
     # 定时任务调度配置（键为任务名称，值为任务详情）
     CELERY_BEAT_SCHEDULE: Dict[str, Any] = {
@@ -69,6 +115,55 @@ app = Celery(__name__)
 # 创建 Celery 配置实例（自动加载环境变量/.env 文件）
 config = CeleryConfig()
 
+
+def get_celery_config() -> CeleryConfig:
+    """获取进程内共享的Celery配置实例（发布任务等高频路径使用，避免每次重新解析.env）"""
+    return config
+
+
+def queue_options(queue: str | None) -> Dict[str, Any]:
+    """
+    OCR分类队列的投递参数（队列名与该队列的执行时间限制，软超时为其90%）
+
+    未开启队列路由或队列未配置时返回空字典（走默认路由）
+    """
+    profile = config.CELERY_OCR_QUEUE_PROFILES.get(queue) if config.CELERY_OCR_QUEUE_ROUTING else None
+    if profile is None:
+        return {}
+    return {
+        "queue": queue,
+        "time_limit": profile["time_limit"],
+        "soft_time_limit": int(profile["time_limit"] * 0.9),
+    }
+
+
+def resolve_serializer(name: str) -> str:
+    """序列化格式降级：配置为msgpack但未安装时使用json"""
+    if name == "msgpack" and not MSGPACK_AVAILABLE:
+        logging.getLogger("celery").warning("未安装msgpack，序列化格式回退为json")
+        return "json"
+    return name
+
+
+def resolve_compression(name: Optional[str]) -> Optional[str]:
+    """压缩方式降级：配置为zstd但未安装zstandard时使用zlib，空值表示不压缩"""
+    if not name:
+        return None
+    if name == "zstd" and not ZSTD_AVAILABLE:
+        logging.getLogger("celery").warning("未安装zstandard，任务消息压缩回退为zlib")
+        return "zlib"
+    return name
+
+
+task_serializer = resolve_serializer(config.CELERY_TASK_SERIALIZER)
+result_serializer = resolve_serializer(config.CELERY_RESULT_SERIALIZER)
+# 接收端与发送端按内容类型协商：消息头携带格式，接收端只要在允许列表中即可解码
+accept_content = list(dict.fromkeys(
+    [resolve_serializer(name) for name in config.CELERY_ACCEPT_CONTENT] + ["json", task_serializer, result_serializer]
+))
+install_size_histogram(accept_content)
+
+
 # 创建日志配置实例（用于 Celery 日志系统初始化）
 log_config = LogConfig()
 
@@ -79,9 +174,11 @@ setup_celery_logging(log_config)
 app.conf.update(
     broker_url=config.CELERY_BROKER_URL,
     result_backend=config.CELERY_RESULT_BACKEND,
-    task_serializer=config.CELERY_TASK_SERIALIZER,
-    accept_content=config.CELERY_ACCEPT_CONTENT,
-    result_serializer=config.CELERY_RESULT_SERIALIZER,
+    task_serializer=task_serializer,
+    accept_content=accept_content,
+    result_serializer=result_serializer,
+    result_accept_content=accept_content,
+    task_compression=resolve_compression(config.CELERY_TASK_COMPRESSION),
     result_expires=config.CELERY_RESULT_EXPIRES,
     timezone=config.CELERY_TIMEZONE,
     enable_utc=config.CELERY_ENABLE_UTC,
@@ -100,6 +197,7 @@ app.conf.update(
     worker_autoscale=config.CELERY_WORKER_AUTOSCALE,  # 自动扩缩容
     task_queues_max_length=config.CELERY_TASK_QUEUES_MAX_LENGTH,  # 队列长度限制
     task_time_limit=config.CELERY_TASK_TIME_LIMIT,  # 任务最大执行时间
+    broker_transport_options={"visibility_timeout": config.CELERY_BROKER_VISIBILITY_TIMEOUT},  # 未确认消息重新投递时间
     # 新增：自定义任务路由（确保任务被正确路由到指定队列）
     task_routes={
         'celery_app.subscriber_tasks.process_task': {'queue': 'subscriber_queue'},
@@ -110,3 +208,4 @@ app.conf.update(
 app.autodiscover_tasks(packages=["src.celery_app"], related_name="subscriber_tasks")
 # app.autodiscover_tasks(packages=['src.celery_app'], related_name='test_tasks')
 app.autodiscover_tasks(packages=['src.celery_app'], related_name='ocr_tasks')
+app.autodiscover_tasks(packages=['src.celery_app'], related_name='ocr_fanout_tasks')
@@ -0,0 +1,143 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional
+from celery import chord
+from redis import Redis
+from src.celery_app import app
+from src.celery_app.app import queue_options, get_celery_config
+from src.configs import ApiConfig
+from src.configs.database import get_db_conn
+from src.configs.redis_config import get_redis_pool
+from src.services.tasks.ocr_cert_task import OCRCertTask
+from src.tools.task_dedup import InFlightTaskRegistry
+from src.tools.fetch_backpressure import FetchBackpressure
+
+# 配置Celery任务专用日志记录器
+logger = logging.getLogger("celery")
+
+CHECKPOINT_PREFIX = "ocr:fanout:"  # HASH: URL序号 -> 该URL的识别结果（JSON）
+
+_ocr_config = ApiConfig().ocr
+
+
+def _checkpoint_key(task_id: str) -> str:
+    return f"{CHECKPOINT_PREFIX}{task_id}"
+
+
+def _is_pdf(url: str) -> bool:
+    return url.strip().lower().endswith('.pdf')
+
+
+def fan_out_record(task_id: str, urls: List[str], token: Optional[str] = None) -> None:
+    """
+    将一条OCR记录扇出为每个URL一个子任务，全部完成后由汇总任务一次回写
+
+    :param task_id: 记录任务ID（记录ID_业务ID）
+    :param urls: 记录的URL列表
+    :param token: 在途登记占用令牌，由汇总任务在回写后释放（子任务或汇总任务最终失败时由错误回调释放）
+    """
+    header = [
+        ocr_url_part.signature(
+            args=(task_id, index, url),
+            options=queue_options("ocr_pdf" if _is_pdf(url) else "ocr_image")
+        )
+        for index, url in enumerate(urls)
+    ]
+    body = ocr_record_aggregate.s(task_id, urls, token)
+    body.link_error(ocr_record_failed.s(task_id, token))
+    chord(header)(body)
+
+
+def _finish_record(redis_client: Redis, task_id: str, token: Optional[str], success: bool) -> None:
+    """记录处理结束：登记背压完成（仅成功时计入完成速率）并释放在途登记"""
+    FetchBackpressure.from_config(get_celery_config(), redis_client).mark_completed(task_id, success)
+    if token is not None:
+        registry = InFlightTaskRegistry.from_config(redis_client)
+        if registry is not None:
+            registry.release(task_id, token)
+
+
+@app.task(
+    bind=True,
+    max_retries=_ocr_config.FANOUT_PART_RETRIES,
+    default_retry_delay=_ocr_config.FANOUT_RETRY_DELAY
+)
+def ocr_url_part(self, task_id: str, index: int, url: str) -> Dict[str, Any]:
+    """
+    识别记录中的单个URL（扇出子任务）
+
+    成功结果写入检查点，记录重新处理时直接复用；失败时只重试本URL，重试耗尽后返回错误结果，
+    保证汇总任务仍能执行并将记录标记为失败
+    """
+    redis_client = Redis(connection_pool=get_redis_pool())
+    key = _checkpoint_key(task_id)
+    cached = redis_client.hget(key, str(index))
+    if cached is not None:
+        logger.info(f"任务{task_id}第{index}个URL命中检查点，跳过识别")
+        return json.loads(cached)
+
+    task = OCRCertTask(task_id=task_id, content={"urls": [url]})
+    try:
+        ocr_results = task.collect_ocr_results([url])
+        errors = [result["error"] for result in ocr_results if isinstance(result, dict) and "error" in result]
+        if errors:
+            raise RuntimeError(errors[0])
+    except Exception as e:
+        if self.request.retries < self.max_retries:
+            logger.warning(f"任务{task_id}第{index}个URL识别失败，稍后重试: {url}，{str(e)}")
+            raise self.retry(exc=e)
+        logger.error(f"任务{task_id}第{index}个URL重试耗尽: {url}，{str(e)}")
+        return {"index": index, "url": url, "ocr_results": [{"error": str(e)}], "page_filter": None}
+
+    part = {"index": index, "url": url, "ocr_results": ocr_results, "page_filter": task.page_filter_log.get(url)}
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hset(key, str(index), json.dumps(part, ensure_ascii=False))
+    pipe.expire(key, _ocr_config.FANOUT_CHECKPOINT_TTL)
+    pipe.execute()
+    return part
+
+
+@app.task(bind=True, default_retry_delay=60, max_retries=5)
+def ocr_record_aggregate(self, parts: List[Dict[str, Any]], task_id: str, urls: List[str], token: Optional[str] = None):
+    """
+    汇总各URL子任务结果并一次回写OCR记录（扇出汇总任务）
+
+    结果顺序与单任务模式一致：PDF结果在前、图片结果在后，同类按URL顺序；
+    全部成功后清理检查点，存在失败URL时保留检查点，记录重新发布时只重做失败的URL
+    """
+    parts = sorted(parts, key=lambda part: (not _is_pdf(part["url"]), part["index"]))
+    task = OCRCertTask(task_id=task_id, content={"urls": urls})
+    ocr_results = []
+    for part in parts:
+        ocr_results.extend(part["ocr_results"])
+        if part.get("page_filter"):
+            task.page_filter_log[part["url"]] = part["page_filter"]
+
+    db = next(get_db_conn())
+    try:
+        result = task.write_ocr_results(ocr_results, db, token)
+    except Exception as e:
+        logger.error(f"任务{task_id}汇总回写失败: {str(e)}", exc_info=True)
+        raise self.retry(exc=e)
+    finally:
+        db.close()
+
+    redis_client = Redis(connection_pool=get_redis_pool())
+    if not any(isinstance(r, dict) and "error" in r for r in ocr_results):
+        redis_client.delete(_checkpoint_key(task_id))
+    if not task.result_deferred:
+        # 开启合并回写时由缓冲区在结果落库后释放在途登记
+        _finish_record(redis_client, task_id, token, success=True)
+    logger.info(f"任务{task_id}扇出汇总完成，共{len(parts)}个URL")
+    return result
+
+
+@app.task
+def ocr_record_failed(request, exc, traceback, task_id: str, token: Optional[str] = None) -> None:
+    """
+    扇出汇总任务的错误回调：子任务异常导致chord失败、或汇总任务重试耗尽时执行
+
+    登记背压完成并释放在途登记（记录保持未完成状态，由下次拉取或租约回收重新处理），检查点保留供重做时复用
+    """
+    logger.error(f"任务{task_id}扇出处理失败，释放在途登记: {exc!r}")
+    _finish_record(Redis(connection_pool=get_redis_pool()), task_id, token, success=False)
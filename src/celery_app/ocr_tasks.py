@@ -1,15 +1,24 @@
 # 导入Celery应用、任务装饰器及项目依赖
+import os
+import socket
 import asyncio
 from src.celery_app import app
 from celery import shared_task
-from src.configs import ApiConfig
+from celery.signals import worker_process_shutdown, worker_shutdown
 from src.services.ocr_service import OCRService
+from src.services.ocr_result_writer import OCRResultWriteBuffer, close_result_write_buffer
+from src.configs import ApiConfig
+from src.configs.database import SessionFactory
 
 from src.configs.database import get_db_conn
-from src.celery_app.app import CeleryConfig
+from src.celery_app.app import CeleryConfig, get_celery_config
 import logging
 from src.configs.redis_config import get_redis_client
 from src.services.task_service import TaskService
+from src.tools.task_dedup import InFlightTaskRegistry
+from src.tools.fetch_backpressure import FetchBackpressure
+from src.tools.record_cursor import RecordScanCursor
+from src.tools.status_counters import OCRStatusCounters
 
 # 配置Celery任务专用日志记录器
 logger = logging.getLogger("celery")
@@ -31,11 +40,91 @@ def setup_periodic_tasks(sender, **kwargs):
                     limit_count=config.CELERY_FETCH_TASKS_LIMIT),
                 name='fetch_and_publish_latest_ocr_tasks'
             )
+            if config.CELERY_FETCH_CLAIM:
+                sender.add_periodic_task(
+                    config.CELERY_FETCH_LEASE_REAP_INTERVAL,
+                    reap_expired_ocr_leases.s(),
+                    name='reap_expired_ocr_leases'
+                )
+        ocr_config = ApiConfig().ocr
+        if ocr_config.WRITEBACK_ENABLED:
+            sender.add_periodic_task(
+                ocr_config.WRITEBACK_REPLAY_INTERVAL,
+                replay_ocr_writeback_journal.s(),
+                name='replay_ocr_writeback_journal'
+            )
+        if ocr_config.STATUS_COUNTERS_ENABLED:
+            sender.add_periodic_task(
+                ocr_config.STATUS_COUNTERS_RECONCILE_INTERVAL,
+                reconcile_ocr_status_counters.s(),
+                name='reconcile_ocr_status_counters'
+            )
     except Exception as e:
         logger.error(f"定时任务注册失败：{str(e)}", exc_info=True)
         raise
 
 
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def flush_ocr_result_buffer(**kwargs):
+    """Worker进程退出前回写缓冲区中的OCR结果（未能回写的由日志补写任务处理）"""
+    try:
+        close_result_write_buffer()
+    except Exception as e:
+        logger.error(f"退出前回写OCR结果失败，由补写任务处理：{str(e)}", exc_info=True)
+
+
+@shared_task(name='celery_app.tasks.replay_ocr_writeback_journal')
+def replay_ocr_writeback_journal():
+    """补写回写日志中Worker退出前未回写的OCR结果"""
+    return OCRResultWriteBuffer.from_config(SessionFactory).replay_journal(ApiConfig().ocr.WRITEBACK_REPLAY_AGE)
+
+
+@shared_task(name='celery_app.tasks.reap_expired_ocr_leases')
+def reap_expired_ocr_leases():
+    """回收租约到期仍处于处理中的OCR记录（重置为未处理，由下次拉取重新领取）"""
+    db_generator = get_db_conn()
+    db = next(db_generator)
+    try:
+        return asyncio.run(OCRService.reclaim_expired_ocr_leases(db))
+    finally:
+        try:
+            next(db_generator)
+        except StopIteration:
+            pass
+
+
+@shared_task(name='celery_app.tasks.reconcile_ocr_status_counters')
+def reconcile_ocr_status_counters():
+    """以数据库聚合结果对账Redis中的OCR状态计数"""
+    counters = OCRStatusCounters.from_config()
+    if counters is None:
+        return None
+    db_generator = get_db_conn()
+    db = next(db_generator)
+    try:
+        return asyncio.run(OCRService.reconcile_status_counters(db, counters))
+    finally:
+        try:
+            next(db_generator)
+        except StopIteration:
+            pass
+
+
+def queue_depth(redis_client) -> int:
+    """排队中的任务数：任务Stream未分发条目 + Celery默认队列与各OCR分类队列的消息数"""
+    config = get_celery_config()
+    depth = redis_client.xlen(config.CELERY_TASK_STREAM) if config.CELERY_TASK_TRANSPORT == "stream" else 0
+    queues = [app.conf.task_default_queue, *config.CELERY_OCR_QUEUE_PROFILES]
+    with app.connection_for_read() as conn:
+        broker = conn.default_channel.client
+        pipe = broker.pipeline(transaction=False)
+        for queue in queues:
+            pipe.llen(queue)
+        depth += sum(pipe.execute())
+    return depth
+
+
 @shared_task(name='celery_app.tasks.fetch_and_publish_latest_ocr_tasks', bind=True, max_retries=3)
 def fetch_and_publish_latest_ocr_tasks(self, limit_count: int = 100):
     """获取最新OCR记录并发布处理任务"""
@@ -54,39 +143,65 @@ def fetch_and_publish_latest_ocr_tasks(self, limit_count: int = 100):
             raise
 
         # 将异步调用包装在asyncio.run()中
-        config = CeleryConfig()
+        config = get_celery_config()
         ai_status = config.CELERY_FETCH_TASKS_AI_STATUS
         # 将-2转换为None，表示不筛选ai_status
         if ai_status == -2:
             ai_status = None
-        records = asyncio.run(OCRService.fetch_ocr_records(
-            db=db, limit=limit_count, ai_status=ai_status))
+        if config.CELERY_FETCH_BACKPRESSURE:
+            # 按当前积压量与完成速率确定本轮拉取数量，积压过高时跳过本轮
+            decision = FetchBackpressure.from_config(config, redis_client).plan_batch(
+                queue_depth(redis_client), config.CELERY_FETCH_TASKS_INTERVAL, limit_count
+            )
+            logger.info(
+                f"拉取背压决策：本轮{decision['batch']}条（{decision['reason']}），积压{decision['backlog']}，"
+                f"处理中{decision['in_flight']}，完成速率{decision['completion_rate']}/秒"
+            )
+            if decision["batch"] == 0:
+                return True
+            limit_count = decision["batch"]
+        owner = f"{socket.gethostname()}:{os.getpid()}" if config.CELERY_FETCH_CLAIM else None
+        if config.CELERY_FETCH_SCAN:
+            # 按id区间从游标高水位继续扫描（到达表尾后环绕），领取模式下同时领取记录
+            cursor = RecordScanCursor(
+                f"{config.CELERY_FETCH_PARTITIONS}:{config.CELERY_FETCH_PARTITION}", redis_client,
+                range_size=config.CELERY_FETCH_SCAN_RANGE, max_ranges=config.CELERY_FETCH_SCAN_MAX_RANGES
+            )
+            records = asyncio.run(OCRService.scan_ocr_records(
+                limit_count, db, cursor, ai_status=ai_status, claim_owner=owner,
+                lease_seconds=config.CELERY_FETCH_LEASE_SECONDS,
+                partitions=config.CELERY_FETCH_PARTITIONS, partition=config.CELERY_FETCH_PARTITION))
+        elif owner is not None:
+            # 领取记录（跳过其他实例已锁定或已领取的记录），发布失败的记录释放租约
+            records = asyncio.run(OCRService.claim_ocr_records(
+                limit=limit_count, db=db, owner=owner, lease_seconds=config.CELERY_FETCH_LEASE_SECONDS,
+                ai_status=ai_status, partitions=config.CELERY_FETCH_PARTITIONS, partition=config.CELERY_FETCH_PARTITION))
+        else:
+            records = asyncio.run(OCRService.fetch_ocr_records(
+                db=db, limit=limit_count, ai_status=ai_status))
         if not records:
             logger.info("未找到需要处理的OCR记录")
             return True
 
-        task_ids = []
-        config = ApiConfig()
-        for record in records:
-            # 跳过已处理或无效记录
-            if record.ai_status == 1 or record.is_delete == 1:
-                continue
-
-            # 创建任务ID和内容
-            task_id = f"{record.id}_{record.business_id}"
-            original_urls = record.url.split(',') if record.url else []
-            urls = [f"{config.dify.OCR_BASE_URL}{url}" for url in original_urls]
-
-            # 创建并发布任务
-            task = TaskService.create_task(
-                task_type="ocr_cert_processing",
-                content={"urls": urls},
-                task_id=task_id
+        # 跳过已处理或无效记录
+        pending_records = [
+            record for record in records if record.ai_status != 1 and record.is_delete != 1
+        ]
+        # 批量创建并通过pipeline分块发布任务
+        tasks = TaskService.create_ocr_cert_tasks(pending_records)
+        publish_result = TaskService.publish_tasks_bulk(
+            tasks, redis_client, registry=InFlightTaskRegistry.from_config(
+                redis_client, visibility_timeout=get_celery_config().CELERY_BROKER_VISIBILITY_TIMEOUT
             )
-            TaskService.publish_task(task, redis_client)
-            task_ids.append(task_id)
+        )
+        task_ids = publish_result["task_ids"]
+        if publish_result["failed"]:
+            logger.warning(f"{publish_result['failed']}个OCR任务发布失败，将在下次调度时重新获取")
+            if config.CELERY_FETCH_CLAIM:
+                asyncio.run(OCRService.release_ocr_claims(
+                    [int(task_id.split('_')[0]) for task_id in publish_result["failed_task_ids"]], db))
 
-        logger.info(f"成功发布{len(task_ids)}个OCR任务")
+        logger.info(f"成功发布{len(task_ids)}个OCR任务，跳过{len(publish_result['skipped_task_ids'])}个在途任务")
         return True
     except Exception as e:
         logger.error(f"获取并发布OCR任务失败: {str(e)}", exc_info=True)
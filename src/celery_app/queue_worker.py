@@ -0,0 +1,41 @@
+import logging
+import argparse
+from typing import List, Optional
+from src.celery_app.app import app, get_celery_config
+
+logger = logging.getLogger("celery")
+
+
+def build_worker_argv(queue: str) -> list:
+    """按队列配置构造Worker启动参数（只消费该队列，并发数、预取倍数取自 CELERY_OCR_QUEUE_PROFILES）"""
+    profiles = get_celery_config().CELERY_OCR_QUEUE_PROFILES
+    if queue not in profiles:
+        raise ValueError(f"未配置的队列: {queue}，可选: {', '.join(profiles)}")
+    profile = profiles[queue]
+    return [
+        "worker",
+        "--loglevel=info",
+        f"--queues={queue}",
+        f"--hostname={queue}@%h",
+        f"--concurrency={profile['concurrency']}",
+        f"--prefetch-multiplier={profile['prefetch_multiplier']}",
+    ]
+
+
+def main(args: Optional[List[str]] = None) -> None:
+    """
+    启动单个OCR队列的Worker
+
+    用法: python -m src.celery_app.queue_worker ocr_image | ocr_pdf | ocr_pdf_large
+    """
+    parser = argparse.ArgumentParser(prog="python -m src.celery_app.queue_worker", description="启动单个OCR队列的Worker")
+    parser.add_argument("queue", choices=list(get_celery_config().CELERY_OCR_QUEUE_PROFILES), help="OCR队列名")
+    # 参数错误时argparse输出用法并以非零状态码退出
+    queue = parser.parse_args(args).queue
+    argv = build_worker_argv(queue)
+    logger.info(f"启动队列Worker: {' '.join(argv)}")
+    app.worker_main(argv)
+
+
+if __name__ == "__main__":
+    main()
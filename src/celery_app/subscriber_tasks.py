@@ -1,18 +1,32 @@
+import os
 import redis
 import json
+import time
+import socket
 import logging
+import threading
+from celery.signals import worker_ready
 from src.celery_app import app
 from src.configs.redis_config import get_redis_client
-from src.celery_app.app import CeleryConfig
+from src.celery_app.app import CeleryConfig, queue_options
 from src.services.task_service import TaskService
 
 # 初始化Celery任务专用日志器
 logger = logging.getLogger("celery")
 
-@app.on_after_configure.connect
-def start_redis_subscriber(sender, **kwargs):
-    """Celery配置完成后启动Redis订阅器"""
-    from src.configs.redis_config import get_redis_client
+def _consumes_default_queue() -> bool:
+    """当前Worker是否消费默认队列（只消费OCR分类队列的Worker不负责分发，避免同一任务被多个Worker重复投递）"""
+    return app.conf.task_default_queue in app.amqp.queues.consume_from
+
+
+@worker_ready.connect
+def start_redis_subscriber(sender=None, **kwargs):
+    """Worker就绪后启动Redis订阅器（pubsub投递方式，stream方式由start_stream_dispatcher启动分发器）"""
+    if CeleryConfig().CELERY_TASK_TRANSPORT == "stream":
+        return
+    # 只消费OCR分类队列的Worker不订阅（pubsub每个订阅者都会收到消息，多个订阅者会重复投递）
+    if not _consumes_default_queue():
+        return
     redis_generator = get_redis_client()
     redis_client = next(redis_generator)
     try:
@@ -33,20 +47,101 @@ def start_redis_subscriber(sender, **kwargs):
                     task_data = json.loads(message['data'])
                     logger.info(f"收到任务: {task_data.get('task_type')}")
                     
-                    process_task.delay(task_data)
+                    dispatch_task(task_data)
                 except json.JSONDecodeError:
                     app.logger.error("JSON解析失败")
+                except Exception as e:
+                    # 单条消息投递失败不影响后续消息
+                    logger.error(f"任务投递失败，已丢弃: {str(e)}", exc_info=True)
 
     # 启动后台线程监听消息
-    import threading
     threading.Thread(target=listen_for_messages, daemon=True).start()
-    
+
+
+@worker_ready.connect
+def start_stream_dispatcher(sender=None, **kwargs):
+    """Worker就绪后启动Redis Stream任务分发线程（多个Worker组成同一消费组，每条任务只分发一次）"""
+    config = CeleryConfig()
+    if config.CELERY_TASK_TRANSPORT != "stream":
+        return
+    # 只消费OCR分类队列的Worker不负责分发
+    if not _consumes_default_queue():
+        return
+    consumer = f"{socket.gethostname()}:{os.getpid()}"
+    threading.Thread(
+        target=_dispatch_stream_tasks, args=(config, consumer), name="task-stream-dispatcher", daemon=True
+    ).start()
+    logger.info(f"任务Stream分发器已启动: stream={config.CELERY_TASK_STREAM}，consumer={consumer}")
+
+
+def _dispatch_stream_tasks(config: CeleryConfig, consumer: str) -> None:
+    """分发循环：定期接管超时未确认的条目，阻塞读取新条目，投递为Celery任务后确认"""
+    redis_client = next(get_redis_client())
+    last_claim = 0.0
+    backoff = 1
+    while True:
+        try:
+            TaskService.ensure_stream_group(redis_client, config)
+            while True:
+                entries = []
+                if time.monotonic() - last_claim >= config.CELERY_TASK_STREAM_CLAIM_IDLE_MS / 1000:
+                    entries = TaskService.claim_stale_stream_tasks(redis_client, consumer, config)
+                    last_claim = time.monotonic()
+                    if entries:
+                        logger.warning(f"接管其他分发器未确认的任务条目: {len(entries)}条")
+                entries += TaskService.read_stream_tasks(redis_client, consumer, config)
+                _dispatch_entries(redis_client, entries, config)
+                backoff = 1
+        except redis.RedisError as e:
+            logger.error(f"任务Stream读取失败，{backoff}秒后重试: {str(e)}")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+        except Exception as e:
+            # 意外错误不终止分发线程，未确认的条目由接管流程重新分发
+            logger.error(f"任务Stream分发异常，{backoff}秒后重试: {str(e)}", exc_info=True)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+
+def _dispatch_entries(redis_client, entries, config: CeleryConfig) -> None:
+    """
+    逐条投递条目为Celery任务并确认
+
+    单条条目无法解析或投递失败时记录日志并转存到死信Stream，不影响同批其他条目
+    """
+    done, dead = [], []
+    for entry_id, fields in entries:
+        try:
+            task_data = json.loads(fields["data"])
+        except (KeyError, TypeError, json.JSONDecodeError):
+            logger.error(f"任务条目解析失败，已转存死信: {entry_id}")
+            dead.append((entry_id, fields, "invalid payload"))
+            continue
+        try:
+            dispatch_task(task_data)
+        except Exception as e:
+            logger.error(f"任务投递失败，已转存死信: {entry_id}，{str(e)}", exc_info=True)
+            dead.append((entry_id, fields, str(e)))
+            continue
+        logger.info(f"收到任务: {task_data.get('task_type')}")
+        done.append(entry_id)
+    TaskService.ack_stream_tasks(redis_client, done, config)
+    TaskService.dead_letter_stream_tasks(redis_client, dead, config)
+
+
+def dispatch_task(task_data: dict) -> None:
+    """投递任务到Celery：带有发布时队列分类的任务投递到对应队列，并使用该队列的执行时间限制"""
+    process_task.apply_async(args=[task_data], **queue_options(task_data.get("queue")))
+
+
 @app.task(bind=True, default_retry_delay=300, max_retries=5)
 def process_task(self, task_data):
     try:
         # 使用TaskService解析任务
         logger.info(f"TaskService解析任务")
         task = TaskService.parse_task(task_data)
+        # 已达重试上限时本次为最后一次执行，失败后任务释放在途登记
+        task.final_attempt = self.request.retries >= self.max_retries
         worker_id = self.request.hostname
         logger.info(f"Worker {worker_id} 领取任务，类型：{task.task_type}，ID：{task.task_id}")
         
@@ -1,4 +1,4 @@
-from .config import ApiConfig
+from .config import ApiConfig, get_api_config
 from pydantic_settings import BaseSettings
 
-__all__ = ['ApiConfig', 'BaseSettings']
\ No newline at end of file
+__all__ = ['ApiConfig', 'get_api_config', 'BaseSettings']
\ No newline at end of file
@@ -1,4 +1,5 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
+from typing import Optional
 from pydantic import Field
 
 # 数据库配置类（添加 env_prefix 限制只读取 DB_ 前缀变量）
@@ -65,6 +66,94 @@ class DashScopeConfig(BaseSettings):
         extra="ignore",
     )
 
+# OCR识别流程配置类
+class OCRConfig(BaseSettings):
+    """OCR 识别流程配置（映射.env中OCR_前缀的环境变量）"""
+    ASYNC_ENABLED: bool = Field(default=False)  # 是否启用全异步OCR流程（下载→渲染→VLM→回写）
+    CONCURRENCY: int = Field(default=8)  # 异步模式下页面/URL/记录共享的并发预算
+    PAGE_WINDOW: int = Field(default=4)  # PDF逐页流水线的在途页数上限（已渲染未识别）
+    CACHE_ENABLED: bool = Field(default=False)  # 是否启用OCR识别结果缓存（Redis）
+    CACHE_TTL: int = Field(default=7 * 24 * 3600)  # 识别结果缓存过期时间（秒）
+    CACHE_MAX_ENTRIES: int = Field(default=200000)  # 识别结果缓存条数上限（超出按LRU淘汰）
+    DOWNLOAD_CACHE_ENABLED: bool = Field(default=False)  # 是否启用源文件本地下载缓存（条件请求重新验证）
+    DOWNLOAD_CACHE_MAX_BYTES: int = Field(default=2 * 1024 * 1024 * 1024)  # 下载缓存总大小上限（字节）
+    RENDER_BACKEND: str = Field(default="thread")  # PDF渲染后端：thread（进程内）| process（多进程+共享内存）
+    RENDER_PROCESSES: int = Field(default=0)  # 多进程渲染的进程数（0表示CPU核数）
+    RENDER_PAGES_PER_TASK: int = Field(default=4)  # 多进程渲染时每个渲染任务负责的页数
+    MAX_PIXELS: int = Field(default=28 * 28 * 8192)  # 单页渲染像素预算（与VLM的max_pixels一致，0表示不限制）
+    IMAGE_FORMAT: str = Field(default="png")  # 页面图片编码格式：png | jpeg | webp（webp需安装Pillow）
+    IMAGE_QUALITY: int = Field(default=85)  # jpeg/webp 编码质量（1-100）
+    TEXT_LAYER_MODE: str = Field(default="off")  # PDF文本层快速路径：off（全部渲染识别）| llm（文本层足够的页面交给纯文本模型）
+    TEXT_LAYER_MIN_CHARS: int = Field(default=50)  # 页面文本层有效字符数（字母、数字、汉字）达到该值才走文本路径
+    TEXT_MODEL: str = Field(default="qwen-turbo")  # 文本层识别使用的纯文本模型
+    PAGE_FILTER_ENABLED: bool = Field(default=False)  # 是否在OCR前过滤近空白页与文档内重复页
+    PAGE_FILTER_BLANK_INK_RATIO: float = Field(default=0.002)  # 墨迹像素占比低于该值视为空白页
+    PAGE_FILTER_BLANK_STD: float = Field(default=2.0)  # 灰度标准差低于该值视为空白页（纯色页）
+    PAGE_FILTER_DUPLICATE_DISTANCE: int = Field(default=10)  # 感知哈希（dHash）汉明距离不超过该值视为疑似重复页，负数不检测
+    PAGE_FILTER_DUPLICATE_MAX_DIFF: float = Field(default=30.0)  # 疑似重复页的低分辨率灰度图逐块最大差值不超过该值才判定为重复页
+    DEDUP_ENABLED: bool = Field(default=True)  # 是否按任务ID（记录ID_业务ID）对在途OCR任务去重
+    DEDUP_QUEUED_TTL: int = Field(default=0)  # 已发布未开始处理的登记过期时间（秒），0表示与Celery broker的visibility_timeout一致
+    DEDUP_RUNNING_TTL: int = Field(default=3600)  # 处理租约过期时间（秒），应大于单个任务最长处理时间
+    QUEUE_LARGE_PDF_COUNT: int = Field(default=3)  # 记录包含的PDF数量达到该值归入大PDF队列
+    QUEUE_SIZE_PROBE: bool = Field(default=False)  # 发布时是否HEAD请求PDF文件大小用于队列分类
+    QUEUE_LARGE_PDF_BYTES: int = Field(default=8 * 1024 * 1024)  # 记录的PDF总大小达到该值归入大PDF队列（需开启大小探测）
+    FANOUT_ENABLED: bool = Field(default=False)  # 多URL记录是否扇出为每个URL一个子任务（chord汇总后一次回写）
+    FANOUT_PART_RETRIES: int = Field(default=3)  # 单个URL子任务失败后的重试次数（只重试失败的URL）
+    FANOUT_RETRY_DELAY: int = Field(default=60)  # URL子任务重试间隔（秒）
+    FANOUT_CHECKPOINT_TTL: int = Field(default=24 * 3600)  # 已成功URL识别结果的检查点保留时间（秒）
+    WRITEBACK_ENABLED: bool = Field(default=False)  # Worker是否合并回写OCR结果（Redis日志兜底，后台线程批量UPDATE；任务在结果落库前返回）
+    WRITEBACK_MAX_ROWS: int = Field(default=200)  # 缓冲区达到该条数时立即回写
+    WRITEBACK_MAX_DELAY_MS: int = Field(default=500)  # 结果在缓冲区中的最长等待时间（毫秒）
+    WRITEBACK_REPLAY_INTERVAL: int = Field(default=60)  # 补写回写日志遗留条目的定时任务间隔（秒）
+    WRITEBACK_REPLAY_AGE: int = Field(default=60)  # 日志条目等待超过该时间（秒）仍未回写视为Worker已退出，由定时任务补写
+    WRITEBACK_MAX_ATTEMPTS: int = Field(default=5)  # 单条结果回写失败达到该次数后转入死信（记录保持未完成，由后续拉取重新处理）
+    STATUS_COUNTERS_ENABLED: bool = Field(default=False)  # 是否在Redis中增量维护ai_status计数（统计接口读取计数，不访问OCR表）
+    STATUS_COUNTERS_RECONCILE_INTERVAL: int = Field(default=600)  # 计数与数据库对账的定时任务间隔（秒）
+    RESET_CHUNK_SIZE: int = Field(default=1000)  # 按业务/公司重置ai_status时每个UPDATE语句覆盖的记录数（每块单独提交）
+    RESULT_MODE: str = Field(default="summary")  # 任务结果内容：summary（摘要+记录引用，识别内容以数据库为准）| full（完整识别结果）
+
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        env_file_encoding="utf-8",
+        env_prefix="OCR_",
+        extra="ignore",
+    )
+
+# 出站HTTP连接池配置类
+class HttpConfig(BaseSettings):
+    """出站HTTP连接池配置（映射.env中HTTP_前缀的环境变量）"""
+    POOL_CONNECTIONS: int = Field(default=20)  # 每个进程缓存的主机连接池数量（按 协议+主机+端口 区分）
+    POOL_MAXSIZE: int = Field(default=32)  # 每个主机连接池保留的keep-alive连接数上限
+    POOL_BLOCK: bool = Field(default=False)  # 连接池满时是否阻塞等待（否则新建临时连接，用完即关闭）
+    MAX_RETRIES: int = Field(default=0)  # 连接失败重试次数（仅连接阶段，不重试已发送的请求）
+
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        env_file_encoding="utf-8",
+        env_prefix="HTTP_",
+        extra="ignore",
+    )
+
+# 模型调用限流配置类
+class RateLimitConfig(BaseSettings):
+    """模型调用限流配置（映射.env中RATE_LIMIT_前缀的环境变量，DashScope与Dify分别按资源名独立计数）"""
+    ENABLED: bool = Field(default=False)  # 是否启用模型调用限流
+    BACKEND: str = Field(default="redis")  # 限流后端：redis（集群共享）| local（仅进程内）
+    RATE: float = Field(default=10.0)  # 每秒请求数配额（集群合计）
+    BURST: int = Field(default=20)  # 令牌桶容量（允许的突发请求数）
+    MAX_CONCURRENCY: int = Field(default=16)  # 集群并发调用上限（AIMD调整的上界，也是初始值）
+    MIN_CONCURRENCY: int = Field(default=2)  # AIMD调整的并发下界
+    LATENCY_TARGET: float = Field(default=20.0)  # 单次调用耗时超过该值（秒）视为过载并下调并发
+    LEASE_TTL: int = Field(default=120)  # 并发租约过期时间（秒），进程崩溃后自动回收
+    ACQUIRE_TIMEOUT: float = Field(default=300.0)  # 等待调用配额的最长时间（秒）
+
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        env_file_encoding="utf-8",
+        env_prefix="RATE_LIMIT_",
+        extra="ignore",
+    )
+
 class ApiConfig(BaseSettings):
     """项目全局配置类"""
     ROOT_DIR: str = Field(default='./', env='ROOT_DIR')
@@ -73,9 +162,24 @@ class ApiConfig(BaseSettings):
     redis: RedisConfig = Field(default_factory=RedisConfig)
     dify: DifyConfig = Field(default_factory=DifyConfig)
     dashscope: DashScopeConfig = Field(default_factory=DashScopeConfig) 
+    ocr: OCRConfig = Field(default_factory=OCRConfig)
+    http: HttpConfig = Field(default_factory=HttpConfig)
+    rate_limit: RateLimitConfig = Field(default_factory=RateLimitConfig)
 
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
         extra="allow",  # 保持允许全局额外变量（兼容历史配置）
     )
+
+
+# 进程内共享的全局配置实例（首次使用时创建，避免高频路径每次重新解析.env）
+_api_config: Optional[ApiConfig] = None
+
+
+def get_api_config() -> ApiConfig:
+    """获取进程内共享的全局配置实例（任务处理等高频路径使用）"""
+    global _api_config
+    if _api_config is None:
+        _api_config = ApiConfig()
+    return _api_config
@@ -0,0 +1,112 @@
+import os
+import threading
+import logging
+import importlib.util
+from typing import Any, Dict, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from src.configs import ApiConfig
+
+logger = logging.getLogger(__name__)
+
+# 安装了h2时VLM客户端启用HTTP/2（单连接多路复用）
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# 每个进程一个HTTP会话（单例模式，Celery prefork 子进程 fork 后重建）
+_session: Optional[requests.Session] = None
+_session_pid: Optional[int] = None
+_session_lock = threading.Lock()
+# 每个进程一个VLM（OpenAI兼容接口）同步HTTP客户端
+_vlm_client: Optional[httpx.Client] = None
+_vlm_client_pid: Optional[int] = None
+
+
+def _reset_after_fork() -> None:
+    """fork后的子进程丢弃继承的会话与客户端（不关闭，避免影响父进程仍在使用的socket）"""
+    global _session, _session_pid, _session_lock, _vlm_client, _vlm_client_pid
+    _session = None
+    _session_pid = None
+    _session_lock = threading.Lock()
+    _vlm_client = None
+    _vlm_client_pid = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_http_session() -> requests.Session:
+    """
+    获取当前进程共享的HTTP会话（单例）
+
+    按 协议+主机+端口 维护keep-alive连接池，同一文件服务器的批量下载复用TCP/TLS连接
+    """
+    global _session, _session_pid
+    if _session is not None and _session_pid == os.getpid():
+        return _session
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            config = ApiConfig().http
+            adapter = HTTPAdapter(
+                pool_connections=config.POOL_CONNECTIONS,
+                pool_maxsize=config.POOL_MAXSIZE,
+                pool_block=config.POOL_BLOCK,
+                max_retries=Retry(total=config.MAX_RETRIES, read=False),
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+            _session_pid = os.getpid()
+            logger.info(
+                f"HTTP连接池已创建（pid={_session_pid}，pool_connections={config.POOL_CONNECTIONS}，"
+                f"pool_maxsize={config.POOL_MAXSIZE}）"
+            )
+    return _session
+
+
+def get_vlm_http_client() -> httpx.Client:
+    """获取当前进程共享的VLM同步HTTP客户端（单例，各模型/提示词的OpenAI客户端共用同一连接池）"""
+    global _vlm_client, _vlm_client_pid
+    if _vlm_client is not None and _vlm_client_pid == os.getpid():
+        return _vlm_client
+    with _session_lock:
+        if _vlm_client is None or _vlm_client_pid != os.getpid():
+            _vlm_client = httpx.Client(http2=HTTP2_AVAILABLE, limits=build_httpx_limits())
+            _vlm_client_pid = os.getpid()
+            logger.info(f"VLM HTTP客户端已创建（pid={_vlm_client_pid}，http2={HTTP2_AVAILABLE}）")
+    return _vlm_client
+
+
+def build_httpx_limits() -> httpx.Limits:
+    """按连接池配置构造httpx连接上限（keep-alive连接数与同步会话一致）"""
+    return httpx.Limits(max_keepalive_connections=ApiConfig().http.POOL_MAXSIZE)
+
+
+def get_http_pool_stats() -> Dict[str, Any]:
+    """获取当前进程HTTP连接池统计（每个主机的已建连接数、空闲keep-alive连接数、请求数）"""
+    stats: Dict[str, Any] = {"pid": os.getpid(), "pools": []}
+    if _session is None or _session_pid != os.getpid():
+        return stats
+    seen = set()
+    for adapter in _session.adapters.values():
+        if id(adapter) in seen:
+            continue
+        seen.add(id(adapter))
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats["pools"].append({
+                "host": f"{pool.scheme}://{pool.host}:{pool.port}",
+                "connections_created": pool.num_connections,
+                "requests": pool.num_requests,
+                # 队列中预填充None占位，只统计真实的空闲连接
+                "idle": sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0,
+                "maxsize": pool.pool.maxsize if pool.pool else 0,
+            })
+    return stats
@@ -1,5 +1,6 @@
 from datetime import datetime
 from sqlalchemy import Column, BigInteger, String, Text, DateTime, Integer, SmallInteger, DECIMAL, Index
+from sqlalchemy.orm import deferred
 from src.configs.database import Base
 
 class OCRModel(Base):
@@ -12,7 +13,10 @@ class OCRModel(Base):
     name = Column(String(100), comment='文件名字')
     content = Column(Text, comment='文件扫描内容')
     ai_task_id = Column(String(200), comment='AI任务ID')
-    ai_status = Column(SmallInteger, comment='AI状态: 0:未处理 1:处理成功 -1:处理失败')  # 调整为 SmallInteger 对应 tinyint
+    ai_status = Column(SmallInteger, comment='AI状态: 0:未处理 1:处理成功 -1:处理失败 2:处理中')  # 调整为 SmallInteger 对应 tinyint
+    # 租约列仅在领取模式（CELERY_FETCH_CLAIM）下访问，延迟加载使普通查询不依赖这两列（已有库需执行 scripts/mysql/alter_ocr_record_lease.sql）
+    ai_lease_owner = deferred(Column(String(64), comment='AI处理租约持有者（拉取实例标识）'))
+    ai_lease_until = deferred(Column(DateTime, comment='AI处理租约到期时间（到期未完成由回收任务重置为未处理）'))
     ai_content = Column(Text, comment='AI处理内容')
     ai_content_converter = Column(SmallInteger, default=0, comment='ai内容是否转换 0否 1是')  # 新增字段
     url = Column(String(350), comment='文件URL')
@@ -34,6 +38,8 @@ class OCRModel(Base):
     # 新增索引声明
     __table_args__ = (
         Index('idx_business_id_type', 'business_id', 'ocr_type'),
+        Index('idx_ai_status_lease', 'ai_status', 'ai_lease_until'),
+        Index('idx_business_status', 'business_id', 'is_delete', 'ai_status'),
     )
 
     def __repr__(self):
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, status, Query
 from redis import Redis
 from src.configs.redis_config import get_redis_client
-from src.celery_app.app import CeleryConfig
+from src.celery_app.app import CeleryConfig, get_celery_config
 from src.services.redis_service import RedisBaseService
 from src.schemas.response_schema import SuccessResponse, ErrorResponse
 from src.schemas.celery_schema import DemoTaskRequest, BatchDemoTaskRequest,GenerateTasksRequest 
@@ -95,13 +95,12 @@ async def publish_batch_tasks(
 ):
     if len(request.task_data_list) < 1:
         raise HTTPException(status_code=400, detail="任务数据列表不能为空")
-    config = CeleryConfig()  # 加载Celery配置
+    config = get_celery_config()  # 加载Celery配置
     if not redis_client.ping():
         raise HTTPException(status_code=500, detail="Redis连接失败")
-    # 循环发布task_data_list中的每个任务数据
+    # 通过pipeline一次往返发布task_data_list中的全部任务数据
+    pipe = redis_client.pipeline(transaction=False)
     for task_data in request.task_data_list:
-        redis_client.publish(
-            config.CELERY_TASK_QUEUE_CHANNEL,
-            json.dumps(task_data)
-        )
+        TaskService.publish_payload(pipe, json.dumps(task_data), config)
+    pipe.execute()
     return SuccessResponse(message=f"{len(request.task_data_list)}个任务已批量发布到订阅队列", data=None)
\ No newline at end of file
@@ -1,5 +1,9 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 import logging
+from redis import Redis
+from src.configs.http_config import get_http_pool_stats
+from src.configs.redis_config import get_redis_client
+from src.services.task_service import TaskService
 
 router = APIRouter(prefix="/api/health", tags=["System"])
 
@@ -8,4 +12,14 @@ logger = logging.getLogger(__name__)
 @router.get("/")
 async def health_check():
     logger.info("Health check request received")
-    return {"status": "ok3"}
\ No newline at end of file
+    return {"status": "ok3"}
+
+@router.get("/http-pools")
+async def http_pool_stats():
+    """当前进程出站HTTP连接池统计（各主机已建连接数、空闲keep-alive连接数、请求数）"""
+    return get_http_pool_stats()
+
+@router.get("/task-stream")
+async def task_stream_stats(redis_client: Redis = Depends(get_redis_client)):
+    """任务Stream积压统计（未分发条目数、已读取未确认条目数、各分发器状态）"""
+    return TaskService.stream_stats(redis_client)
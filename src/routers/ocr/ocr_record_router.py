@@ -17,8 +17,11 @@ from src.schemas.ocr_record_schemas import (
     OCRUpdateAIStatusByCompanyRequest  # 新增：导入新增的请求模型类
 )
 import logging
+from redis import Redis
 # 新增：导入OCRService类
 from src.services.ocr_service import OCRService
+from src.services.task_service import TaskService
+from src.configs.redis_config import get_redis_client
 
 from src.models.ocr_model import OCRModel
 from src.configs.database import get_db_conn
@@ -68,10 +71,30 @@ async def get_ocr_records_by_business_ids(
         raise HTTPException(status_code=500, detail="服务器内部错误")
 
 
+async def _reset_ai_status(
+    db: Session,
+    redis_client: Redis,
+    publish: bool,
+    business_ids: list[str] | None = None,
+    company_ids: list[str] | None = None
+) -> OCRUpdateAIStatusData:
+    """分块重置记录状态（publish为真时每块提交后立即重新发布），转换为接口响应数据"""
+    result = await TaskService.reset_and_republish_ocr_records(
+        db, redis_client, publish, business_ids=business_ids, company_ids=company_ids
+    )
+    return OCRUpdateAIStatusData(
+        updated_count=result["updated"],
+        chunks=result["chunks"],
+        published_count=result.get("published", 0),
+        publish_failed_count=result.get("publish_failed", 0)
+    )
+
+
 @router.post("/update-ai-status", response_model=OCRUpdateAIStatusResponse)
 async def update_ai_status_by_business_ids(
     request: OCRUpdateAIStatusRequest = Body(...),
-    db: Session = Depends(get_db_conn)
+    db: Session = Depends(get_db_conn),
+    redis_client: Redis = Depends(get_redis_client)
 ):
     if not request.business_ids:
         logger.warning("业务ID列表不能为空")
@@ -79,28 +102,14 @@ async def update_ai_status_by_business_ids(
 
     try:
         logger.info(f"开始更新业务ID: {request.business_ids} 的OCR记录ai_status为0")
-        
-        records = db.query(OCRModel).filter(
-            OCRModel.business_id.in_(request.business_ids),
-            OCRModel.is_delete == 0
-        ).all()
+        data = await _reset_ai_status(db, redis_client, request.publish, business_ids=request.business_ids)
 
-        if not records:
+        if data.updated_count == 0:
             logger.info(f"未找到业务ID: {request.business_ids} 的有效OCR记录")
-            return OCRUpdateAIStatusResponse(
-                message="无有效记录需要更新",
-                data=OCRUpdateAIStatusData(updated_count=0)
-            )
+            return OCRUpdateAIStatusResponse(message="无有效记录需要更新", data=data)
 
-        for record in records:
-            record.ai_status = 0
-
-        db.commit()
-        logger.info(f"成功更新{len(records)}条OCR记录的ai_status为0")
-        return OCRUpdateAIStatusResponse(
-            message="更新成功",
-            data=OCRUpdateAIStatusData(updated_count=len(records))
-        )
+        logger.info(f"成功更新{data.updated_count}条OCR记录的ai_status为0")
+        return OCRUpdateAIStatusResponse(message="更新成功", data=data)
 
     except Exception as e:
         db.rollback()
@@ -111,24 +120,23 @@ async def update_ai_status_by_business_ids(
 @router.post("/update-ai-status-by-company-ids", response_model=OCRUpdateAIStatusResponse)
 async def update_ai_status_by_company_ids(
     request: OCRUpdateAIStatusByCompanyRequest = Body(..., description="公司ID列表请求体"),
-    db: Session = Depends(get_db_conn)
+    db: Session = Depends(get_db_conn),
+    redis_client: Redis = Depends(get_redis_client)
 ):
     """
     根据公司ID列表重置OCR记录的ai_status为0
-    - 参数：包含公司ID列表的请求体
+    - 参数：包含公司ID列表的请求体（publish为真时重置后重新发布OCR任务）
     - 返回：更新的记录数量
     """
+    if not request.company_ids:
+        logger.warning("公司ID列表不能为空")
+        raise HTTPException(status_code=400, detail="公司ID列表不能为空")
+
     try:
-        updated_count = await OCRService.update_ai_status_by_company_ids(request.company_ids, db)
-        if updated_count == 0:
-            return OCRUpdateAIStatusResponse(
-                message="无有效记录需要更新",
-                data=OCRUpdateAIStatusData(updated_count=0)
-            )
-        return OCRUpdateAIStatusResponse(
-            message="更新成功",
-            data=OCRUpdateAIStatusData(updated_count=updated_count)
-        )
+        data = await _reset_ai_status(db, redis_client, request.publish, company_ids=request.company_ids)
+        if data.updated_count == 0:
+            return OCRUpdateAIStatusResponse(message="无有效记录需要更新", data=data)
+        return OCRUpdateAIStatusResponse(message="更新成功", data=data)
     except Exception as e:
         db.rollback()
         logger.error(f"根据公司ID更新ai_status失败，公司ID列表：{request.company_ids}，错误详情：{str(e)}", exc_info=True)
@@ -142,7 +150,7 @@ async def get_ocr_status_statistics(
 ):
     """
     统计OCR记录的ai_status分布及电站总数（仅支持公司ID/省份ID筛选）
-    - 参数：包含公司/省份ID筛选条件的请求体
+    - 参数：包含公司/省份ID筛选条件的请求体（breakdowns指定时按公司/省份分组返回）
     - 返回：各ai_status数量及电站总数
     """
     try:
@@ -150,7 +158,9 @@ async def get_ocr_status_statistics(
         statistics_dict = await OCRService.get_ai_status_statistics(
             company_ids=request.company_ids,
             province_ids=request.province_ids,
-            db=db
+            db=db,
+            breakdowns=request.breakdowns,
+            use_counters=request.use_counters
         )
         # 将字典转换为Pydantic模型
         statistics = OCRStatusStatisticsData(**statistics_dict)
@@ -1,5 +1,8 @@
+import os
+import socket
 from fastapi import APIRouter, Depends, HTTPException, Body
 from src.services.task_service import TaskService
+from src.celery_app.app import app as celery_app, get_celery_config
 from redis import Redis
 from src.configs.redis_config import get_redis_client
 
@@ -7,7 +10,13 @@ from sqlalchemy.orm import Session
 from src.configs.database import get_db_conn
 from src.services.ocr_service import OCRService
 from src.schemas.ocr_task_schemas import OCRTaskResponse, OCRTaskData
-from src.configs import ApiConfig
+from src.schemas.response_schema import SuccessResponse
+from src.tools.ocr_cache import OCRResultCache
+from src.tools.task_dedup import InFlightTaskRegistry
+from src.tools.fetch_backpressure import FetchBackpressure
+from src.tools.payload_stats import PayloadSizeHistogram, histogram
+from src.services.ocr_result_writer import OCRResultWriteBuffer
+from src.configs.database import SessionFactory
 import logging
 
 logger = logging.getLogger("celery")
@@ -22,10 +31,10 @@ async def create_ocr_tasks_by_business_ids(
 ):
     """根据业务ID处理OCR任务接口（补全关联的公司ID）"""
     try:
-        # 步骤1：通过业务ID查询关联的公司ID
-        company_ids = await OCRService.fetch_company_ids_by_business_ids(business_ids, db)
-        # 步骤2：查询待处理OCR记录
-        records = await OCRService.fetch_ocr_records_by_business_ids(business_ids, db, ai_status=ai_status)
+        # 一次关联查询获取待处理OCR记录及关联的公司ID
+        records, _, company_ids = await OCRService.resolve_ocr_records(
+            db, business_ids=business_ids, ai_status=ai_status
+        )
         
         if not records:
             return OCRTaskResponse(
@@ -38,26 +47,22 @@ async def create_ocr_tasks_by_business_ids(
                 )
             )
         
-        task_ids = []
-        for record in records:
-            # 使用TaskService创建任务
-            original_urls = record.url.split(',') if record.url else []
-            config = ApiConfig()
-            urls = [f"{config.dify.OCR_BASE_URL}{url}" for url in original_urls]
-            task = TaskService.create_task(
-                task_type="ocr_cert_processing",
-                content={"urls": urls},
-                task_id=f"{record.id}_{record.business_id}"
+        # 批量创建并通过pipeline分块发布任务
+        tasks = TaskService.create_ocr_cert_tasks(records)
+        publish_result = TaskService.publish_tasks_bulk(
+            tasks, redis_client, registry=InFlightTaskRegistry.from_config(
+                redis_client, visibility_timeout=get_celery_config().CELERY_BROKER_VISIBILITY_TIMEOUT
             )
-            # 发布任务到Redis队列
-            TaskService.publish_task(task, redis_client)
-            task_ids.append(task.task_id)
+        )
+        task_ids = publish_result["task_ids"]
         
         return OCRTaskResponse(
             message="任务创建成功",
             data=OCRTaskData(
                 task_ids=task_ids,
                 count=len(task_ids),
+                failed_task_ids=publish_result["failed_task_ids"],
+                skipped_task_ids=publish_result["skipped_task_ids"],
                 business_ids=business_ids,  # 原始业务ID
                 company_ids=company_ids  # 关联的公司ID
             )
@@ -75,10 +80,10 @@ async def create_ocr_tasks_by_company_ids(
 ):
     """根据公司ID处理OCR任务接口（补全关联的业务ID）"""
     try:
-        # 步骤1：通过公司ID查询关联的业务ID（电站编号）
-        business_ids = await OCRService.fetch_business_ids_by_company_ids(company_ids, db)
-        # 步骤2：查询待处理OCR记录
-        records = await OCRService.fetch_ocr_records_by_company_ids(company_ids, db, ai_status=ai_status)
+        # 一次关联查询获取关联的业务ID（电站编号）及待处理OCR记录
+        records, business_ids, _ = await OCRService.resolve_ocr_records(
+            db, company_ids=company_ids, ai_status=ai_status
+        )
         
         if not records:
             return OCRTaskResponse(
@@ -91,20 +96,14 @@ async def create_ocr_tasks_by_company_ids(
                 )
             )
         
-        task_ids = []
-        for record in records:
-            # 使用TaskService创建任务
-            original_urls = record.url.split(',') if record.url else []
-            config = ApiConfig()
-            urls = [f"{config.dify.OCR_BASE_URL}{url}" for url in original_urls]
-            task = TaskService.create_task(
-                task_type="ocr_cert_processing",
-                content={"urls": urls},
-                task_id=f"{record.id}_{record.business_id}"
+        # 批量创建并通过pipeline分块发布任务
+        tasks = TaskService.create_ocr_cert_tasks(records)
+        publish_result = TaskService.publish_tasks_bulk(
+            tasks, redis_client, registry=InFlightTaskRegistry.from_config(
+                redis_client, visibility_timeout=get_celery_config().CELERY_BROKER_VISIBILITY_TIMEOUT
             )
-            # 发布任务到Redis队列
-            TaskService.publish_task(task, redis_client)
-            task_ids.append(task.task_id)
+        )
+        task_ids = publish_result["task_ids"]
         
         return OCRTaskResponse(
             message="任务创建成功",
@@ -112,6 +111,8 @@ async def create_ocr_tasks_by_company_ids(
                 company_ids=company_ids,  # 原始公司ID
                 task_ids=task_ids,
                 count=len(task_ids),
+                failed_task_ids=publish_result["failed_task_ids"],
+                skipped_task_ids=publish_result["skipped_task_ids"],
                 business_ids=business_ids  # 关联的业务ID
             )
         )
@@ -132,38 +133,44 @@ async def create_ocr_tasks(
         raise HTTPException(status_code=400, detail="请求数量必须大于0")
 
     try:
-        records = await OCRService.fetch_ocr_records(limit, db, ai_status=ai_status)
+        config = get_celery_config()
+        if config.CELERY_FETCH_CLAIM:
+            # 与定时拉取相同的领取方式，避免与其他拉取实例取到相同记录
+            records = await OCRService.claim_ocr_records(
+                limit, db, owner=f"api:{socket.gethostname()}:{os.getpid()}",
+                lease_seconds=config.CELERY_FETCH_LEASE_SECONDS, ai_status=ai_status
+            )
+        else:
+            records = await OCRService.fetch_ocr_records(limit, db, ai_status=ai_status)
         if not records:
             return OCRTaskResponse(
                 message="没有可处理的记录",
                 data=OCRTaskData(task_ids=[], count=0, business_ids=[], company_ids=[])
             )
         
-        # 提取业务ID列表
-        business_ids = list({record.business_id for record in records if record.business_id})
-        # 通过业务ID查询关联的公司ID
-        company_ids = await OCRService.fetch_company_ids_by_business_ids(business_ids, db) if business_ids else []
+        # 关联查询补全记录的业务ID与公司ID
+        _, business_ids, company_ids = await OCRService.resolve_ocr_records(db, records=records)
         
-        task_ids = []
-        for record in records:
-            # 使用TaskService创建任务
-            original_urls = record.url.split(',') if record.url else []
-            config = ApiConfig()
-            urls = [f"{config.dify.OCR_BASE_URL}{url}" for url in original_urls]
-            task = TaskService.create_task(
-                task_type="ocr_cert_processing",
-                content={"urls": urls},
-                task_id=f"{record.id}_{record.business_id}"  # 确保使用此格式
+        # 批量创建并通过pipeline分块发布任务
+        tasks = TaskService.create_ocr_cert_tasks(records)
+        publish_result = TaskService.publish_tasks_bulk(
+            tasks, redis_client, registry=InFlightTaskRegistry.from_config(
+                redis_client, visibility_timeout=get_celery_config().CELERY_BROKER_VISIBILITY_TIMEOUT
+            )
+        )
+        task_ids = publish_result["task_ids"]
+        if config.CELERY_FETCH_CLAIM and publish_result["failed_task_ids"]:
+            await OCRService.release_ocr_claims(
+                [int(task_id.split('_')[0]) for task_id in publish_result["failed_task_ids"]], db
             )
-            # 发布任务到Redis队列
-            TaskService.publish_task(task, redis_client)
-            task_ids.append(task.task_id)
         
         return OCRTaskResponse(
             message="任务创建成功",
             data=OCRTaskData(
                 task_ids=task_ids,
                 count=len(task_ids),
+                failed_task_ids=publish_result["failed_task_ids"],
+                skipped_task_ids=publish_result["skipped_task_ids"],
                 business_ids=business_ids,
                 company_ids=company_ids
             )
@@ -171,3 +178,61 @@ async def create_ocr_tasks(
     except Exception as e:
         logger.error(f"OCR任务处理异常：{str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail="服务器内部错误")
+
+@router.get("/cache/stats", response_model=SuccessResponse)
+async def get_ocr_cache_stats(redis_client: Redis = Depends(get_redis_client)):
+    """查询OCR识别结果缓存的命中/未命中/淘汰计数及当前条数"""
+    try:
+        stats = OCRResultCache(redis_client=redis_client).stats()
+        return SuccessResponse(message="查询成功", data=stats)
+    except Exception as e:
+        logger.error(f"OCR缓存统计查询失败：{str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="服务器内部错误")
+
+@router.get("/tasks/dedup/stats", response_model=SuccessResponse)
+async def get_ocr_task_dedup_stats(redis_client: Redis = Depends(get_redis_client)):
+    """查询在途任务去重统计（发布时、处理时跳过的重复任务数）"""
+    try:
+        stats = InFlightTaskRegistry(redis_client=redis_client).stats()
+        return SuccessResponse(message="查询成功", data=stats)
+    except Exception as e:
+        logger.error(f"在途任务去重统计查询失败：{str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="服务器内部错误")
+
+@router.get("/tasks/fetch/metrics", response_model=SuccessResponse)
+async def get_ocr_fetch_metrics(redis_client: Redis = Depends(get_redis_client)):
+    """查询定时拉取的背压指标（各轮拉取数量、跳过轮数、处理中任务数、完成速率）"""
+    try:
+        metrics = FetchBackpressure.from_config(get_celery_config(), redis_client).metrics()
+        return SuccessResponse(message="查询成功", data=metrics)
+    except Exception as e:
+        logger.error(f"拉取指标查询失败：{str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="服务器内部错误")
+
+@router.get("/tasks/writeback/stats", response_model=SuccessResponse)
+async def get_ocr_writeback_stats(redis_client: Redis = Depends(get_redis_client)):
+    """查询OCR结果合并回写统计（回写次数与条数、失败次数、补写条数、日志中待回写条数）"""
+    try:
+        stats = OCRResultWriteBuffer(SessionFactory, redis_client=redis_client).stats()
+        return SuccessResponse(message="查询成功", data=stats)
+    except Exception as e:
+        logger.error(f"合并回写统计查询失败：{str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="服务器内部错误")
+
+@router.get("/tasks/payload/sizes", response_model=SuccessResponse)
+async def get_task_payload_sizes(redis_client: Redis = Depends(get_redis_client)):
+    """查询Celery任务消息与结果的序列化大小直方图（按序列化格式分桶）"""
+    try:
+        # 先写入本进程累计的计数（API进程发布的任务消息）
+        histogram.flush()
+        stats = PayloadSizeHistogram(redis_client=redis_client).stats()
+        # 返回实际生效的格式（未安装可选依赖时已降级）
+        return SuccessResponse(message="查询成功", data={
+            "task_serializer": celery_app.conf.task_serializer,
+            "result_serializer": celery_app.conf.result_serializer,
+            "task_compression": celery_app.conf.task_compression,
+            "sizes": stats,
+        })
+    except Exception as e:
+        logger.error(f"消息体大小统计查询失败：{str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="服务器内部错误")
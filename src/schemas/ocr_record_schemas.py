@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Literal
 from src.schemas.response_schema import BaseResponse  # 导入统一响应体
 
 # 基础业务数据模型（纯数据描述）
@@ -40,6 +40,9 @@ class OCRListResponse(BaseResponse):
 class OCRUpdateAIStatusData(BaseModel):
     """批量更新AI状态的响应数据模型"""
     updated_count: int  # 明确更新数量类型
+    chunks: int = 0  # 分块更新的块数
+    published_count: int = 0  # 重新发布的任务数（publish=true时）
+    publish_failed_count: int = 0  # 发布失败的任务数（对应记录已重置为未处理，由定时拉取补发）
 
 # 更新AI状态响应模型（继承BaseResponse，使用专用数据模型）
 class OCRUpdateAIStatusResponse(BaseResponse):
@@ -50,19 +53,35 @@ class OCRUpdateAIStatusResponse(BaseResponse):
 class OCRUpdateAIStatusRequest(BaseModel):
     """批量更新AI状态的请求模型"""
     business_ids: List[str]  # 业务ID列表
+    publish: bool = False  # 是否将重置的记录重新发布为OCR任务
 
 # 新增：统计请求模型（支持公司/省份筛选）
 # 统计请求模型（仅保留ID筛选）
 class OCRStatusStatisticsRequest(BaseModel):
     company_ids: List[int] | None = None  # 公司ID列表（可选）
     province_ids: List[str] | None = None  # 省份代码列表（可选）
+    breakdowns: List[Literal["company", "province"]] | None = None  # 分组维度（可选）：按公司/省份返回分布
+    use_counters: bool = True  # 是否读取Redis状态计数（false时直接在数据库中聚合）
+
+# 分组统计项（公司ID或省份代码及该组的状态分布）
+class OCRStatusBreakdownItem(BaseModel):
+    key: str  # 公司ID或省份代码
+    ai_status_neg_1_count: int
+    ai_status_0_count: int
+    ai_status_1_count: int
+    ai_status_2_count: int
+    total_power_plants: int
 
 # 新增：统计结果数据模型
 class OCRStatusStatisticsData(BaseModel):
     ai_status_neg_1_count: int  # 处理失败数量（原ai_status_-1_count）
     ai_status_0_count: int   # 未处理数量
     ai_status_1_count: int   # 处理成功数量
+    ai_status_2_count: int = 0  # 处理中数量（已领取、租约未到期）
     total_power_plants: int  # 符合条件的电站总数（去重business_id）
+    by_company: List[OCRStatusBreakdownItem] | None = None  # 按公司分组的分布（请求breakdowns含company时返回）
+    by_province: List[OCRStatusBreakdownItem] | None = None  # 按省份分组的分布（请求breakdowns含province时返回）
+    source: str | None = None  # 数据来源：counters（Redis状态计数）| database（数据库聚合）
 
 # 新增：统计响应模型
 class OCRStatusStatisticsResponse(BaseResponse):
@@ -70,4 +89,5 @@ class OCRStatusStatisticsResponse(BaseResponse):
 
 # 新增：根据公司ID更新ai_status的请求模型
 class OCRUpdateAIStatusByCompanyRequest(BaseModel):
-    company_ids: List[str]  # 公司ID列表
\ No newline at end of file
+    company_ids: List[str]  # 公司ID列表
+    publish: bool = False  # 是否将重置的记录重新发布为OCR任务
\ No newline at end of file
@@ -9,6 +9,8 @@ class OCRTaskData(BaseModel):
     count: int  # 必选：任务数量
     business_ids: List[str]  # 必选：业务ID列表（电站编号）
     company_ids: List[str]  # 必选：公司ID列表
+    failed_task_ids: List[str] = []  # 可选：发布失败的任务ID列表
+    skipped_task_ids: List[str] = []  # 可选：已在途（排队或处理中）而跳过发布的任务ID列表
 
 # 统一响应模型（替代原多个子类响应）
 class OCRTaskResponse(BaseResponse):
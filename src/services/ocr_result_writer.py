@@ -0,0 +1,398 @@
+import os
+import json
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from redis import Redis
+from sqlalchemy.orm import Session
+from src.celery_app.app import get_celery_config
+from src.configs import get_api_config
+from src.configs.database import SessionFactory
+from src.configs.redis_config import get_redis_pool
+from src.services.ocr_service import OCRService
+from src.tools.task_dedup import InFlightTaskRegistry
+from src.tools.fetch_backpressure import FetchBackpressure
+
+logger = logging.getLogger("celery")
+
+# 仅删除与回写内容一致的日志条目（回写期间同一记录有新结果写入日志时保留新结果）
+_COMPARE_DELETE_SCRIPT = """
+local deleted = 0
+for i = 1, #ARGV, 2 do
+    if redis.call('HGET', KEYS[1], ARGV[i]) == ARGV[i + 1] then
+        deleted = deleted + redis.call('HDEL', KEYS[1], ARGV[i])
+    end
+end
+return deleted
+"""
+
+# 仅在日志条目未被新结果覆盖时更新（记录回写失败次数）
+_COMPARE_SET_SCRIPT = """
+if redis.call('HGET', KEYS[1], ARGV[1]) == ARGV[2] then
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+class OCRResultWriteBuffer:
+    """
+    OCR结果合并回写缓冲区（Celery Worker进程内，后台线程定时批量回写）
+
+    - 提交：结果先写入Redis日志（HASH，记录ID为键），再放入进程内缓冲区；同一记录的多次结果只保留最新一次
+    - 回写：缓冲区达到 max_rows 条或最早的结果等待超过 max_delay_ms 毫秒时，按主键一次 executemany 回写并提交
+    - 持久化兜底：回写成功后删除日志条目；进程在回写前退出时，日志条目由定时任务 replay_journal 补写
+    - 任务收尾：结果落库后才释放在途登记并登记背压完成（任务本身在提交后即返回）
+    - 批量回写失败时逐条回写，失败的结果按次数退避重试，达到 max_attempts 次后转入死信并释放在途登记
+    - Redis日志写入失败时直接同步回写该条结果
+    """
+
+    JOURNAL_KEY = "ocr:writeback:journal"  # HASH: 记录ID -> 待回写结果（JSON）
+    DEAD_LETTER_KEY = "ocr:writeback:dead"  # HASH: 记录ID -> 重试耗尽的结果（JSON，含最后一次错误）
+    STATS_KEY = "ocr:writeback:stats"  # HASH: flushes / flushed_rows / flush_failures / replayed_rows / dead_lettered
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        redis_client: Optional[Redis] = None,
+        max_rows: int = 200,
+        max_delay_ms: int = 500,
+        max_attempts: int = 5,
+        registry: Optional[InFlightTaskRegistry] = None,
+        backpressure: Optional[FetchBackpressure] = None
+    ):
+        """
+        :param session_factory: 数据库会话工厂（回写线程每次回写使用独立会话）
+        :param redis_client: Redis客户端，默认使用全局连接池
+        :param max_rows: 缓冲区达到该条数时立即回写
+        :param max_delay_ms: 结果在缓冲区中的最长等待时间（毫秒）
+        :param max_attempts: 单条结果回写失败达到该次数后转入死信
+        :param registry: 在途登记表，结果落库或转入死信后释放提交时携带的占用令牌
+        :param backpressure: 拉取背压控制器，结果落库或转入死信后登记任务完成
+        """
+        self.session_factory = session_factory
+        self.redis = redis_client or Redis(connection_pool=get_redis_pool())
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000
+        self.max_attempts = max_attempts
+        self.registry = registry
+        self.backpressure = backpressure
+        self._compare_delete = self.redis.register_script(_COMPARE_DELETE_SCRIPT)
+        self._compare_set = self.redis.register_script(_COMPARE_SET_SCRIPT)
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_config(
+        cls,
+        session_factory: Callable[[], Session] = SessionFactory,
+        redis_client: Optional[Redis] = None
+    ) -> "OCRResultWriteBuffer":
+        """按OCR与Celery配置创建回写缓冲区（含在途登记表与背压控制器）"""
+        config = get_api_config().ocr
+        celery_config = get_celery_config()
+        redis_client = redis_client or Redis(connection_pool=get_redis_pool())
+        return cls(
+            session_factory,
+            redis_client,
+            max_rows=config.WRITEBACK_MAX_ROWS,
+            max_delay_ms=config.WRITEBACK_MAX_DELAY_MS,
+            max_attempts=config.WRITEBACK_MAX_ATTEMPTS,
+            registry=InFlightTaskRegistry.from_config(redis_client, celery_config.CELERY_BROKER_VISIBILITY_TIMEOUT),
+            backpressure=FetchBackpressure.from_config(celery_config, redis_client)
+        )
+
+    def submit(
+        self,
+        record_id: int,
+        ai_task_id: str,
+        ai_content: list,
+        ai_status: int,
+        token: Optional[str] = None
+    ) -> None:
+        """
+        提交一条识别结果，由后台线程合并回写
+
+        提交成功后在途登记与背压完成由缓冲区在结果落库（或转入死信）后处理，调用方不再自行释放
+
+        :param token: 在途登记占用令牌
+        """
+        row = {
+            "id": record_id,
+            "ai_task_id": ai_task_id,
+            "ai_status": ai_status,
+            "ai_content": json.dumps(ai_content, ensure_ascii=False),
+            "token": token,
+            "attempts": 0,
+            "queued_at": time.time(),
+        }
+        payload = json.dumps(row, ensure_ascii=False)
+        try:
+            self.redis.hset(self.JOURNAL_KEY, str(record_id), payload)
+        except Exception as e:
+            logger.warning(f"OCR结果写入回写日志失败，直接回写记录{record_id}: {str(e)}")
+            self._write([row])
+            self._settle([row], success=True)
+            return
+        row["journal"] = payload
+        with self._lock:
+            self._pending[record_id] = row
+            full = len(self._pending) >= self.max_rows
+        self._ensure_thread()
+        if full:
+            self._wakeup.set()
+
+    def flush(self, force: bool = False) -> int:
+        """
+        回写缓冲区中到期的结果，返回回写条数
+
+        失败的结果计入失败次数后放回缓冲区退避重试（达到上限时转入死信）
+
+        :param force: 忽略退避时间，回写缓冲区中的全部结果
+        """
+        now = time.time()
+        with self._lock:
+            rows = [row for row in self._pending.values() if force or row.get("retry_at", 0) <= now]
+            for row in rows:
+                del self._pending[row["id"]]
+        if not rows:
+            return 0
+        written, failed = self._write_rows(rows)
+        self._complete(written)
+        retry = self._record_failures(failed)
+        if retry:
+            with self._lock:
+                for row in retry:
+                    # 回写期间同一记录已有更新的结果时不覆盖
+                    self._pending.setdefault(row["id"], row)
+            logger.warning(f"{len(retry)}条OCR结果回写失败，稍后重试")
+        return len(written)
+
+    def close(self) -> None:
+        """停止后台线程并回写剩余结果（Worker进程退出时调用）"""
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=self.max_delay + 10)
+        self.flush(force=True)
+
+    def replay_journal(self, min_age: float, batch_size: int = 500) -> int:
+        """
+        补写日志中等待超过 min_age 秒的结果（回写前退出的Worker遗留的条目）
+
+        :return: 补写条数
+        """
+        deadline = time.time() - min_age
+        replayed = 0
+        batch: List[Dict[str, Any]] = []
+        for field, payload in self.redis.hscan_iter(self.JOURNAL_KEY, count=batch_size):
+            row = json.loads(payload)
+            if row["queued_at"] > deadline:
+                continue
+            row["journal"] = payload
+            batch.append(row)
+            if len(batch) >= batch_size:
+                replayed += self._replay(batch)
+                batch = []
+        if batch:
+            replayed += self._replay(batch)
+        if replayed:
+            logger.warning(f"补写{replayed}条Worker退出前未回写的OCR结果")
+        return replayed
+
+    def stats(self) -> Dict[str, int]:
+        """获取回写统计（回写次数、回写条数、失败次数、补写条数、死信条数、日志与死信中的条数）"""
+        raw = self.redis.hgetall(self.STATS_KEY)
+        return {
+            "flushes": int(raw.get("flushes", 0)),
+            "flushed_rows": int(raw.get("flushed_rows", 0)),
+            "flush_failures": int(raw.get("flush_failures", 0)),
+            "replayed_rows": int(raw.get("replayed_rows", 0)),
+            "dead_lettered": int(raw.get("dead_lettered", 0)),
+            "journal_pending": self.redis.hlen(self.JOURNAL_KEY),
+            "dead_letter_pending": self.redis.hlen(self.DEAD_LETTER_KEY),
+        }
+
+    def _replay(self, rows: List[Dict[str, Any]]) -> int:
+        """补写一批日志条目，失败的条目计入失败次数后留在日志中，由下次补写重试（达到上限时转入死信）"""
+        written, failed = self._write_rows(rows)
+        self._complete(written)
+        self._record_failures(failed)
+        if written:
+            self.redis.hincrby(self.STATS_KEY, "replayed_rows", len(written))
+        return len(written)
+
+    def _write_rows(
+        self,
+        rows: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], List[Tuple[Dict[str, Any], Exception]]]:
+        """
+        批量回写，整批失败时逐条回写（个别记录出错不拖累同批其他结果）
+
+        :return: (回写成功的行, [(回写失败的行, 错误)])
+        """
+        try:
+            self._write(rows)
+            return rows, []
+        except Exception as e:
+            if len(rows) == 1:
+                return [], [(rows[0], e)]
+            logger.warning(f"{len(rows)}条OCR结果批量回写失败，改为逐条回写: {str(e)}")
+        written, failed = [], []
+        for row in rows:
+            try:
+                self._write([row])
+                written.append(row)
+            except Exception as e:
+                failed.append((row, e))
+        return written, failed
+
+    def _write(self, rows: List[Dict[str, Any]]) -> None:
+        db = self.session_factory()
+        try:
+            OCRService.bulk_update_ai_results(rows, db)
+        finally:
+            db.close()
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hincrby(self.STATS_KEY, "flushes", 1)
+            pipe.hincrby(self.STATS_KEY, "flushed_rows", len(rows))
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"回写统计记录失败: {str(e)}")
+        logger.info(f"批量回写{len(rows)}条OCR结果")
+
+    def _complete(self, rows: List[Dict[str, Any]]) -> None:
+        """结果落库后删除日志条目，释放在途登记并登记背压完成"""
+        if not rows:
+            return
+        self._forget(rows)
+        self._settle(rows, success=True)
+
+    def _record_failures(self, failed: List[Tuple[Dict[str, Any], Exception]]) -> List[Dict[str, Any]]:
+        """
+        记录回写失败：失败次数加一并更新日志条目，达到上限的结果转入死信
+
+        :return: 需要重试的行（日志条目已被新结果覆盖的行不再重试）
+        """
+        if not failed:
+            return []
+        self._incr_stat("flush_failures", 1)
+        retry, dead = [], []
+        for row, error in failed:
+            attempts = row.get("attempts", 0) + 1
+            if attempts >= self.max_attempts:
+                dead.append((row, error))
+                continue
+            updated = {key: value for key, value in row.items() if key not in ("journal", "retry_at")}
+            updated["attempts"] = attempts
+            # 补写任务按最近一次失败时间判断条目是否遗留，避免与仍在重试的Worker同时回写
+            updated["queued_at"] = time.time()
+            payload = json.dumps(updated, ensure_ascii=False)
+            if "journal" in row:
+                try:
+                    if not self._compare_set(keys=[self.JOURNAL_KEY], args=[str(row["id"]), row["journal"], payload]):
+                        continue
+                except Exception as e:
+                    logger.warning(f"更新回写日志条目失败: {str(e)}")
+                    payload = row["journal"]
+                updated["journal"] = payload
+            updated["retry_at"] = time.time() + min(2 ** attempts, 60)
+            retry.append(updated)
+        if dead:
+            self._dead_letter(dead)
+        return retry
+
+    def _dead_letter(self, failed: List[Tuple[Dict[str, Any], Exception]]) -> None:
+        """重试耗尽的结果转入死信并删除日志条目，释放在途登记（记录保持未完成，由后续拉取重新处理）"""
+        rows = [row for row, _ in failed]
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for row, error in failed:
+                entry = {key: value for key, value in row.items() if key not in ("journal", "retry_at")}
+                entry.update({"error": str(error), "failed_at": time.time()})
+                pipe.hset(self.DEAD_LETTER_KEY, str(row["id"]), json.dumps(entry, ensure_ascii=False))
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"OCR结果写入回写死信失败: {str(e)}")
+        for row, error in failed:
+            logger.error(f"记录{row['id']}的OCR结果回写{self.max_attempts}次失败，转入死信: {str(error)}")
+        self._forget(rows)
+        self._settle(rows, success=False)
+        self._incr_stat("dead_lettered", len(rows))
+
+    def _settle(self, rows: List[Dict[str, Any]], success: bool) -> None:
+        """释放提交时携带的在途登记并登记背压完成（仅落库成功时计入完成速率）"""
+        for row in rows:
+            if self.backpressure is not None:
+                self.backpressure.mark_completed(row["ai_task_id"], success)
+            if self.registry is not None:
+                self.registry.finish(row["ai_task_id"], row.get("token"), success)
+
+    def _incr_stat(self, field: str, amount: int) -> None:
+        try:
+            self.redis.hincrby(self.STATS_KEY, field, amount)
+        except Exception as e:
+            logger.warning(f"回写统计记录失败: {str(e)}")
+
+    def _forget(self, rows: List[Dict[str, Any]]) -> None:
+        """回写成功后删除对应的日志条目（删除失败时条目由补写任务幂等重放）"""
+        args: List[Any] = []
+        for row in rows:
+            if "journal" in row:
+                args.extend([str(row["id"]), row["journal"]])
+        if not args:
+            return
+        try:
+            self._compare_delete(keys=[self.JOURNAL_KEY], args=args)
+        except Exception as e:
+            logger.warning(f"删除回写日志条目失败: {str(e)}")
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="ocr-result-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self._wakeup.wait(self.max_delay)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"OCR结果批量回写异常: {str(e)}", exc_info=True)
+
+
+# 每个进程一个回写缓冲区（Celery prefork 子进程 fork 后重建）
+_buffer: Optional[OCRResultWriteBuffer] = None
+_buffer_pid: Optional[int] = None
+_buffer_lock = threading.Lock()
+
+
+def get_result_write_buffer() -> Optional[OCRResultWriteBuffer]:
+    """获取当前进程的OCR结果回写缓冲区，未启用合并回写时返回None"""
+    global _buffer, _buffer_pid
+    config = get_api_config().ocr
+    if not config.WRITEBACK_ENABLED:
+        return None
+    if _buffer is not None and _buffer_pid == os.getpid():
+        return _buffer
+    with _buffer_lock:
+        if _buffer is None or _buffer_pid != os.getpid():
+            _buffer = OCRResultWriteBuffer.from_config()
+            _buffer_pid = os.getpid()
+    return _buffer
+
+
+def close_result_write_buffer() -> None:
+    """回写当前进程缓冲区中的剩余结果（Worker进程退出时调用）"""
+    if _buffer is not None and _buffer_pid == os.getpid():
+        _buffer.close()
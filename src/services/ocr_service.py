@@ -1,8 +1,12 @@
+from typing import Any, Awaitable, Callable, Dict
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import or_, and_, func, select, update, case
 from src.models import OCRModel, PompPowerPlantBasic  
+from src.tools.record_cursor import RecordScanCursor
+from src.tools.status_counters import OCRStatusCounters
+from src.celery_app.app import get_celery_config
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
 import json
 from fastapi import HTTPException  
@@ -12,25 +16,52 @@ logger = logging.getLogger("celery")
 
 class OCRService:
     @staticmethod
-    async def _base_fetch_ocr_records(db: Session, business_ids: list[str] = None, limit: int = None, ai_status: int | None = None):
+    def _count_transitions(transitions: list[tuple]) -> None:
+        """状态变更提交后更新Redis状态计数 (业务ID, 原状态, 新状态)"""
+        counters = OCRStatusCounters.from_config()
+        if counters is not None:
+            counters.apply(transitions)
+
+    @staticmethod
+    def _lease_reset_values() -> dict:
+        """处理结束或重置时清除租约的字段；未启用领取模式时不访问租约列（数据库可尚未执行租约迁移）"""
+        if not get_celery_config().CELERY_FETCH_CLAIM:
+            return {}
+        return {OCRModel.ai_lease_owner: None, OCRModel.ai_lease_until: None}
+
+    @staticmethod
+    def _status_filter(ai_status: int | None):
+        """ai_status筛选条件（None表示未完成：ai_status不为1）"""
+        if ai_status is not None:
+            return OCRModel.ai_status == ai_status
+        return or_(OCRModel.ai_status != 1, OCRModel.ai_status == None)
+
+    @staticmethod
+    async def _base_fetch_ocr_records(
+        db: Session,
+        business_ids: list[str] = None,
+        limit: int = None,
+        ai_status: int | None = None,
+        id_range: tuple[int, int] | None = None
+    ):
         """
         基础OCR记录查询方法（抽象公共查询逻辑）
         :param db: 数据库会话
         :param business_ids: 业务ID列表（可选过滤条件）
         :param limit: 限制数量（可选）
+        :param id_range: id区间 (起点不含, 终点含)，指定时按id升序返回（可选）
         :return: OCR记录列表
         """
         # 公共条件：根据ai_status过滤或默认未完成状态
-        if ai_status is not None:
-            query = db.query(OCRModel).filter(OCRModel.ai_status == ai_status)
-        else:
-            query = db.query(OCRModel).filter(
-                or_(OCRModel.ai_status != 1, OCRModel.ai_status == None)
-            )
+        query = db.query(OCRModel).filter(OCRService._status_filter(ai_status))
 
         # 业务ID过滤（可选）
         if business_ids:
             query = query.filter(OCRModel.business_id.in_(business_ids))
+
+        # id区间过滤（可选，走主键范围扫描）
+        if id_range is not None:
+            query = query.filter(OCRModel.id > id_range[0], OCRModel.id <= id_range[1]).order_by(OCRModel.id)
         
         # 数量限制（可选）
         if limit is not None:
@@ -43,6 +74,163 @@ class OCRService:
         """获取指定数量的待处理OCR记录（调用基础查询方法）"""
         return await OCRService._base_fetch_ocr_records(db, limit=limit, ai_status=ai_status)
 
+    @staticmethod
+    async def claim_ocr_records(
+        limit: int,
+        db: Session,
+        owner: str,
+        lease_seconds: int,
+        ai_status: int | None = None,
+        partitions: int = 1,
+        partition: int = 0,
+        id_range: tuple[int, int] | None = None
+    ):
+        """
+        领取指定数量的待处理OCR记录（SELECT ... FOR UPDATE SKIP LOCKED + 租约）
+
+        被其他实例锁定或已领取且租约未到期（ai_status=2）的记录会被跳过，领取的记录置为处理中并写入租约，
+        多个拉取实例（及按 id 取模划分的分区）可同时拉取互不重叠的记录
+        :param limit: 领取数量
+        :param db: 数据库会话
+        :param owner: 租约持有者标识
+        :param lease_seconds: 租约时长（秒），到期未完成的记录可被重新领取或由回收任务重置
+        :param ai_status: 状态筛选（None表示ai_status不为1）
+        :param partitions: 分区总数
+        :param partition: 本实例负责的分区序号（id % partitions）
+        :param id_range: id区间 (起点不含, 终点含)（可选）
+        :return: 领取到的OCR记录列表
+        """
+        now = datetime.now()
+        if ai_status is not None:
+            status_filter = OCRModel.ai_status == ai_status
+        else:
+            status_filter = or_(OCRModel.ai_status != 1, OCRModel.ai_status == None)
+        query = db.query(OCRModel).filter(
+            status_filter,
+            OCRModel.is_delete == 0,
+            # 处理中的记录只有租约到期后才能重新领取
+            or_(OCRModel.ai_status != 2, OCRModel.ai_status == None,
+                OCRModel.ai_lease_until == None, OCRModel.ai_lease_until < now)
+        )
+        if partitions > 1:
+            query = query.filter(OCRModel.id % partitions == partition)
+        if id_range is not None:
+            query = query.filter(OCRModel.id > id_range[0], OCRModel.id <= id_range[1])
+        try:
+            records = query.order_by(OCRModel.id).limit(limit).with_for_update(skip_locked=True).all()
+            lease_until = now + timedelta(seconds=lease_seconds)
+            transitions = [(record.business_id, record.ai_status, 2) for record in records]
+            for record in records:
+                record.ai_status = 2
+                record.ai_lease_owner = owner
+                record.ai_lease_until = lease_until
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"领取OCR记录失败：{str(e)}", exc_info=True)
+            raise
+        OCRService._count_transitions(transitions)
+        logger.info(f"{owner}领取{len(records)}条OCR记录，租约至{lease_until}")
+        return records
+
+    @staticmethod
+    async def scan_ocr_records(
+        limit: int,
+        db: Session,
+        cursor: RecordScanCursor,
+        ai_status: int | None = None,
+        claim_owner: str | None = None,
+        lease_seconds: int = 0,
+        partitions: int = 1,
+        partition: int = 0
+    ):
+        """
+        按id区间增量扫描待处理OCR记录（从游标高水位继续，到达表尾后环绕）
+
+        每次查询只覆盖一个id区间（主键范围扫描），凑满 limit 或扫描区间数达到上限即停止，并保存新的高水位；
+        反复失败的记录不会一直占据表头，较早的待处理记录也会被轮到
+        :param limit: 本轮需要的记录数
+        :param db: 数据库会话
+        :param cursor: 扫描游标
+        :param ai_status: 状态筛选（None表示ai_status不为1）
+        :param claim_owner: 指定时以该持有者领取记录（SKIP LOCKED + 租约），否则只查询
+        :param lease_seconds: 领取租约时长（秒）
+        :param partitions: 分区总数（仅领取模式）
+        :param partition: 本实例负责的分区序号（仅领取模式）
+        :return: OCR记录列表
+        """
+        max_id = db.query(func.max(OCRModel.id)).scalar() or 0
+        start = cursor.get()
+        if start >= max_id:
+            start = 0
+        origin, wrapped = start, False
+        records = []
+        for _ in range(cursor.max_ranges):
+            end = min(start + cursor.range_size, max_id)
+            if wrapped and end >= origin:
+                end = origin  # 环绕后扫描到起点即完成一整圈
+            remaining = limit - len(records)
+            if claim_owner is not None:
+                batch = await OCRService.claim_ocr_records(
+                    remaining, db, owner=claim_owner, lease_seconds=lease_seconds, ai_status=ai_status,
+                    partitions=partitions, partition=partition, id_range=(start, end)
+                )
+            else:
+                batch = await OCRService._base_fetch_ocr_records(
+                    db, limit=remaining, ai_status=ai_status, id_range=(start, end)
+                )
+            records.extend(batch)
+            if len(batch) >= remaining:
+                start = batch[-1].id
+                break
+            start = end
+            if wrapped and start >= origin:
+                break
+            if start >= max_id:
+                start, wrapped = 0, True
+                if origin == 0:
+                    break
+        cursor.set(start)
+        logger.info(f"增量扫描OCR记录：获取{len(records)}条，游标推进至id={start}（最大id={max_id}）")
+        return records
+
+    @staticmethod
+    async def release_ocr_claims(record_ids: list[int], db: Session) -> int:
+        """释放未能发布的记录的租约（重置为未处理，下次拉取时重新领取）"""
+        if not record_ids:
+            return 0
+        return await OCRService._reset_claims(db, OCRModel.id.in_(record_ids), OCRModel.ai_status == 2)
+
+    @staticmethod
+    async def _reset_claims(db: Session, *conditions) -> int:
+        """将符合条件的处理中记录重置为未处理并清除租约（锁定后按主键更新，同时更新状态计数）"""
+        try:
+            rows = db.query(OCRModel.id, OCRModel.business_id).filter(*conditions).with_for_update().all()
+            if not rows:
+                db.commit()
+                return 0
+            updated = db.query(OCRModel).filter(OCRModel.id.in_([row.id for row in rows])).update(
+                {OCRModel.ai_status: 0, OCRModel.ai_lease_owner: None, OCRModel.ai_lease_until: None},
+                synchronize_session=False
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        OCRService._count_transitions([(row.business_id, 2, 0) for row in rows])
+        return updated
+
+    @staticmethod
+    async def reclaim_expired_ocr_leases(db: Session) -> int:
+        """回收租约已到期仍处于处理中的记录（Worker崩溃、任务丢失），重置为未处理"""
+        updated = await OCRService._reset_claims(
+            db, OCRModel.ai_status == 2,
+            or_(OCRModel.ai_lease_until == None, OCRModel.ai_lease_until < datetime.now())
+        )
+        if updated:
+            logger.warning(f"回收{updated}条租约到期的OCR记录")
+        return updated
+
     @staticmethod
     async def fetch_ocr_records_by_business_ids(business_ids: list[str], db: Session, ai_status: int | None = None):
         """根据业务ID列表获取待处理OCR记录（调用基础查询方法）"""
@@ -83,55 +271,164 @@ class OCRService:
         :param db: 数据库会话对象
         :return: 关联的OCR记录列表（ORM对象）
         """
-        if not company_ids:
-            logger.warning("传入的公司ID列表为空，无法查询OCR记录")
-            raise HTTPException(status_code=400, detail="公司ID列表不能为空")
-        
-        # 步骤1：获取公司关联的业务ID
-        business_ids = await OCRService.fetch_business_ids_by_company_ids(company_ids, db)
-        if not business_ids:
-            logger.info("未找到公司ID关联的业务ID")
-            return []
-        
-        # 步骤2：根据业务ID获取待处理记录（带ai_status过滤）
-        records = await OCRService.fetch_ocr_records_by_business_ids(business_ids, db, ai_status=ai_status)
+        records, _, _ = await OCRService.resolve_ocr_records(db, company_ids=company_ids, ai_status=ai_status)
         return records
 
     @staticmethod
-    async def update_ai_status_by_company_ids(company_ids: list[str], db: Session) -> int:
+    async def resolve_ocr_records(
+        db: Session,
+        company_ids: list[str] | None = None,
+        business_ids: list[str] | None = None,
+        ai_status: int | None = None,
+        records: list | None = None
+    ) -> tuple[list, list[str], list[str]]:
+        """
+        关联查询解析 公司ID/业务ID → 待处理OCR记录、业务ID、公司ID（不传递由查询结果拼出的业务ID IN列表）
+
+        - 按公司ID：电站表左关联OCR记录（状态条件在关联条件中），没有待处理记录的电站也会返回业务ID
+        - 按业务ID：OCR记录左关联电站表；公司ID为所传业务ID关联的全部公司，
+          没有待处理记录的业务ID再查询一次电站表补全（全部业务ID都有待处理记录时只有一次查询）
+        - 已获取的记录（/tasks 拉取或领取的记录）：按记录ID关联电站表，只补全业务ID与公司ID
+        :param db: 数据库会话
+        :param company_ids: 公司ID列表（与business_ids、records三选一）
+        :param business_ids: 业务ID列表
+        :param ai_status: 状态筛选（None表示ai_status不为1）
+        :param records: 已获取的OCR记录
+        :return: (OCR记录列表, 业务ID列表, 公司ID列表)，均已去重并保持查询顺序
+        """
+        if company_ids:
+            rows = db.query(PompPowerPlantBasic.power_number, PompPowerPlantBasic.company_id, OCRModel).select_from(
+                PompPowerPlantBasic
+            ).outerjoin(
+                OCRModel,
+                and_(OCRModel.business_id == PompPowerPlantBasic.power_number, OCRService._status_filter(ai_status))
+            ).filter(PompPowerPlantBasic.company_id.in_(company_ids)).all()
+        elif business_ids:
+            rows = db.query(OCRModel.business_id, PompPowerPlantBasic.company_id, OCRModel).outerjoin(
+                PompPowerPlantBasic, PompPowerPlantBasic.power_number == OCRModel.business_id
+            ).filter(OCRModel.business_id.in_(business_ids), OCRService._status_filter(ai_status)).all()
+        elif records:
+            rows = [
+                (row.business_id, row.company_id, None)
+                for row in db.query(OCRModel.business_id, PompPowerPlantBasic.company_id).join(
+                    PompPowerPlantBasic, PompPowerPlantBasic.power_number == OCRModel.business_id
+                ).filter(OCRModel.id.in_([record.id for record in records])).distinct().all()
+            ]
+        else:
+            logger.warning("公司ID与业务ID列表均为空，无法查询OCR记录")
+            raise HTTPException(status_code=400, detail="公司ID或业务ID列表不能为空")
+
+        # 一个业务ID可能对应多条电站记录，关联结果中的记录与ID去重
+        resolved_records = {record.id: record for record in records or []}
+        resolved_business_ids = {record.business_id: None for record in records or [] if record.business_id}
+        resolved_company_ids = {}
+        for business_id, company_id, record in rows:
+            resolved_business_ids[business_id] = None
+            if company_id is not None:
+                resolved_company_ids[str(company_id)] = None  # 转换为字符串与接口类型一致
+            if record is not None:
+                resolved_records[record.id] = record
+        if business_ids and not company_ids:
+            # 没有待处理记录的业务ID仍返回其关联的公司ID
+            idle_business_ids = [business_id for business_id in business_ids if business_id not in resolved_business_ids]
+            if idle_business_ids:
+                for row in db.query(PompPowerPlantBasic.company_id).filter(
+                    PompPowerPlantBasic.power_number.in_(idle_business_ids)
+                ).distinct().all():
+                    resolved_company_ids[str(row.company_id)] = None
+        logger.info(
+            f"关联查询获取{len(resolved_records)}条OCR记录，{len(resolved_business_ids)}个业务ID，{len(resolved_company_ids)}个公司ID"
+        )
+        return list(resolved_records.values()), list(resolved_business_ids), list(resolved_company_ids)
+
+    @staticmethod
+    async def update_ai_status_by_company_ids(company_ids: list[str], db: Session, chunk_size: int = 1000) -> int:
         """
         根据公司ID列表重置OCR记录的ai_status为0
         :param company_ids: 公司ID列表
         :param db: 数据库会话
+        :param chunk_size: 每个UPDATE语句覆盖的记录数
         :return: 更新的记录数量
         """
-        if not company_ids:
-            logger.warning("传入的公司ID列表为空，无法更新OCR记录")
-            raise HTTPException(status_code=400, detail="公司ID列表不能为空")
-        
-        # 步骤1：获取公司关联的业务ID
-        business_ids = await OCRService.fetch_business_ids_by_company_ids(company_ids, db)
-        if not business_ids:
-            logger.info("未找到公司ID关联的业务ID")
-            return 0
-        
-        # 步骤2：查询业务ID对应的有效OCR记录
-        records = db.query(OCRModel).filter(
-            OCRModel.business_id.in_(business_ids),
-            OCRModel.is_delete == 0
-        ).all()
-        
-        if not records:
-            logger.info("未找到需要更新的OCR记录")
-            return 0
-        
-        # 步骤3：批量更新ai_status为0
-        for record in records:
-            record.ai_status = 0
-        
-        db.commit()
-        logger.info(f"成功更新{len(records)}条OCR记录的ai_status为0")
-        return len(records)
+        result = await OCRService.reset_ai_status(db, company_ids=company_ids, chunk_size=chunk_size)
+        return result["updated"]
+
+    @staticmethod
+    async def reset_ai_status(
+        db: Session,
+        business_ids: list[str] | None = None,
+        company_ids: list[str] | None = None,
+        chunk_size: int = 1000,
+        claim_owner: str | None = None,
+        lease_seconds: int = 0,
+        on_chunk: Callable[[list], Awaitable[Any]] | None = None
+    ) -> Dict[str, int]:
+        """
+        按业务ID或公司ID分块重置OCR记录状态（集合UPDATE，内存占用与匹配记录数无关）
+
+        每块按id升序锁定并只查询主键、business_id、ai_status（及发布所需的url），随后以主键集合执行一次UPDATE并提交，
+        不加载 content、ai_content 等大字段，也不持有长事务
+        :param db: 数据库会话
+        :param business_ids: 业务ID列表
+        :param company_ids: 公司ID列表（通过电站表子查询关联业务ID，与business_ids二选一）
+        :param chunk_size: 每块记录数
+        :param claim_owner: 指定时重置为处理中并写入租约（重置后立即重新发布的记录不会被定时拉取重复领取），否则重置为未处理
+        :param lease_seconds: 租约时长（秒）
+        :param on_chunk: 每块提交后调用（参数为该块的 id、business_id、url 行），用于重新发布任务
+        :return: 匹配记录数、更新记录数、块数
+        """
+        if business_ids:
+            scope = OCRModel.business_id.in_(business_ids)
+        elif company_ids:
+            scope = OCRModel.business_id.in_(
+                select(PompPowerPlantBasic.power_number).where(PompPowerPlantBasic.company_id.in_(company_ids))
+            )
+        else:
+            logger.warning("业务ID与公司ID列表均为空，无法重置OCR记录")
+            raise HTTPException(status_code=400, detail="业务ID或公司ID列表不能为空")
+
+        if claim_owner is not None:
+            values = {
+                OCRModel.ai_status: 2,
+                OCRModel.ai_lease_owner: claim_owner,
+                OCRModel.ai_lease_until: datetime.now() + timedelta(seconds=lease_seconds),
+            }
+        else:
+            values = {OCRModel.ai_status: 0, **OCRService._lease_reset_values()}
+        new_status = values[OCRModel.ai_status]
+        columns = (OCRModel.id, OCRModel.business_id, OCRModel.ai_status)
+        if on_chunk is not None:
+            columns += (OCRModel.url,)
+
+        result = {"matched": 0, "updated": 0, "chunks": 0}
+        last_id = 0
+        while True:
+            rows = db.query(*columns).filter(
+                scope, OCRModel.is_delete == 0, OCRModel.id > last_id
+            ).order_by(OCRModel.id).limit(chunk_size).with_for_update().all()
+            if not rows:
+                db.commit()
+                break
+            try:
+                updated = db.query(OCRModel).filter(
+                    OCRModel.id.in_([row.id for row in rows])
+                ).update(values, synchronize_session=False)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"分块重置OCR记录失败（已完成{result['chunks']}块，失败块起点id>{last_id}）：{str(e)}", exc_info=True)
+                raise
+            last_id = rows[-1].id
+            OCRService._count_transitions([(row.business_id, row.ai_status, new_status) for row in rows])
+            result["matched"] += len(rows)
+            result["updated"] += updated
+            result["chunks"] += 1
+            if on_chunk is not None:
+                await on_chunk(rows)
+            if len(rows) < chunk_size:
+                break
+        logger.info(f"分块重置OCR记录：匹配{result['matched']}条，更新{result['updated']}条，共{result['chunks']}块")
+        return result
 
     @staticmethod
     def update_ai_result(record_id: int, ai_task_id: str, ai_content: list, ai_status: int, db: Session):
@@ -143,12 +440,17 @@ class OCRService:
             raise ValueError("OCR记录不存在")
         
         try:
+            old_status = ocr_record.ai_status
             ocr_record.ai_task_id = ai_task_id
             ocr_record.ai_status = ai_status
             ocr_record.ai_content = json.dumps(ai_content, ensure_ascii=False)
+            # 处理结束，清除领取租约
+            for column, value in OCRService._lease_reset_values().items():
+                setattr(ocr_record, column.key, value)
             ocr_record.update_time = datetime.now(pytz.timezone('Asia/Shanghai'))
             db.commit()
             db.refresh(ocr_record)
+            OCRService._count_transitions([(ocr_record.business_id, old_status, ai_status)])
             logger.info(f"OCR记录更新成功，记录ID：{record_id}")  # 关键成功日志保留
             return ocr_record
         except Exception as e:
@@ -156,6 +458,52 @@ class OCRService:
             logger.error(f"OCR记录更新失败（记录ID：{record_id}）：{str(e)}", exc_info=True)  # 关键异常保留
             raise HTTPException(status_code=500, detail=f"记录更新失败：{str(e)}")
 
+    @staticmethod
+    def bulk_update_ai_results(results: list[Dict[str, Any]], db: Session) -> int:
+        """
+        批量回写AI处理结果（按主键executemany，一个事务一次提交，不做逐条查询与刷新）
+
+        回写前以一次主键查询锁定记录并读取原状态，提交后更新状态计数；
+        已不存在的记录直接跳过（按主键批量UPDATE遇到缺失行会整批失败）
+
+        :param results: 回写行，每行包含 id、ai_task_id、ai_status、ai_content（已序列化的JSON字符串）
+        :param db: 数据库会话
+        :return: 回写行数
+        """
+        if not results:
+            return 0
+        now = datetime.now(pytz.timezone('Asia/Shanghai'))
+        lease_values = OCRService._lease_reset_values()
+        params = [{
+            "id": row["id"],
+            "ai_task_id": row["ai_task_id"],
+            "ai_status": row["ai_status"],
+            "ai_content": row["ai_content"],
+            # 处理结束，清除领取租约
+            **{column.key: value for column, value in lease_values.items()},
+            "update_time": now,
+        } for row in results]
+        try:
+            # 锁定待回写记录并读取原状态（一次主键查询），用于更新状态计数
+            current = db.query(OCRModel.id, OCRModel.business_id, OCRModel.ai_status).filter(
+                OCRModel.id.in_([row["id"] for row in params])
+            ).with_for_update().all()
+            existing = {row.id for row in current}
+            missing = [row["id"] for row in params if row["id"] not in existing]
+            if missing:
+                logger.warning(f"OCR记录不存在，跳过回写：{missing}")
+                params = [row for row in params if row["id"] in existing]
+            if params:
+                db.execute(update(OCRModel), params)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"批量回写OCR结果失败（{len(params)}条）：{str(e)}", exc_info=True)
+            raise
+        new_status = {row["id"]: row["ai_status"] for row in params}
+        OCRService._count_transitions([(row.business_id, row.ai_status, new_status[row.id]) for row in current])
+        return len(params)
+
     @staticmethod
     def check_need_ocr(record_id: int, db: Session) -> bool:
         """
@@ -221,54 +569,108 @@ class OCRService:
     async def get_ai_status_statistics(
         company_ids: list[int] | None = None,
         province_ids: list[str] | None = None,
-        db: Session = None
+        db: Session = None,
+        breakdowns: list[str] | None = None,
+        use_counters: bool = True
     ) -> dict:
         """
         根据公司/省份ID条件统计ai_status分布及电站总数（服务层独立参数）
         :param company_ids: 公司ID列表（可选）
         :param province_ids: 省份ID列表（可选）
         :param db: 数据库会话
+        :param breakdowns: 分组维度（company / province），按维度返回各公司/省份的分布（可选）
+        :param use_counters: 启用状态计数且已完成对账时读取Redis计数（不访问OCR表），否则在数据库中聚合
         :return: 统计结果字典
         """
         if not company_ids and not province_ids:
             logger.warning("至少需要提供一个筛选条件（公司ID/省份ID）")
             raise HTTPException(status_code=400, detail="至少需要提供一个筛选条件")
 
-        logger.info(f"开始OCR状态统计，公司ID：{company_ids}，省份ID：{province_ids}")
-        
-        # 关联OCRModel和PompPowerPlantBasic（business_id = power_number）
-        query = db.query(OCRModel).join(
-            PompPowerPlantBasic,
-            OCRModel.business_id == PompPowerPlantBasic.power_number
-        ).filter(OCRModel.is_delete == 0)  # 仅统计未删除记录
+        logger.info(f"开始OCR状态统计，公司ID：{company_ids}，省份ID：{province_ids}，分组：{breakdowns}")
 
-        # 构建筛选条件（仅保留ID筛选）
+        for breakdown in breakdowns or []:
+            if breakdown not in ("company", "province"):
+                raise HTTPException(status_code=400, detail=f"不支持的分组维度：{breakdown}")
+        counters = OCRStatusCounters.from_config() if use_counters else None
+        if counters is not None and counters.ready():
+            return {**counters.statistics(company_ids, province_ids, breakdowns), "source": "counters"}
+
+        def aggregate_query(*group_columns):
+            return OCRService._status_aggregate_query(db, *group_columns, company_ids=company_ids, province_ids=province_ids)
+
+        def counts(row) -> dict:
+            return {
+                "ai_status_neg_1_count": int(row.ai_status_neg_1_count or 0),
+                "ai_status_0_count": int(row.ai_status_0_count or 0),
+                "ai_status_1_count": int(row.ai_status_1_count or 0),
+                "ai_status_2_count": int(row.ai_status_2_count or 0),
+                "total_power_plants": int(row.total_power_plants or 0),
+            }
+
+        statistics = {**counts(aggregate_query().one()), "source": "database"}
+        group_columns = {"company": PompPowerPlantBasic.company_id, "province": PompPowerPlantBasic.province}
+        for breakdown in breakdowns or []:
+            rows = aggregate_query(group_columns[breakdown].label("key")).all()
+            statistics[f"by_{breakdown}"] = [{"key": str(row.key), **counts(row)} for row in rows]
+        return statistics
+
+    @staticmethod
+    def _status_aggregate_query(
+        db: Session,
+        *group_columns,
+        company_ids: list | None = None,
+        province_ids: list | None = None,
+        join_plants: bool = True
+    ):
+        """
+        未删除记录的ai_status分布聚合查询：只读取 ai_status、business_id 与分组列，按状态条件计数并对 business_id 去重计数
+
+        结果列依次为分组列、ai_status -1/0/1/2 的记录数、电站数
+        """
+        status = func.coalesce(OCRModel.ai_status, 0)  # ai_status为None的记录归为未处理（0）
+        query = db.query(
+            *group_columns,
+            func.sum(case((status == -1, 1), else_=0)).label("ai_status_neg_1_count"),
+            func.sum(case((status == 0, 1), else_=0)).label("ai_status_0_count"),
+            func.sum(case((status == 1, 1), else_=0)).label("ai_status_1_count"),
+            func.sum(case((status == 2, 1), else_=0)).label("ai_status_2_count"),
+            func.count(func.distinct(OCRModel.business_id)).label("total_power_plants"),
+        ).select_from(OCRModel)
+        if join_plants:
+            # 关联OCRModel和PompPowerPlantBasic（business_id = power_number）
+            query = query.join(PompPowerPlantBasic, OCRModel.business_id == PompPowerPlantBasic.power_number)
+        query = query.filter(OCRModel.is_delete == 0)  # 仅统计未删除记录
         if company_ids:
             query = query.filter(PompPowerPlantBasic.company_id.in_(company_ids))
         if province_ids:
             query = query.filter(PompPowerPlantBasic.province.in_(province_ids))
+        if group_columns:
+            query = query.group_by(*group_columns).order_by(*group_columns)
+        return query
 
-        # 移除await，同步执行查询（关键修复点）
-        records = db.execute(query)  # 改为同步调用
-        ocr_records = records.scalars().all()
-        
-        status_counts = {
-            -1: 0,
-            0: 0,
-            1: 0
-        }
-        business_ids = set()  # 用于去重统计电站数
-        for record in ocr_records:
-            status = record.ai_status or 0  # 处理ai_status为None的情况，默认归为未处理（0）
-            status_counts[status] += 1
-            business_ids.add(record.business_id)
-
-        return {
-            "ai_status_neg_1_count": status_counts[-1],
-            "ai_status_0_count": status_counts[0],
-            "ai_status_1_count": status_counts[1],
-            "total_power_plants": len(business_ids)
-        }
+    @staticmethod
+    async def reconcile_status_counters(db: Session, counters: OCRStatusCounters) -> dict:
+        """
+        以数据库聚合结果重建Redis状态计数
+
+        业务、公司、省份、公司+省份各维度在SQL中GROUP BY聚合，结果依次流式写入计数的新一代（不在进程内汇总）；
+        读取快照前开始记录增量，重建期间的状态变更在切换时补记
+        """
+        generation = counters.begin_reconcile()
+        company, province = PompPowerPlantBasic.company_id, PompPowerPlantBasic.province
+        plant_rows = db.query(PompPowerPlantBasic.power_number, company, province).order_by(
+            PompPowerPlantBasic.power_number
+        ).yield_per(5000)
+        business_rows = OCRService._status_aggregate_query(db, OCRModel.business_id, join_plants=False).yield_per(5000)
+        company_rows = OCRService._status_aggregate_query(db, company).yield_per(5000)
+        province_rows = OCRService._status_aggregate_query(db, province).yield_per(5000)
+        cp_rows = OCRService._status_aggregate_query(db, company, province).yield_per(5000)
+        member_rows = db.query(OCRModel.business_id, company, province).join(
+            PompPowerPlantBasic, OCRModel.business_id == PompPowerPlantBasic.power_number
+        ).filter(OCRModel.is_delete == 0).distinct().yield_per(5000)
+        return counters.reconcile(
+            generation, plant_rows, business_rows, company_rows, province_rows, cp_rows, member_rows
+        )
 
     @staticmethod
     async def fetch_latest_ocr_records(db: Session, business_ids: list[str] = None, ai_status: int | None = None, limit_count: int = 100):
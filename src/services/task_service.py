@@ -1,12 +1,23 @@
+import os
 import json
 import uuid
+import socket
 import time  # 新增导入
-from typing import Type, Dict, List, Any, Optional  # 添加Optional导入
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Type, Dict, List, Any, Optional, Tuple  # 添加Optional导入
 from redis import Redis
-from src.celery_app.app import CeleryConfig
+from redis.exceptions import ResponseError
+from sqlalchemy.orm import Session
+from src.celery_app.app import CeleryConfig, get_celery_config
+from src.configs import ApiConfig
 from .tasks.base_task import BaseTask, DataProcessingTask
 from .tasks.test_notification_task import TestNotificationTask
 from .tasks.ocr_cert_task import OCRCertTask
+from .ocr_service import OCRService
+from src.tools.task_dedup import InFlightTaskRegistry
+
+logger = logging.getLogger("celery")
 
 # 任务注册表 - 核心扩展点
 TASK_REGISTRY: Dict[str, Type[BaseTask]] = {
@@ -34,23 +45,275 @@ class TaskService:
         )
 
     @staticmethod
-    def publish_task(task: BaseTask, redis_client: Redis) -> None:
-        """发布任务到Redis频道"""
-        config = CeleryConfig()
-        redis_client.publish(
-            config.CELERY_TASK_QUEUE_CHANNEL,
-            json.dumps(task.to_dict())
+    def create_ocr_cert_tasks(records: List[Any]) -> List[BaseTask]:
+        """
+        根据OCR记录批量创建证件识别任务（任务ID为 记录ID_业务ID，URL补全文件服务器地址）
+
+        同时按URL类型与预估大小确定任务队列（纯图片 / PDF / 大PDF），开启大小探测时并发发起HEAD请求
+        """
+        config = ApiConfig()
+        base_url = config.dify.OCR_BASE_URL
+        tasks = []
+        for record in records:
+            original_urls = record.url.split(',') if record.url else []
+            tasks.append(TaskService.create_task(
+                task_type="ocr_cert_processing",
+                content={"urls": [f"{base_url}{url}" for url in original_urls]},
+                task_id=f"{record.id}_{record.business_id}"
+            ))
+        workers = 8 if config.ocr.QUEUE_SIZE_PROBE and len(tasks) > 1 else 1
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            queues = executor.map(lambda task: OCRCertTask.classify_queue(task.content["urls"], config.ocr), tasks)
+            for task, queue in zip(tasks, queues):
+                task.queue = queue
+        return tasks
+
+    @staticmethod
+    async def reset_and_republish_ocr_records(
+        db: Session,
+        redis_client: Redis,
+        publish: bool,
+        business_ids: Optional[List[str]] = None,
+        company_ids: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        按业务ID或公司ID分块重置OCR记录状态，publish为真时每块提交后立即重新发布该块的OCR任务
+
+        领取模式下重新发布的记录直接置为处理中并写入租约（避免定时拉取再次领取同一批记录），发布失败的记录释放租约
+
+        :return: {"updated": 更新数, "chunks": 块数}，publish为真时另含 "published"、"publish_failed"
+        """
+        chunk_size = ApiConfig().ocr.RESET_CHUNK_SIZE
+        if not publish:
+            result = await OCRService.reset_ai_status(
+                db, business_ids=business_ids, company_ids=company_ids, chunk_size=chunk_size
+            )
+            return {"updated": result["updated"], "chunks": result["chunks"]}
+
+        config = get_celery_config()
+        registry = InFlightTaskRegistry.from_config(
+            redis_client, visibility_timeout=config.CELERY_BROKER_VISIBILITY_TIMEOUT
+        )
+        counts = {"published": 0, "publish_failed": 0}
+
+        async def publish_chunk(rows):
+            tasks = TaskService.create_ocr_cert_tasks(rows)
+            publish_result = TaskService.publish_tasks_bulk(tasks, redis_client, registry=registry)
+            counts["published"] += publish_result["published"]
+            counts["publish_failed"] += len(publish_result["failed_task_ids"])
+            if config.CELERY_FETCH_CLAIM and publish_result["failed_task_ids"]:
+                await OCRService.release_ocr_claims(
+                    [int(task_id.split('_')[0]) for task_id in publish_result["failed_task_ids"]], db
+                )
+
+        result = await OCRService.reset_ai_status(
+            db, business_ids=business_ids, company_ids=company_ids, chunk_size=chunk_size,
+            claim_owner=f"reset:{socket.gethostname()}:{os.getpid()}" if config.CELERY_FETCH_CLAIM else None,
+            lease_seconds=config.CELERY_FETCH_LEASE_SECONDS,
+            on_chunk=publish_chunk
         )
+        return {"updated": result["updated"], "chunks": result["chunks"], **counts}
+
+    @staticmethod
+    def publish_task(task: BaseTask, redis_client: Redis) -> None:
+        """发布任务（按CELERY_TASK_TRANSPORT写入Redis Stream或Redis频道）"""
+        TaskService.publish_payload(redis_client, json.dumps(task.to_dict()), get_celery_config())
 
     @staticmethod
     def publish_batch_tasks(tasks: List[BaseTask], redis_client: Redis) -> None:
         """批量发布任务"""
-        config = CeleryConfig()
-        for task in tasks:
-            redis_client.publish(
-                config.CELERY_TASK_QUEUE_CHANNEL,
-                json.dumps(task.to_dict())
+        TaskService.publish_tasks_bulk(tasks, redis_client)
+
+    @staticmethod
+    def publish_tasks_bulk(
+        tasks: List[BaseTask],
+        redis_client: Redis,
+        chunk_size: Optional[int] = None,
+        registry: Optional[InFlightTaskRegistry] = None
+    ) -> Dict[str, Any]:
+        """
+        批量发布任务：先统一序列化，再按块通过Redis pipeline发送（每块一次网络往返）
+
+        单块发送失败不影响其他块，结果中按块报告发布数与失败的任务ID
+
+        :param registry: 在途任务去重登记表，传入时已在途的任务ID不再发布
+        :return: {"published": 成功数, "failed": 失败数, "task_ids": 成功的任务ID,
+                  "failed_task_ids": 失败的任务ID, "skipped_task_ids": 已在途跳过的任务ID,
+                  "chunks": [每块结果, ...]}
+        """
+        config = get_celery_config()
+        chunk_size = max(1, chunk_size or config.CELERY_TASK_PUBLISH_CHUNK)
+        skipped_task_ids = []
+        if registry is not None:
+            # 同一批内的重复任务ID只保留第一个
+            unique_tasks, seen = [], set()
+            for task in tasks:
+                if task.task_id in seen:
+                    skipped_task_ids.append(task.task_id)
+                else:
+                    seen.add(task.task_id)
+                    unique_tasks.append(task)
+            reserved = set(registry.reserve_many([task.task_id for task in unique_tasks]))
+            skipped_task_ids += [task.task_id for task in unique_tasks if task.task_id not in reserved]
+            tasks = [task for task in unique_tasks if task.task_id in reserved]
+        payloads = [(task.task_id, json.dumps(task.to_dict())) for task in tasks]
+        result = {
+            "published": 0, "failed": 0, "task_ids": [], "failed_task_ids": [],
+            "skipped_task_ids": skipped_task_ids, "chunks": []
+        }
+
+        for start in range(0, len(payloads), chunk_size):
+            chunk = payloads[start:start + chunk_size]
+            task_ids = [task_id for task_id, _ in chunk]
+            chunk_result = {"index": start // chunk_size, "size": len(chunk), "published": 0, "error": None}
+            pipe = redis_client.pipeline(transaction=False)
+            for _, payload in chunk:
+                TaskService.publish_payload(pipe, payload, config)
+            try:
+                replies = pipe.execute(raise_on_error=False)
+            except Exception as e:
+                # 连接级错误：整块失败
+                replies = [e] * len(chunk)
+                chunk_result["error"] = str(e)
+            for task_id, reply in zip(task_ids, replies):
+                if not isinstance(reply, Exception) and config.CELERY_TASK_TRANSPORT != "stream" and reply == 0:
+                    # pubsub模式PUBLISH返回收到消息的订阅者数，为0表示消息被丢弃（如Worker重启期间）
+                    reply = RuntimeError("没有订阅者接收任务消息")
+                if isinstance(reply, Exception):
+                    result["failed_task_ids"].append(task_id)
+                    chunk_result["error"] = chunk_result["error"] or str(reply)
+                else:
+                    result["task_ids"].append(task_id)
+                    chunk_result["published"] += 1
+            result["chunks"].append(chunk_result)
+            if chunk_result["error"]:
+                logger.error(
+                    f"批量发布任务第{chunk_result['index']}块部分失败："
+                    f"{chunk_result['published']}/{len(chunk)}，错误：{chunk_result['error']}"
+                )
+
+        if registry is not None and result["failed_task_ids"]:
+            # 发布失败的任务撤销登记，下次可重新发布
+            registry.unreserve_many(result["failed_task_ids"])
+        result["published"] = len(result["task_ids"])
+        result["failed"] = len(result["failed_task_ids"])
+        return result
+
+    @staticmethod
+    def publish_payload(redis_client: Redis, payload: str, config: CeleryConfig) -> None:
+        """
+        写入单条任务消息（redis_client 也可以是pipeline）：stream模式XADD到任务Stream（持久化），pubsub模式PUBLISH到频道
+
+        任务Stream不设长度上限：近似裁剪会删除已读取未确认的条目，分发器确认后自行删除条目
+        """
+        if config.CELERY_TASK_TRANSPORT == "stream":
+            redis_client.xadd(config.CELERY_TASK_STREAM, {"data": payload})
+        else:
+            redis_client.publish(config.CELERY_TASK_QUEUE_CHANNEL, payload)
+
+    @staticmethod
+    def ensure_stream_group(redis_client: Redis, config: CeleryConfig) -> None:
+        """创建分发器消费组（从Stream起点消费，消费组创建前写入的任务同样会被分发）"""
+        try:
+            redis_client.xgroup_create(
+                config.CELERY_TASK_STREAM, config.CELERY_TASK_STREAM_GROUP, id="0", mkstream=True
             )
+            logger.info(f"已创建任务Stream消费组: {config.CELERY_TASK_STREAM_GROUP}")
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    @staticmethod
+    def read_stream_tasks(
+        redis_client: Redis,
+        consumer: str,
+        config: CeleryConfig
+    ) -> List[Tuple[str, Dict[str, str]]]:
+        """以消费组方式读取新任务条目（每条只投递给组内一个分发器），无新条目时阻塞等待"""
+        response = redis_client.xreadgroup(
+            config.CELERY_TASK_STREAM_GROUP,
+            consumer,
+            {config.CELERY_TASK_STREAM: ">"},
+            count=config.CELERY_TASK_STREAM_BATCH,
+            block=config.CELERY_TASK_STREAM_BLOCK_MS
+        )
+        return [entry for _, entries in response for entry in entries] if response else []
+
+    @staticmethod
+    def claim_stale_stream_tasks(
+        redis_client: Redis,
+        consumer: str,
+        config: CeleryConfig
+    ) -> List[Tuple[str, Dict[str, str]]]:
+        """接管其他分发器读取后长时间未确认的条目（分发器崩溃或重启时）"""
+        claimed = []
+        start_id = "0-0"
+        while True:
+            response = redis_client.xautoclaim(
+                config.CELERY_TASK_STREAM,
+                config.CELERY_TASK_STREAM_GROUP,
+                consumer,
+                min_idle_time=config.CELERY_TASK_STREAM_CLAIM_IDLE_MS,
+                start_id=start_id,
+                count=config.CELERY_TASK_STREAM_BATCH
+            )
+            start_id, entries = response[0], response[1]
+            # 已被删除的条目返回为空字段，跳过
+            claimed.extend(entry for entry in entries if entry and entry[1])
+            if start_id in ("0-0", b"0-0") or not entries:
+                return claimed
+
+    @staticmethod
+    def ack_stream_tasks(redis_client: Redis, entry_ids: List[str], config: CeleryConfig) -> None:
+        """确认并删除已分发的条目（Stream长度即为未分发的积压量）"""
+        if not entry_ids:
+            return
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.xack(config.CELERY_TASK_STREAM, config.CELERY_TASK_STREAM_GROUP, *entry_ids)
+        pipe.xdel(config.CELERY_TASK_STREAM, *entry_ids)
+        pipe.execute()
+
+    @staticmethod
+    def dead_letter_stream_tasks(
+        redis_client: Redis,
+        entries: List[Tuple[str, Dict[str, str], str]],
+        config: CeleryConfig
+    ) -> None:
+        """将无法分发的条目（条目ID、字段、错误信息）转存到死信Stream，随后确认并删除原条目"""
+        if not entries:
+            return
+        pipe = redis_client.pipeline(transaction=False)
+        for entry_id, fields, error in entries:
+            pipe.xadd(
+                config.CELERY_TASK_STREAM_DEAD_LETTER,
+                {"entry_id": entry_id, "data": (fields or {}).get("data", ""), "error": error},
+                maxlen=config.CELERY_TASK_STREAM_DEAD_LETTER_MAXLEN,
+                approximate=True
+            )
+        pipe.execute()
+        TaskService.ack_stream_tasks(redis_client, [entry_id for entry_id, _, _ in entries], config)
+
+    @staticmethod
+    def stream_stats(redis_client: Redis) -> Dict[str, Any]:
+        """任务Stream统计：积压条目数、已读取未确认条目数、各分发器状态"""
+        config = get_celery_config()
+        stats = {"transport": config.CELERY_TASK_TRANSPORT, "stream": config.CELERY_TASK_STREAM}
+        stats["dead_letter"] = redis_client.xlen(config.CELERY_TASK_STREAM_DEAD_LETTER)
+        if not redis_client.exists(config.CELERY_TASK_STREAM):
+            return {**stats, "length": 0, "pending": 0, "consumers": []}
+        pending = redis_client.xpending(config.CELERY_TASK_STREAM, config.CELERY_TASK_STREAM_GROUP)
+        try:
+            consumers = redis_client.xinfo_consumers(config.CELERY_TASK_STREAM, config.CELERY_TASK_STREAM_GROUP)
+        except ResponseError:
+            consumers = []
+        return {
+            **stats,
+            "length": redis_client.xlen(config.CELERY_TASK_STREAM),
+            "pending": pending["pending"] if pending else 0,
+            "consumers": [
+                {"name": c["name"], "pending": c["pending"], "idle_ms": c["idle"]} for c in consumers
+            ],
+        }
 
     @staticmethod
     def parse_task(data: Dict[str, Any]) -> BaseTask:
@@ -1,13 +1,15 @@
 from abc import ABC, abstractmethod
 import json
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 # 初始化日志器（与subscriber_tasks.py保持一致）
 logger = logging.getLogger("celery")
 
 class BaseTask(ABC):
     task_type: str = None
+    queue: Optional[str] = None  # 发布时确定的Celery队列（为None时使用默认路由）
+    final_attempt: bool = True  # 是否为最后一次执行（失败后不再重试），由执行任务的Celery任务在处理前设置
 
     @abstractmethod
     def __init__(self, task_id: str, content: Any):
@@ -22,11 +24,14 @@ class BaseTask(ABC):
 
     def to_dict(self) -> Dict[str, Any]:
         """序列化为字典用于Redis发布"""
-        return {
+        data = {
             "task_type": self.task_type,
             "task_id": self.task_id,
             "content": self.content
         }
+        if self.queue:
+            data["queue"] = self.queue
+        return data
 
     @abstractmethod
     def process(self) -> Dict[str, Any]:
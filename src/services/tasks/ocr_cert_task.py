@@ -1,9 +1,19 @@
 import json
+import asyncio
 import logging
-from typing import Dict, Any
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
 from src.tools.pdf2image import PdfToImageConverter
 from src.tools.ocr_cert import OCRCertInfoExtractor
+from src.tools.task_dedup import InFlightTaskRegistry
+from src.tools.fetch_backpressure import FetchBackpressure
+from src.tools.async_runner import run_async, get_concurrency_budget, get_async_http_client
+from src.configs import get_api_config
+from src.celery_app.app import get_celery_config
+from src.configs.http_config import get_http_session
 from src.services.ocr_service import OCRService
+from src.services.ocr_result_writer import get_result_write_buffer
 from io import BytesIO
 from src.services.tasks.base_task import BaseTask
 from src.configs.database import get_db_conn
@@ -18,6 +28,10 @@ class OCRCertTask(BaseTask):
 
     def __init__(self, task_id: str, content: Dict[str, Any]):
         super().__init__(task_id, content)
+        # 各PDF的页面过滤判定（空白页/重复页），写入任务结果便于审计
+        self.page_filter_log: Dict[str, Dict[str, Any]] = {}
+        # 结果已提交合并回写缓冲区：在途登记与背压完成由缓冲区在结果落库后处理
+        self.result_deferred = False
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'OCRCertTask':
@@ -30,6 +44,37 @@ class OCRCertTask(BaseTask):
         # 解析逻辑实现
         return self.content
 
+    @staticmethod
+    def classify_queue(urls: List[str], ocr_config=None) -> str:
+        """
+        按URL类型与预估大小为记录选择Celery队列
+
+        - 不含PDF：ocr_image
+        - PDF数量或（开启大小探测时）PDF总大小达到阈值：ocr_pdf_large
+        - 其余：ocr_pdf
+        """
+        ocr_config = ocr_config or get_api_config().ocr
+        pdf_urls = [url.strip() for url in urls if url.strip().lower().endswith('.pdf')]
+        if not pdf_urls:
+            return "ocr_image"
+        if len(pdf_urls) >= ocr_config.QUEUE_LARGE_PDF_COUNT:
+            return "ocr_pdf_large"
+        if ocr_config.QUEUE_SIZE_PROBE:
+            total_bytes = sum(OCRCertTask._probe_size(url) for url in pdf_urls)
+            if total_bytes >= ocr_config.QUEUE_LARGE_PDF_BYTES:
+                return "ocr_pdf_large"
+        return "ocr_pdf"
+
+    @staticmethod
+    def _probe_size(url: str) -> int:
+        """HEAD请求获取文件大小（Content-Length），失败时返回0"""
+        try:
+            response = get_http_session().head(url, timeout=3, allow_redirects=True)
+            return int(response.headers.get("Content-Length", 0)) if response.ok else 0
+        except Exception as e:
+            logger.debug(f"文件大小探测失败: {url}，{str(e)}")
+            return 0
+
     def image_urls_to_ocr_results(self, urls: list, workers: int = 2):
         """
         从图片URL列表获取OCR识别结果
@@ -38,93 +83,333 @@ class OCRCertTask(BaseTask):
         :param workers: 并行工作线程数
         :return: OCR识别结果的字典列表
         """
-        # 初始化OCR信息提取器
-        ocr_extractor = OCRCertInfoExtractor()
-        # 设置工作线程数
-        ocr_extractor.max_workers = workers
+        # 初始化OCR信息提取器（进程级共享实例，工作线程数按调用传入，不修改共享实例）
+        ocr_extractor = OCRCertInfoExtractor.get_instance()
         # 从URL列表获取OCR结果
-        return ocr_extractor.from_urls(urls)
+        return ocr_extractor.from_urls(urls, max_workers=workers)
 
-    def pdf_urls_to_ocr_results(self, pdf_urls: list, scale_factor: float = 2.0, workers: int = 2):
+    def pdf_urls_to_ocr_results(
+        self,
+        pdf_urls: list,
+        scale_factor: float = 2.0,
+        workers: int = 2,
+        window: int = 4,
+        text_min_chars: int = 0
+    ):
         """
-        从 PDF URL 列表获取 OCR 识别结果
+        从 PDF URL 列表获取 OCR 识别结果（渲染与识别流水线并行）
 
         :param pdf_urls: PDF 文件 URL 列表
         :param scale_factor: 缩放倍数，默认为初始化时的设置
         :param workers: 并行工作线程数，默认为初始化时的设置
+        :param window: 在途页数上限（已渲染未完成识别的页数）
+        :param text_min_chars: 文本层有效字符数达到该值的页面走纯文本识别，0表示全部页面渲染识别
         :return: OCR 识别结果的字典列表
         """
         # 初始化 PDF 转图片转换器
-        pdf_converter = PdfToImageConverter(scale_factor=scale_factor, workers=workers)
+        pdf_converter = self._build_pdf_converter(scale_factor=scale_factor, workers=workers)
         # 初始化 OCR 信息提取器
-        ocr_extractor = OCRCertInfoExtractor()
-
-        # 将 PDF URL 列表转换为图片文件流列表
-        image_streams = pdf_converter.urls_to_image_streams(pdf_urls, scale_factor, workers)
+        ocr_extractor = OCRCertInfoExtractor.get_instance()
 
         ocr_results = []
-        # 对每个图片文件流进行 OCR 识别
-        for image_stream in image_streams:
-            try:
-                # 将字节流转换为文件流对象
-                with BytesIO(image_stream) as img_buffer:
-                    # 进行 OCR 识别
-                    result = ocr_extractor.from_file(img_buffer)
+
+        def collect(future):
+            result = future.result()
+            if result is not None:
                 ocr_results.append(result)
-            except Exception as e:
-                print(f"OCR 识别出错: {str(e)}")
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for pdf_url in pdf_urls:
+                pdf_content = pdf_converter._download_pdf(pdf_url)
+                if not pdf_content:
+                    logger.error(f"未获取到PDF内容: {pdf_url}")
+                    continue
+                # 第N页提交识别后立即渲染第N+1页，窗口满时按页序等待最早一页完成
+                in_flight = deque()
+                page_filter = pdf_converter.new_page_filter()
+                try:
+                    for page in pdf_converter.iter_pdf_pages(pdf_content, scale_factor, text_min_chars, page_filter):
+                        if page["skipped"] is not None:
+                            continue
+                        in_flight.append(executor.submit(
+                            self._ocr_pdf_page, ocr_extractor, page, pdf_converter.image_format
+                        ))
+                        while len(in_flight) >= max(1, window):
+                            collect(in_flight.popleft())
+                except Exception as e:
+                    logger.error(f"PDF转换失败: {pdf_url}, 错误: {str(e)}")
+                while in_flight:
+                    collect(in_flight.popleft())
+                if page_filter is not None:
+                    self.page_filter_log[pdf_url] = page_filter.summary()
 
         return ocr_results
 
-    # 修改process方法定义，移除Depends依赖注入
-    def process(self):
-        # 手动获取数据库会话
-        db = next(get_db_conn())
+    @staticmethod
+    def _build_pdf_converter(**kwargs) -> PdfToImageConverter:
+        """按OCR配置创建PDF转换器（下载缓存、渲染后端、像素预算与编码格式、页面过滤）"""
+        ocr_config = get_api_config().ocr
+        if ocr_config.DOWNLOAD_CACHE_ENABLED:
+            kwargs.setdefault("download_cache_max_bytes", ocr_config.DOWNLOAD_CACHE_MAX_BYTES)
+        kwargs.setdefault("render_backend", ocr_config.RENDER_BACKEND)
+        kwargs.setdefault("render_processes", ocr_config.RENDER_PROCESSES)
+        kwargs.setdefault("render_pages_per_task", ocr_config.RENDER_PAGES_PER_TASK)
+        kwargs.setdefault("max_pixels", ocr_config.MAX_PIXELS or None)
+        kwargs.setdefault("image_format", ocr_config.IMAGE_FORMAT)
+        kwargs.setdefault("image_quality", ocr_config.IMAGE_QUALITY)
+        if ocr_config.PAGE_FILTER_ENABLED:
+            kwargs.setdefault("page_filter_options", {
+                "blank_ink_ratio": ocr_config.PAGE_FILTER_BLANK_INK_RATIO,
+                "blank_std": ocr_config.PAGE_FILTER_BLANK_STD,
+                "duplicate_distance": ocr_config.PAGE_FILTER_DUPLICATE_DISTANCE,
+                "duplicate_max_diff": ocr_config.PAGE_FILTER_DUPLICATE_MAX_DIFF,
+            })
+        return PdfToImageConverter(**kwargs)
+
+    @staticmethod
+    def _text_layer_min_chars(ocr_config) -> int:
+        """文本层快速路径的最少有效字符数，未启用时返回0"""
+        if ocr_config.TEXT_LAYER_MODE == "llm":
+            return ocr_config.TEXT_LAYER_MIN_CHARS
+        return 0
+
+    @staticmethod
+    def _ocr_pdf_page(ocr_extractor: OCRCertInfoExtractor, page: Dict[str, Any], image_format: str = "jpeg"):
+        """对单页PDF内容（文本层或图片字节流）进行识别，出错时记录日志并返回None"""
         try:
-            logger.info(f"开始处理通知任务，ID: {self.task_id}，内容: {self.content}")
+            if page["image"] is None:
+                return ocr_extractor.from_text(page["text"])
+            # 将字节流转换为文件流对象
+            with BytesIO(page["image"]) as img_buffer:
+                return ocr_extractor.from_file(img_buffer, image_format=image_format)
+        except Exception as e:
+            logger.error(f"OCR 识别出错: {str(e)}")
+            return None
+
+    async def aurls_to_ocr_results(
+        self,
+        pdf_urls: list,
+        image_urls: list,
+        concurrency: int = 8,
+        scale_factor: float = 2.0,
+        window: int = 4,
+        text_min_chars: int = 0
+    ) -> List[Dict[str, Any]]:
+        """
+        异步获取PDF与图片URL的OCR识别结果（单事件循环，页面/URL共享同一并发预算）
+
+        :param pdf_urls: PDF 文件 URL 列表
+        :param image_urls: 图片 URL 列表
+        :param concurrency: 并发预算上限（下载、渲染、VLM调用共用）
+        :param scale_factor: PDF渲染缩放倍数
+        :param window: 每个PDF的在途页数上限（已渲染未完成识别的页数）
+        :param text_min_chars: 文本层有效字符数达到该值的页面走纯文本识别，0表示全部页面渲染识别
+        :return: OCR 识别结果的字典列表（PDF结果在前，图片结果在后，与同步模式一致）
+        """
+        budget = get_concurrency_budget(concurrency)
+        pdf_converter = self._build_pdf_converter(scale_factor=scale_factor)
+        ocr_extractor = OCRCertInfoExtractor.get_instance()
+        http_client = get_async_http_client(timeout=pdf_converter.timeout)
+
+        async def ocr_page(page: Dict[str, Any]) -> Dict[str, Any] | None:
+            # 与同步模式一致：单页识别出错时记录日志并丢弃该页
+            async with budget:
+                try:
+                    if page["image"] is None:
+                        return await ocr_extractor.afrom_text(page["text"])
+                    with BytesIO(page["image"]) as img_buffer:
+                        return await ocr_extractor.afrom_file(img_buffer, image_format=pdf_converter.image_format)
+                except Exception as e:
+                    logger.error(f"OCR 识别出错: {str(e)}")
+                    return None
+
+        async def ocr_pdf(pdf_url: str) -> List[Dict[str, Any]]:
+            # 下载占用预算，页面识别阶段按页竞争预算，避免嵌套持有导致死锁
+            async with budget:
+                pdf_content = await pdf_converter._adownload_pdf(pdf_url, http_client)
+            if not pdf_content:
+                logger.error(f"未获取到PDF内容: {pdf_url}")
+                return []
+
+            # 渲染在专用单线程中逐页推进，窗口限制已渲染未识别的页数
+            window_slots = asyncio.Semaphore(max(1, window))
+            page_tasks = []
+            page_filter = pdf_converter.new_page_filter()
+            page_iter = pdf_converter.iter_pdf_pages(pdf_content, scale_factor, text_min_chars, page_filter)
+            loop = asyncio.get_running_loop()
+
+            async def ocr_windowed_page(page: Dict[str, Any]) -> Dict[str, Any] | None:
+                try:
+                    return await ocr_page(page)
+                finally:
+                    window_slots.release()
 
-            # 获取URL列表并分类
-            urls = self.content.get("urls", [])
-            pdf_urls = [url.strip() for url in urls if url.strip().lower().endswith('.pdf')]
-            image_urls = [url.strip() for url in urls if not url.strip().lower().endswith('.pdf')]
-    
-            # 分别处理不同类型的URL
-            ocr_results = []
+            with ThreadPoolExecutor(max_workers=1) as render_executor:
+                try:
+                    while True:
+                        await window_slots.acquire()
+                        page = await loop.run_in_executor(render_executor, next, page_iter, None)
+                        if page is None:
+                            window_slots.release()
+                            break
+                        if page["skipped"] is not None:
+                            window_slots.release()
+                            continue
+                        page_tasks.append(asyncio.create_task(ocr_windowed_page(page)))
+                except Exception as e:
+                    logger.error(f"PDF转换失败: {pdf_url}, 错误: {str(e)}")
+                finally:
+                    await loop.run_in_executor(render_executor, page_iter.close)
+            if page_filter is not None:
+                self.page_filter_log[pdf_url] = page_filter.summary()
+            return [result for result in await asyncio.gather(*page_tasks) if result is not None]
+
+        async def ocr_image_url(image_url: str) -> Dict[str, Any]:
+            async with budget:
+                try:
+                    return await ocr_extractor.afrom_url(image_url)
+                except Exception as e:
+                    return {"error": str(e)}
+
+        pdf_results, image_results = await asyncio.gather(
+            asyncio.gather(*(ocr_pdf(url) for url in pdf_urls)),
+            asyncio.gather(*(ocr_image_url(url) for url in image_urls)),
+        )
+        ocr_results = [result for page_results in pdf_results for result in page_results]
+        ocr_results.extend(image_results)
+        return ocr_results
+
+    def collect_ocr_results(self, urls: List[str]) -> List[Dict[str, Any]]:
+        """按URL类型分别识别（异步模式下在进程常驻事件循环中并发执行），PDF结果在前、图片结果在后"""
+        pdf_urls = [url.strip() for url in urls if url.strip().lower().endswith('.pdf')]
+        image_urls = [url.strip() for url in urls if not url.strip().lower().endswith('.pdf')]
+
+        ocr_config = get_api_config().ocr
+        ocr_results = []
+        if ocr_config.ASYNC_ENABLED:
+            ocr_results.extend(run_async(
+                self.aurls_to_ocr_results(
+                    pdf_urls, image_urls,
+                    concurrency=ocr_config.CONCURRENCY,
+                    window=ocr_config.PAGE_WINDOW,
+                    text_min_chars=self._text_layer_min_chars(ocr_config)
+                )
+            ))
+        else:
             if pdf_urls:
-                ocr_results.extend(self.pdf_urls_to_ocr_results(pdf_urls))
+                ocr_results.extend(self.pdf_urls_to_ocr_results(
+                    pdf_urls,
+                    window=ocr_config.PAGE_WINDOW,
+                    text_min_chars=self._text_layer_min_chars(ocr_config)
+                ))
             if image_urls:
                 ocr_results.extend(self.image_urls_to_ocr_results(image_urls))
-            
-            # 新增：验证OCR结果是否包含错误
-            has_error = False
-            for result in ocr_results:
-                if isinstance(result, dict) and 'error' in result:
-                    has_error = True
-                    logger.error(f"OCR识别失败: {result['error']}")
-                    break
-            
+        return ocr_results
+
+    def write_ocr_results(
+        self,
+        ocr_results: List[Dict[str, Any]],
+        db: Session,
+        token: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        校验识别结果并一次性回写OCR记录（含错误结果时ai_status为-1），返回任务结果
+
+        :param token: 在途登记占用令牌，开启合并回写时随结果提交，由缓冲区在结果落库后释放
+        """
+        # 新增：验证OCR结果是否包含错误
+        has_error = False
+        for result in ocr_results:
+            if isinstance(result, dict) and 'error' in result:
+                has_error = True
+                logger.error(f"OCR识别失败: {result['error']}")
+                break
+
+        try:
+            # 从task_id解析record_id
+            record_id = int(self.task_id.split('_')[0])
+            # 根据是否有错误设置ai_status
+            ai_status = -1 if has_error else 1
+            ai_content = self.convert_data1_to_data2_structure(ocr_results)
+            write_buffer = get_result_write_buffer()
+            if write_buffer is not None:
+                # 合并回写：写入Redis日志后由后台线程批量回写数据库
+                write_buffer.submit(record_id, self.task_id, ai_content, ai_status, token)
+                self.result_deferred = True
+            else:
+                OCRService.update_ai_result(record_id, self.task_id, ai_content, ai_status, db)
+        except Exception as e:
+            logger.error(f"OCR结果更新失败: {str(e)}")
+            raise
+
+        # 实际业务处理逻辑
+        if get_api_config().ocr.RESULT_MODE == "summary":
+            # 完整识别结果已回写数据库，任务结果只保留摘要与记录引用，减小结果后端存储与传输量
+            processed_result = {
+                "status": "notified",
+                "ref": {"record_id": record_id, "ai_task_id": self.task_id},
+                "ai_status": ai_status,
+                "url_count": len(self.content.get("urls", [])),
+                "result_count": len(ocr_results),
+                "error_count": sum(1 for result in ocr_results if isinstance(result, dict) and 'error' in result),
+            }
+        else:
+            processed_result = {"status": "notified", "content": self.content, "ocr_results": ocr_results}
+        if self.page_filter_log:
+            processed_result["page_filter"] = self.page_filter_log
+
+        return {
+            "status": "success",
+            "task_id": self.task_id,
+            "result": processed_result
+        }
+
+    # 修改process方法定义，移除Depends依赖注入
+    def process(self):
+        # 处理前占用在途登记，已有副本在处理时跳过（避免重复调用VLM与并发回写同一记录）
+        registry = InFlightTaskRegistry.from_config(
+            visibility_timeout=get_celery_config().CELERY_BROKER_VISIBILITY_TIMEOUT
+        )
+        token = registry.begin(self.task_id) if registry is not None else None
+        if registry is not None and token is None:
+            return {"status": "skipped", "task_id": self.task_id, "result": {"reason": "duplicate"}}
+        # 登记处理中（拉取背压统计积压量与完成速率）
+        backpressure = FetchBackpressure.from_config(get_celery_config())
+        backpressure.mark_started(self.task_id)
+
+        urls = self.content.get("urls", [])
+        if get_api_config().ocr.FANOUT_ENABLED and len(urls) > 1:
+            # 扇出模式：每个URL一个子任务，汇总任务统一回写并释放在途登记
+            from src.celery_app.ocr_fanout_tasks import fan_out_record
             try:
-                # 从task_id解析record_id
-                record_id = int(self.task_id.split('_')[0])
-                # 根据是否有错误设置ai_status
-                ai_status = -1 if has_error else 1
-                OCRService.update_ai_result(record_id, self.task_id, self.convert_data1_to_data2_structure(ocr_results), ai_status, db)
-            except Exception as e:
-                logger.error(f"OCR结果更新失败: {str(e)}")
+                fan_out_record(self.task_id, urls, token)
+            except Exception:
+                backpressure.mark_completed(self.task_id, success=False)
+                if registry is not None:
+                    registry.finish(self.task_id, token, success=False, final_attempt=self.final_attempt)
                 raise
-    
-            # 实际业务处理逻辑
-            processed_result = {"status": "notified", "content": self.content, "ocr_results": ocr_results}
+            logger.info(f"任务{self.task_id}已扇出为{len(urls)}个URL子任务")
+            return {"status": "dispatched", "task_id": self.task_id, "result": {"parts": len(urls)}}
 
-            return {
-                "status": "success",
-                "task_id": self.task_id,
-                "result": processed_result
-            }
+        # 手动获取数据库会话
+        db = next(get_db_conn())
+        success = False
+        try:
+            logger.info(f"开始处理通知任务，ID: {self.task_id}，内容: {self.content}")
+            ocr_results = self.collect_ocr_results(urls)
+            result = self.write_ocr_results(ocr_results, db, token)
+            success = True
+            return result
         finally:
             # 确保数据库会话正确关闭
             db.close()
-    
+            # 结果已提交合并回写缓冲区时，由缓冲区在结果落库后释放在途登记、登记背压完成
+            if not self.result_deferred:
+                backpressure.mark_completed(self.task_id, success)
+                # 成功或最终失败后释放在途登记；失败等待重试时转回排队，期间不被重复发布，重试时可重新占用
+                if registry is not None:
+                    registry.finish(self.task_id, token, success, final_attempt=self.final_attempt)
+
     @staticmethod
     def convert_data1_to_data2_structure(data):
         # 数据结构转换说明：
@@ -9,6 +9,7 @@ from src.configs.config import ApiConfig
 from openai import AsyncOpenAI, Timeout
 from src.exceptions.taxpayer_cert_exceptions import TaxpayerCertException, TaxpayerCertErrorCode
 from src.tools.prompt_loader import PromptLoader
+from src.tools.rate_limiter import arate_limited
 
 logger = logging.getLogger(__name__)
 
@@ -38,27 +39,28 @@ class TaxpayerCertService:
 
             start_time = time.time()
             try:
-                # 调用OCR API
-                response = await client.chat.completions.create(
-                    model="qwen-vl-ocr-latest",
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "image_url",
-                                    "image_url": url,
-                                    "min_pixels": 28 * 28 * 4,
-                                    "max_pixels": 28 * 28 * 8192
-                                },
-                                {"type": "text", "text": prompt}
-                            ]
-                        }
-                    ],
-                    temperature=0.0,
-                    max_tokens=200,
-                    timeout=30
-                )
+                # 调用OCR API（受集群共享的DashScope限流器约束）
+                async with arate_limited("dashscope"):
+                    response = await client.chat.completions.create(
+                        model="qwen-vl-ocr-latest",
+                        messages=[
+                            {
+                                "role": "user",
+                                "content": [
+                                    {
+                                        "type": "image_url",
+                                        "image_url": url,
+                                        "min_pixels": 28 * 28 * 4,
+                                        "max_pixels": 28 * 28 * 8192
+                                    },
+                                    {"type": "text", "text": prompt}
+                                ]
+                            }
+                        ],
+                        temperature=0.0,
+                        max_tokens=200,
+                        timeout=30
+                    )
                 logger.info(f"OCR识别成功，耗时{time.time() - start_time:.2f}秒")
             except Timeout:
                 raise TaxpayerCertException(code=TaxpayerCertErrorCode.OCR_TIMEOUT, message="OCR识别超时，请稍后重试")
@@ -9,6 +9,7 @@ from src.configs.config import ApiConfig
 from openai import AsyncOpenAI, APIConnectionError, APITimeoutError  # 导入异步客户端
 from aiocache import cached  # 导入异步缓存
 from src.tools.prompt_loader import PromptLoader
+from src.tools.rate_limiter import arate_limited
 
 
 logger = logging.getLogger(__name__)
@@ -75,17 +76,18 @@ class WorkOrderService:
             try:
                 
                 
-                # 异步调用API
-                response = await client.chat.completions.create(
-                    model="qwen-turbo",
-                    messages=[
-                        {"role": "system", "content": "你是严格的格式生成器，仅返回符合JSON格式的列表，不添加任何额外文字。"},
-                        {"role": "user", "content": prompt.strip()}
-                    ],
-                    temperature=0.0,
-                    max_tokens=200,
-                    timeout=30
-                )
+                # 异步调用API（受集群共享的DashScope限流器约束）
+                async with arate_limited("dashscope"):
+                    response = await client.chat.completions.create(
+                        model="qwen-turbo",
+                        messages=[
+                            {"role": "system", "content": "你是严格的格式生成器，仅返回符合JSON格式的列表，不添加任何额外文字。"},
+                            {"role": "user", "content": prompt.strip()}
+                        ],
+                        temperature=0.0,
+                        max_tokens=200,
+                        timeout=30
+                    )
                 logger.info(f"相似度计算成功，耗时{time.time() - start_time:.2f}秒")
             except APITimeoutError:
                 raise WorkOrderException(
@@ -0,0 +1,65 @@
+import os
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Optional
+
+import httpx
+from src.configs.http_config import HTTP2_AVAILABLE, build_httpx_limits
+
+logger = logging.getLogger("celery")
+
+# 每个进程一个事件循环（Celery prefork 子进程 fork 后按 pid 重建）
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_pid: Optional[int] = None
+# 绑定在当前事件循环上的共享资源（并发预算、异步HTTP客户端）
+_loop_resources: Dict[str, Any] = {}
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """获取当前进程的常驻事件循环（单例，fork 后自动重建）"""
+    global _loop, _loop_pid
+    if _loop is None or _loop.is_closed() or _loop_pid != os.getpid():
+        _loop = asyncio.new_event_loop()
+        _loop_pid = os.getpid()
+        _loop_resources.clear()
+        logger.info(f"已为进程 {_loop_pid} 创建OCR事件循环")
+    return _loop
+
+
+def run_async(coro: Awaitable[Any]) -> Any:
+    """在当前进程的常驻事件循环中同步执行协程（供Celery同步任务调用）"""
+    return get_event_loop().run_until_complete(coro)
+
+
+def get_concurrency_budget(limit: int) -> asyncio.Semaphore:
+    """
+    获取当前事件循环共享的并发预算
+
+    页面、URL、记录三级任务共用同一个信号量，避免嵌套线程池导致并发失控
+
+    :param limit: 并发上限（仅首次创建时生效）
+    :return: 事件循环内共享的信号量
+    """
+    semaphore = _loop_resources.get("semaphore")
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(max(1, limit))
+        _loop_resources["semaphore"] = semaphore
+    return semaphore
+
+
+def get_async_vlm_http_client() -> httpx.AsyncClient:
+    """获取当前事件循环共享的VLM异步HTTP客户端（安装了h2时启用HTTP/2）"""
+    client = _loop_resources.get("vlm_http_client")
+    if client is None:
+        client = httpx.AsyncClient(http2=HTTP2_AVAILABLE, limits=build_httpx_limits())
+        _loop_resources["vlm_http_client"] = client
+    return client
+
+
+def get_async_http_client(timeout: float = 15) -> httpx.AsyncClient:
+    """获取当前事件循环共享的异步HTTP客户端（用于文档下载，keep-alive连接数与同步会话的连接池配置一致）"""
+    client = _loop_resources.get("http_client")
+    if client is None:
+        client = httpx.AsyncClient(timeout=timeout, follow_redirects=True, limits=build_httpx_limits())
+        _loop_resources["http_client"] = client
+    return client
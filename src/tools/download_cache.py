@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import logging
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class DownloadCache:
+    """
+    源文件本地下载缓存（按URL寻址，多进程共享）
+
+    - 每个URL对应一个数据文件和一个元数据文件（ETag / Last-Modified / 大小）
+    - 通过条件请求（If-None-Match / If-Modified-Since）重新验证，304时直接复用本地副本
+    - 写入使用临时文件 + os.replace，保证并发的Celery进程不会读到半个文件
+    - 总大小超过上限时按最近使用时间（数据文件mtime）淘汰
+    """
+
+    DATA_SUFFIX = ".bin"
+    META_SUFFIX = ".json"
+
+    def __init__(self, cache_dir: str, max_bytes: int = 2 * 1024 * 1024 * 1024):
+        """
+        Args:
+            cache_dir: 缓存目录
+            max_bytes: 缓存总大小上限（字节）
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _paths(self, url: str) -> Tuple[Path, Path]:
+        """计算URL对应的数据文件与元数据文件路径"""
+        digest = hashlib.sha256(url.strip().encode("utf-8")).hexdigest()
+        return (
+            self.cache_dir / f"{digest}{self.DATA_SUFFIX}",
+            self.cache_dir / f"{digest}{self.META_SUFFIX}",
+        )
+
+    def lookup(self, url: str) -> Tuple[Optional[bytes], Optional[Dict[str, str]]]:
+        """
+        查询本地副本
+
+        Returns:
+            (内容, 元数据)，不存在或数据与元数据不一致时返回 (None, None)
+        """
+        data_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(data_path, "rb") as f:
+                content = f.read()
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None, None
+        # 并发写入时数据与元数据可能来自不同版本，大小不一致则视为未缓存
+        if meta.get("size") != len(content):
+            return None, None
+        return content, meta
+
+    @staticmethod
+    def conditional_headers(meta: Optional[Dict[str, str]]) -> Dict[str, str]:
+        """根据元数据构造条件请求头，无验证信息时返回空字典"""
+        headers = {}
+        if not meta:
+            return headers
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def store(self, url: str, content: bytes, etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        """
+        原子写入本地副本（无ETag/Last-Modified的响应无法重新验证，不缓存）
+        """
+        if not etag and not last_modified:
+            return
+        data_path, meta_path = self._paths(url)
+        meta = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "size": len(content),
+            "stored_at": time.time(),
+        }
+        try:
+            self._atomic_write(data_path, content)
+            self._atomic_write(meta_path, json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+            self.evict()
+        except OSError as e:
+            logger.warning(f"下载缓存写入失败: {url}, 错误: {str(e)}")
+
+    def touch(self, url: str) -> None:
+        """刷新最近使用时间（用于LRU淘汰）"""
+        data_path, _ = self._paths(url)
+        try:
+            os.utime(data_path)
+        except FileNotFoundError:
+            pass
+
+    def evict(self) -> int:
+        """
+        总大小超过上限时按最近使用时间淘汰，返回淘汰的文件数
+
+        多进程同时淘汰时文件可能已被删除，忽略FileNotFoundError
+        """
+        entries = []
+        total = 0
+        for data_path in self.cache_dir.glob(f"*{self.DATA_SUFFIX}"):
+            try:
+                stat = data_path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, data_path))
+            total += stat.st_size
+        if total <= self.max_bytes:
+            return 0
+
+        evicted = 0
+        for _, size, data_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for path in (data_path, data_path.with_suffix(self.META_SUFFIX)):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+            total -= size
+            evicted += 1
+        logger.info(f"下载缓存超出上限，已淘汰{evicted}个文件")
+        return evicted
+
+    def _atomic_write(self, path: Path, data: bytes) -> None:
+        """写入同目录临时文件后原子替换目标文件"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp_")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
@@ -0,0 +1,154 @@
+import json
+import time
+import logging
+from typing import Any, Dict, List, Optional
+from redis import Redis
+from src.configs.redis_config import get_redis_pool
+
+logger = logging.getLogger("celery")
+
+
+class FetchBackpressure:
+    """
+    定时拉取任务的背压控制（状态存储于Redis，多个Worker共享）
+
+    - 积压量：任务Stream未分发条目 + Celery各队列排队消息 + 处理中的OCR任务
+    - 完成速率：按分钟分桶统计最近窗口内成功完成（结果已回写）的OCR任务数，失败与等待重试的任务不计入
+    - 批量大小：补足到目标积压量，并预留下一个拉取周期内预计完成的量；积压超过高水位时跳过本轮
+    - 指标：最近一次决策与各轮批量大小历史，供接口查询
+    """
+
+    RUNNING_KEY = "ocr:fetch:running"  # ZSET: 任务ID -> 开始处理时间戳
+    DONE_KEY_PREFIX = "ocr:fetch:done:"  # STRING: 每分钟完成的任务数
+    METRICS_KEY = "ocr:fetch:metrics"  # HASH: 最近一次决策与累计计数
+    HISTORY_KEY = "ocr:fetch:history"  # LIST: 最近各轮决策（JSON）
+    HISTORY_SIZE = 100
+
+    def __init__(
+        self,
+        redis_client: Optional[Redis] = None,
+        target_backlog: int = 50,
+        high_water: int = 200,
+        rate_window: int = 300,
+        running_ttl: int = 3600
+    ):
+        """
+        :param redis_client: Redis客户端，默认使用全局连接池
+        :param target_backlog: 目标积压量（排队+处理中），保证Worker不空闲又不过量堆积
+        :param high_water: 积压量达到该值时跳过本轮拉取
+        :param rate_window: 完成速率统计窗口（秒）
+        :param running_ttl: 处理中登记的最长保留时间（秒），超时视为已结束（Worker崩溃）
+        """
+        self.redis = redis_client or Redis(connection_pool=get_redis_pool())
+        self.target_backlog = target_backlog
+        self.high_water = high_water
+        self.rate_window = rate_window
+        self.running_ttl = running_ttl
+
+    @classmethod
+    def from_config(cls, config: Any, redis_client: Optional[Redis] = None) -> "FetchBackpressure":
+        """
+        按Celery配置创建背压控制器
+
+        :param config: Celery配置（CeleryConfig，由调用方传入）
+        :param redis_client: Redis客户端，默认使用全局连接池
+        """
+        return cls(
+            redis_client,
+            target_backlog=config.CELERY_FETCH_TARGET_BACKLOG,
+            high_water=config.CELERY_FETCH_HIGH_WATER,
+            rate_window=config.CELERY_FETCH_RATE_WINDOW,
+            running_ttl=max(profile["time_limit"] for profile in config.CELERY_OCR_QUEUE_PROFILES.values()),
+        )
+
+    def mark_started(self, task_id: str) -> None:
+        """登记任务开始处理（异常只记录日志，不影响任务执行）"""
+        try:
+            self.redis.zadd(self.RUNNING_KEY, {task_id: time.time()})
+        except Exception as e:
+            logger.warning(f"登记任务开始处理失败: {str(e)}")
+
+    def mark_completed(self, task_id: str, success: bool = True) -> None:
+        """登记任务处理结束，成功时计入当前分钟的完成数（失败只结束处理中登记，不计入完成速率）"""
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.zrem(self.RUNNING_KEY, task_id)
+            if success:
+                done_key = f"{self.DONE_KEY_PREFIX}{int(time.time() // 60)}"
+                pipe.incr(done_key)
+                pipe.expire(done_key, self.rate_window + 120)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"登记任务处理结束失败: {str(e)}")
+
+    def in_flight(self) -> int:
+        """处理中的任务数（清理超过最长保留时间的登记）"""
+        self.redis.zremrangebyscore(self.RUNNING_KEY, "-inf", time.time() - self.running_ttl)
+        return self.redis.zcard(self.RUNNING_KEY)
+
+    def completion_rate(self) -> float:
+        """最近窗口内的成功完成速率（个/秒），按完整分钟桶统计，不含当前未结束的分钟"""
+        current_minute = int(time.time() // 60)
+        minutes = max(1, self.rate_window // 60)
+        keys = [f"{self.DONE_KEY_PREFIX}{current_minute - offset}" for offset in range(1, minutes + 1)]
+        done = sum(int(value) for value in self.redis.mget(keys) if value)
+        return done / (minutes * 60)
+
+    def plan_batch(self, queue_depth: int, interval: int, max_batch: int) -> Dict[str, Any]:
+        """
+        计算本轮拉取数量并记录指标
+
+        :param queue_depth: 排队中的任务数（Stream未分发 + Celery队列）
+        :param interval: 拉取周期（秒）
+        :param max_batch: 单轮拉取上限
+        :return: 决策记录（batch 为本轮拉取数量，0表示跳过）
+        """
+        in_flight = self.in_flight()
+        rate = self.completion_rate()
+        backlog = queue_depth + in_flight
+        if backlog >= self.high_water:
+            batch = 0
+            reason = "high_water"
+        else:
+            # 补足到目标积压量，并补充下一周期内预计完成的任务
+            batch = max(0, min(max_batch, int(self.target_backlog - backlog + rate * interval)))
+            reason = "ok" if batch > 0 else "target_reached"
+        decision = {
+            "time": int(time.time()),
+            "batch": batch,
+            "reason": reason,
+            "queue_depth": queue_depth,
+            "in_flight": in_flight,
+            "backlog": backlog,
+            "completion_rate": round(rate, 4),
+            "target_backlog": self.target_backlog,
+            "high_water": self.high_water,
+        }
+        self._record(decision)
+        return decision
+
+    def _record(self, decision: Dict[str, Any]) -> None:
+        """记录决策指标（最近一次决策、累计拉取量与跳过轮数、历史）"""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hset(self.METRICS_KEY, mapping={f"last_{key}": value for key, value in decision.items()})
+        pipe.hincrby(self.METRICS_KEY, "cycles", 1)
+        pipe.hincrby(self.METRICS_KEY, "planned_total", decision["batch"])
+        if decision["batch"] == 0:
+            pipe.hincrby(self.METRICS_KEY, "skipped_cycles", 1)
+        pipe.lpush(self.HISTORY_KEY, json.dumps(decision))
+        pipe.ltrim(self.HISTORY_KEY, 0, self.HISTORY_SIZE - 1)
+        pipe.execute()
+
+    def metrics(self, history: int = 20) -> Dict[str, Any]:
+        """获取拉取指标（最近一次决策、累计计数、最近若干轮的批量大小）"""
+        raw = self.redis.hgetall(self.METRICS_KEY)
+        recent: List[Dict[str, Any]] = [json.loads(item) for item in self.redis.lrange(self.HISTORY_KEY, 0, history - 1)]
+        return {
+            "cycles": int(raw.get("cycles", 0)),
+            "planned_total": int(raw.get("planned_total", 0)),
+            "skipped_cycles": int(raw.get("skipped_cycles", 0)),
+            "in_flight": self.in_flight(),
+            "completion_rate": round(self.completion_rate(), 4),
+            "recent_batches": [item["batch"] for item in recent],
+            "recent": recent,
+        }
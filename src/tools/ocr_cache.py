@@ -0,0 +1,117 @@
+import json
+import time
+import hashlib
+import logging
+from typing import Any, Dict, Optional, Union
+from urllib.parse import urlsplit, urlunsplit
+from redis import Redis
+from src.configs.redis_config import get_redis_pool
+
+logger = logging.getLogger("celery")
+
+
+class OCRResultCache:
+    """
+    OCR识别结果缓存（内容寻址，存储于Redis）
+
+    - 键：sha256(图片字节或规范化URL, 提示词内容, 模型名)
+    - 过期：每条结果带TTL
+    - 淘汰：有序集合记录最近访问时间，超过条数上限时按LRU淘汰
+    - 统计：命中/未命中/淘汰计数
+    """
+
+    KEY_PREFIX = "ocr:cache:entry:"
+    INDEX_KEY = "ocr:cache:index"  # ZSET: 缓存键 -> 最近访问时间戳
+    STATS_KEY = "ocr:cache:stats"  # HASH: hits / misses / evictions
+
+    def __init__(self, redis_client: Optional[Redis] = None, ttl: int = 7 * 24 * 3600, max_entries: int = 200000):
+        """
+        :param redis_client: Redis客户端，默认使用全局连接池
+        :param ttl: 缓存过期时间（秒）
+        :param max_entries: 缓存条数上限（超出按最近最少使用淘汰）
+        """
+        self.redis = redis_client or Redis(connection_pool=get_redis_pool())
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    @staticmethod
+    def canonical_url(url: str) -> str:
+        """规范化URL（去空白、协议与域名小写、去掉锚点），保证同一文件得到同一缓存键"""
+        parts = urlsplit(url.strip())
+        return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ""))
+
+    @classmethod
+    def make_key(cls, source: Union[bytes, str], prompt: str, model: str) -> str:
+        """
+        计算内容寻址缓存键
+
+        :param source: 图片字节流，或图片URL（按规范化URL计算）
+        :param prompt: 提示词内容
+        :param model: 模型名
+        :return: 缓存键
+        """
+        digest = hashlib.sha256()
+        if isinstance(source, bytes):
+            digest.update(b"bytes:")
+            digest.update(source)
+        else:
+            digest.update(b"url:")
+            digest.update(cls.canonical_url(source).encode("utf-8"))
+        digest.update(b"\x00prompt:")
+        digest.update(prompt.encode("utf-8"))
+        digest.update(b"\x00model:")
+        digest.update(model.encode("utf-8"))
+        return f"{cls.KEY_PREFIX}{digest.hexdigest()}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存结果，命中时刷新最近访问时间；Redis异常时视为未命中"""
+        try:
+            value = self.redis.get(key)
+            pipe = self.redis.pipeline(transaction=False)
+            if value is None:
+                pipe.hincrby(self.STATS_KEY, "misses", 1)
+            else:
+                pipe.hincrby(self.STATS_KEY, "hits", 1)
+                pipe.zadd(self.INDEX_KEY, {key: time.time()})
+            pipe.execute()
+            return json.loads(value) if value is not None else None
+        except Exception as e:
+            logger.warning(f"OCR缓存读取失败，按未命中处理: {str(e)}")
+            return None
+
+    def set(self, key: str, result: Dict[str, Any]) -> None:
+        """写入缓存结果，并按条数上限淘汰最久未访问的条目；Redis异常时仅记录日志"""
+        try:
+            now = time.time()
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.set(key, json.dumps(result, ensure_ascii=False), ex=self.ttl)
+            pipe.zadd(self.INDEX_KEY, {key: now})
+            # 清理索引中已自然过期的条目
+            pipe.zremrangebyscore(self.INDEX_KEY, "-inf", now - self.ttl)
+            pipe.zcard(self.INDEX_KEY)
+            size = pipe.execute()[-1]
+            if size > self.max_entries:
+                self._evict(size - self.max_entries)
+        except Exception as e:
+            logger.warning(f"OCR缓存写入失败: {str(e)}")
+
+    def _evict(self, count: int) -> None:
+        """按LRU淘汰指定数量的缓存条目"""
+        evicted = self.redis.zpopmin(self.INDEX_KEY, count)
+        keys = [member for member, _ in evicted]
+        if keys:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.delete(*keys)
+            pipe.hincrby(self.STATS_KEY, "evictions", len(keys))
+            pipe.execute()
+            logger.info(f"OCR缓存超出上限，已淘汰{len(keys)}条")
+
+    def stats(self) -> Dict[str, int]:
+        """获取缓存统计（命中、未命中、淘汰次数及当前条数）"""
+        raw = self.redis.hgetall(self.STATS_KEY)
+        return {
+            "hits": int(raw.get("hits", 0)),
+            "misses": int(raw.get("misses", 0)),
+            "evictions": int(raw.get("evictions", 0)),
+            "entries": self.redis.zcard(self.INDEX_KEY),
+        }
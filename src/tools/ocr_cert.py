@@ -2,24 +2,72 @@ import os
 from pathlib import Path
 import json
 import base64
-from openai import OpenAI
-from typing import Union, IO, Dict, Any, List
+import asyncio
+import logging
+import threading
+from openai import OpenAI, AsyncOpenAI
+from typing import Union, IO, Dict, Any, List, Optional, Tuple
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from src.configs import ApiConfig
 from src.tools.prompt_loader import PromptLoader
 from src.exceptions.prompt_loader_exceptions import PromptLoaderException
+from src.tools.ocr_cache import OCRResultCache
+from src.configs.http_config import get_vlm_http_client
+from src.tools.async_runner import get_async_vlm_http_client
+from src.tools.rate_limiter import rate_limited, arate_limited
+
+logger = logging.getLogger("celery")
 
 class OCRCertInfoExtractor:
     """
     证件OCR信息提取器，支持从URL或本地文件提取证件信息
+
+    任务中通过 get_instance 获取进程级共享实例：配置只读取一次、连接池跨任务复用、提示词文件变更时自动重新加载
     """
+
+    # 进程级实例注册表：(模型, 提示词文件) -> 提取器（fork 后按 pid 重建）
+    _instances: Dict[Tuple[str, str], "OCRCertInfoExtractor"] = {}
+    _instances_pid: Optional[int] = None
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(
+        cls,
+        model: str = "qwen-vl-ocr-latest",
+        prompt_filename: str = "cert_ocr_prompt.json"
+    ) -> "OCRCertInfoExtractor":
+        """
+        获取当前进程共享的提取器实例（单例，按模型与提示词文件区分）
+
+        :param model: 使用的OCR模型
+        :param prompt_filename: 提示词文件名
+        :return: 共享的提取器实例
+        """
+        key = (model, prompt_filename)
+        if cls._instances_pid != os.getpid():
+            with cls._instances_lock:
+                if cls._instances_pid != os.getpid():
+                    cls._instances = {}
+                    cls._instances_pid = os.getpid()
+        instance = cls._instances.get(key)
+        if instance is None:
+            with cls._instances_lock:
+                instance = cls._instances.get(key)
+                if instance is None:
+                    instance = cls(model=model, prompt_filename=prompt_filename, shared_http_client=True)
+                    cls._instances[key] = instance
+                    logger.info(f"OCR提取器已创建（pid={os.getpid()}，模型: {model}，提示词: {prompt_filename}）")
+        return instance
     
     def __init__(self, 
                  api_key: str = None,
                  base_url: str = None,
                  model: str = "qwen-vl-ocr-latest",
                  prompt_filename: str = "cert_ocr_prompt.json",
-                 max_workers: int = 5):
+                 max_workers: int = 5,
+                 cache: Optional[OCRResultCache] = None,
+                 text_model: str = None,
+                 shared_http_client: bool = False):
         """
         初始化OCR提取器
         
@@ -29,37 +77,154 @@ class OCRCertInfoExtractor:
         :param prompt_config_path: 提示词配置文件路径
         :param prompt_key: 提示词在配置文件中的键名
         :param max_workers: 线程池最大工作线程数
+        :param cache: 识别结果缓存，默认按OCR_CACHE_*配置创建（未启用时为None）
+        :param text_model: PDF文本层识别使用的纯文本模型，默认为OCR_TEXT_MODEL
+        :param shared_http_client: 是否使用进程共享的HTTP连接池（安装h2时启用HTTP/2）
         """
         config = ApiConfig()
         self.api_key = api_key or config.dashscope.API_KEY
         self.base_url = base_url or config.dashscope.BASE_URL
         self.model = model
+        self.text_model = text_model or config.ocr.TEXT_MODEL
         self.prompt_filename = prompt_filename
         self.prompt_loader = PromptLoader()
-        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        self.shared_http_client = shared_http_client
+        self.client = OpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            http_client=get_vlm_http_client() if shared_http_client else None
+        )
+        self._async_client = None
+        self._async_client_loop = None
+        self._prompt_path = self.prompt_loader.root_dir.joinpath(self.prompt_filename)
+        self._prompt_mtime = None
         try:
-            self.prompt = self.prompt_loader.load_prompt(self.prompt_filename, file_type='json')
-        except PromptLoaderException as e:
+            self._prompt_mtime = os.stat(self._prompt_path).st_mtime_ns
+            self._prompt = self.prompt_loader.load_prompt(self.prompt_filename, file_type='json')
+        except (OSError, PromptLoaderException) as e:
             raise RuntimeError(f"提示词加载失败: {str(e)}") from e
         self.max_workers = max_workers
+        if cache is None and config.ocr.CACHE_ENABLED:
+            cache = OCRResultCache(ttl=config.ocr.CACHE_TTL, max_entries=config.ocr.CACHE_MAX_ENTRIES)
+        self.cache = cache
     
 
     
-    def _encode_image(self, image_source: Union[str, IO]) -> str:
+    @property
+    def prompt(self) -> str:
+        """提示词内容（文件修改时间变化时重新加载，加载失败时沿用旧内容）"""
+        try:
+            mtime = os.stat(self._prompt_path).st_mtime_ns
+        except OSError:
+            return self._prompt
+        if mtime != self._prompt_mtime:
+            try:
+                self._prompt = self.prompt_loader.load_prompt(self.prompt_filename, file_type='json')
+                logger.info(f"提示词文件已变更，重新加载: {self.prompt_filename}")
+            except PromptLoaderException as e:
+                logger.warning(f"提示词重新加载失败，沿用旧内容: {str(e)}")
+            self._prompt_mtime = mtime
+        return self._prompt
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """异步客户端（首次使用时创建，绑定到调用方所在的事件循环，事件循环变化时重建）"""
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client_loop is not loop:
+            self._async_client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                http_client=get_async_vlm_http_client() if self.shared_http_client else None
+            )
+            self._async_client_loop = loop
+        return self._async_client
+
+    def _build_messages(self, image_url: Union[str, Dict[str, str]]) -> List[Dict[str, Any]]:
         """
-        将图像文件（路径或文件流）编码为base64字符串
+        构造OCR请求消息体
+        
+        :param image_url: 图像URL字符串，或包含base64 data URL的字典
+        :return: chat.completions 消息列表
+        """
+        return [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image_url",
+                        "image_url": image_url,
+                        "min_pixels": 28 * 28 * 4,
+                        "max_pixels": 28 * 28 * 8192
+                    },
+                    {"type": "text", "text": self.prompt}
+                ]
+            }
+        ]
+
+    def _build_text_messages(self, text: str) -> List[Dict[str, Any]]:
+        """
+        构造文本层识别请求消息体（与图片识别使用同一提示词）
+        
+        :param text: PDF页面文本层内容
+        :return: chat.completions 消息列表
+        """
+        return [
+            {
+                "role": "user",
+                "content": f"{self.prompt}\n\n以下是证件PDF页面的文本层内容：\n{text}"
+            }
+        ]
+
+    @staticmethod
+    def _read_image(image_source: Union[str, IO]) -> bytes:
+        """
+        读取图像文件（路径或文件流）的原始字节
         
         :param image_source: 图像文件路径或文件流对象
-        :return: base64编码字符串
+        :return: 图像字节
         """
         if isinstance(image_source, str):
             # 处理文件路径
             with open(image_source, "rb") as image_file:
-                return base64.b64encode(image_file.read()).decode("utf-8")
-        else:
-            # 处理文件流
-            return base64.b64encode(image_source.read()).decode("utf-8")
+                return image_file.read()
+        # 处理文件流
+        return image_source.read()
+
+    def _encode_image(self, image_source: Union[str, IO]) -> str:
+        """
+        将图像文件（路径或文件流）编码为base64字符串
+        
+        :param image_source: 图像文件路径或文件流对象
+        :return: base64编码字符串
+        """
+        return base64.b64encode(self._read_image(image_source)).decode("utf-8")
+
+    def _cache_key(self, source: Union[bytes, str], model: str = None) -> Optional[str]:
+        """计算缓存键（图片字节或URL + 提示词 + 模型），未启用缓存时返回None"""
+        if self.cache is None:
+            return None
+        return OCRResultCache.make_key(source, self.prompt, model or self.model)
+
+    def _cached_result(self, cache_key: Optional[str]) -> Optional[Dict[str, Any]]:
+        """读取缓存的识别结果"""
+        return self.cache.get(cache_key) if cache_key else None
+
+    def _store_result(self, cache_key: Optional[str], result: Dict[str, Any]) -> Dict[str, Any]:
+        """写入识别结果缓存并原样返回结果"""
+        if cache_key:
+            self.cache.set(cache_key, result)
+        return result
     
+    def _create_completion(self, model: str, messages: List[Dict[str, Any]]):
+        """调用模型接口（受集群共享的DashScope限流器约束）"""
+        with rate_limited("dashscope"):
+            return self.client.chat.completions.create(model=model, messages=messages)
+
+    async def _acreate_completion(self, model: str, messages: List[Dict[str, Any]]):
+        """异步调用模型接口（受集群共享的DashScope限流器约束）"""
+        async with arate_limited("dashscope"):
+            return await self.async_client.chat.completions.create(model=model, messages=messages)
+
     def _parse_response(self, response_content: str) -> Dict[str, Any]:
         """
         解析API响应内容，提取JSON数据
@@ -77,27 +242,40 @@ class OCRCertInfoExtractor:
         :param image_url: 图像URL
         :return: 提取的关键信息
         """
+        cache_key = self._cache_key(image_url)
+        cached = self._cached_result(cache_key)
+        if cached is not None:
+            return cached
         try:
-            completion = self.client.chat.completions.create(
+            completion = self._create_completion(
                 model=self.model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image_url",
-                                "image_url": image_url,
-                                "min_pixels": 28 * 28 * 4,
-                                "max_pixels": 28 * 28 * 8192
-                            },
-                            {"type": "text", "text": self.prompt}
-                        ]
-                    }
-                ])
+                messages=self._build_messages(image_url))
             
-            return self._parse_response(completion.choices[0].message.content)
+            result = self._parse_response(completion.choices[0].message.content)
         except Exception as e:
             raise RuntimeError(f"OCR提取失败: {str(e)}")
+        return self._store_result(cache_key, result)
+
+    async def afrom_url(self, image_url: str) -> Dict[str, Any]:
+        """
+        从图像URL异步提取证件信息
+        
+        :param image_url: 图像URL
+        :return: 提取的关键信息
+        """
+        cache_key = self._cache_key(image_url)
+        cached = await asyncio.to_thread(self._cached_result, cache_key)
+        if cached is not None:
+            return cached
+        try:
+            completion = await self._acreate_completion(
+                model=self.model,
+                messages=self._build_messages(image_url))
+            
+            result = self._parse_response(completion.choices[0].message.content)
+        except Exception as e:
+            raise RuntimeError(f"OCR提取失败: {str(e)}")
+        return await asyncio.to_thread(self._store_result, cache_key, result)
     
     def from_file(self, image_source: Union[str, IO], image_format: str = "jpeg") -> Dict[str, Any]:
         """
@@ -108,40 +286,103 @@ class OCRCertInfoExtractor:
         :return: 提取的关键信息
         """
         try:
-            base64_image = self._encode_image(image_source)
+            image_bytes = self._read_image(image_source)
+            cache_key = self._cache_key(image_bytes)
+            cached = self._cached_result(cache_key)
+            if cached is not None:
+                return cached
+            base64_image = base64.b64encode(image_bytes).decode("utf-8")
             
-            completion = self.client.chat.completions.create(
+            completion = self._create_completion(
                 model=self.model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/{image_format};base64,{base64_image}"
-                                },
-                                "min_pixels": 28 * 28 * 4,
-                                "max_pixels": 28 * 28 * 8192
-                            },
-                            {"type": "text", "text": self.prompt}
-                        ]
-                    }
-                ])
+                messages=self._build_messages(
+                    {"url": f"data:image/{image_format};base64,{base64_image}"}
+                ))
+            
+            result = self._parse_response(completion.choices[0].message.content)
+        except Exception as e:
+            raise RuntimeError(f"OCR提取失败: {str(e)}")
+        return self._store_result(cache_key, result)
+
+    async def afrom_file(self, image_source: Union[str, IO], image_format: str = "jpeg") -> Dict[str, Any]:
+        """
+        从本地图像文件异步提取证件信息
+        
+        :param image_source: 图像文件路径或文件流对象
+        :param image_format: 图像格式
+        :return: 提取的关键信息
+        """
+        try:
+            image_bytes = self._read_image(image_source)
+            cache_key = self._cache_key(image_bytes)
+            cached = await asyncio.to_thread(self._cached_result, cache_key)
+            if cached is not None:
+                return cached
+            base64_image = base64.b64encode(image_bytes).decode("utf-8")
             
-            return self._parse_response(completion.choices[0].message.content)
+            completion = await self._acreate_completion(
+                model=self.model,
+                messages=self._build_messages(
+                    {"url": f"data:image/{image_format};base64,{base64_image}"}
+                ))
+            
+            result = self._parse_response(completion.choices[0].message.content)
         except Exception as e:
             raise RuntimeError(f"OCR提取失败: {str(e)}")
+        return await asyncio.to_thread(self._store_result, cache_key, result)
+    
+    def from_text(self, text: str) -> Dict[str, Any]:
+        """
+        从PDF页面文本层提取证件信息（纯文本模型，无需渲染图片）
+        
+        :param text: 页面文本层内容
+        :return: 提取的关键信息
+        """
+        cache_key = self._cache_key(text.encode("utf-8"), self.text_model)
+        cached = self._cached_result(cache_key)
+        if cached is not None:
+            return cached
+        try:
+            completion = self._create_completion(
+                model=self.text_model,
+                messages=self._build_text_messages(text))
+            
+            result = self._parse_response(completion.choices[0].message.content)
+        except Exception as e:
+            raise RuntimeError(f"文本层提取失败: {str(e)}")
+        return self._store_result(cache_key, result)
+
+    async def afrom_text(self, text: str) -> Dict[str, Any]:
+        """
+        从PDF页面文本层异步提取证件信息
+        
+        :param text: 页面文本层内容
+        :return: 提取的关键信息
+        """
+        cache_key = self._cache_key(text.encode("utf-8"), self.text_model)
+        cached = await asyncio.to_thread(self._cached_result, cache_key)
+        if cached is not None:
+            return cached
+        try:
+            completion = await self._acreate_completion(
+                model=self.text_model,
+                messages=self._build_text_messages(text))
+            
+            result = self._parse_response(completion.choices[0].message.content)
+        except Exception as e:
+            raise RuntimeError(f"文本层提取失败: {str(e)}")
+        return await asyncio.to_thread(self._store_result, cache_key, result)
     
-    def from_urls(self, image_urls: List[str]) -> List[Dict[str, Any]]:
+    def from_urls(self, image_urls: List[str], max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         从多个图像URL批量提取证件信息
         
         :param image_urls: 图像URL列表
+        :param max_workers: 本次调用的工作线程数，默认使用实例配置
         :return: 提取的关键信息列表，与输入URL顺序对应
         """
         results = [None] * len(image_urls)
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+        with ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as executor:
             future_to_index = {executor.submit(self.from_url, url): i for i, url in enumerate(image_urls)}
             for future in as_completed(future_to_index):
                 index = future_to_index[future]
@@ -151,16 +392,22 @@ class OCRCertInfoExtractor:
                     results[index] = {"error": str(e)}
         return results
     
-    def from_files(self, image_sources: List[Union[str, IO]], image_format: str = "jpeg") -> List[Dict[str, Any]]:
+    def from_files(
+        self,
+        image_sources: List[Union[str, IO]],
+        image_format: str = "jpeg",
+        max_workers: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
         """
         从多个本地图像文件批量提取证件信息
         
         :param image_sources: 图像文件路径或文件流对象列表
         :param image_format: 图像格式
+        :param max_workers: 本次调用的工作线程数，默认使用实例配置
         :return: 提取的关键信息列表，与输入文件顺序对应
         """
         results = [None] * len(image_sources)
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+        with ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as executor:
             future_to_index = {
                 executor.submit(self.from_file, source, image_format): i 
                 for i, source in enumerate(image_sources)
@@ -1,6 +1,8 @@
 import requests
 import json
 import logging
+from src.configs.http_config import get_http_session
+from src.tools.rate_limiter import rate_limited
 from typing import Optional, Union
 
 logger = logging.getLogger("celery")
@@ -31,7 +33,7 @@ class DifyClient:
                 )}
                 data = {'user': user}
 
-                response = requests.post(
+                response = get_http_session().post(
                     upload_url,
                     headers={k: v for k, v in self.default_headers.items()
                              if k != 'Content-Type'},
@@ -114,14 +116,17 @@ class DifyClient:
             f"发送POST请求到 {chat_url}，请求体: {json.dumps(payload, ensure_ascii=False)}")
 
         try:
-            response = requests.post(
-                chat_url,
-                headers={**self.default_headers,
-                         'Content-Type': 'application/json'},
-                json=payload,
-                timeout=self.timeout
-            )
-            response.raise_for_status()
+            # 受集群共享的Dify限流器约束
+            with rate_limited("dify"):
+                response = get_http_session().post(
+                    chat_url,
+                    headers={**self.default_headers,
+                             'Content-Type': 'application/json'},
+                    json=payload,
+                    timeout=self.timeout
+                )
+                # 429在限流器内抛出，用于下调并发上限
+                response.raise_for_status()
             result = response.json()
             logger.info(f"消息发送成功，响应状态码: {response.status_code}")  # 成功响应日志
             return result
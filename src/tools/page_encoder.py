@@ -0,0 +1,108 @@
+import io
+import math
+import logging
+from typing import Dict
+
+import fitz  # PyMuPDF
+
+try:
+    from PIL import Image  # 可选依赖：仅WebP编码需要Pillow
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# 通义千问VL-OCR请求中的像素上限（与 OCRCertInfoExtractor 的 max_pixels 保持一致）
+VLM_MAX_PIXELS = 28 * 28 * 8192
+
+
+class PageEncoder:
+    """
+    PDF页面渲染编码器：按像素预算选择渲染倍率，并按配置格式/质量编码
+
+    - 渲染倍率取 min(固定倍率, sqrt(像素预算 / 页面面积))，大幅面页面不再渲染出超过模型上限、随后又被模型降采样的图片
+    - 支持 png / jpeg / webp（webp需安装Pillow，缺失时回退为jpeg）
+    - 累计统计相对“固定倍率未压缩像素”的字节节省量
+    """
+
+    SUPPORTED_FORMATS = ("png", "jpeg", "webp")
+
+    def __init__(
+        self,
+        scale_factor: float = 2.0,
+        max_pixels: int = None,
+        image_format: str = "png",
+        quality: int = 85
+    ):
+        """
+        Args:
+            scale_factor: 最大渲染倍率（页面较小时使用该倍率）
+            max_pixels: 单页像素预算，为None时固定使用scale_factor
+            image_format: 输出格式 png / jpeg / webp
+            quality: jpeg/webp 编码质量（1-100）
+        """
+        image_format = image_format.lower().replace("jpg", "jpeg")
+        if image_format not in self.SUPPORTED_FORMATS:
+            raise ValueError(f"不支持的图片格式: {image_format}")
+        if image_format == "webp" and Image is None:
+            logger.warning("未安装Pillow，WebP编码回退为JPEG")
+            image_format = "jpeg"
+        self.scale_factor = scale_factor
+        self.max_pixels = max_pixels
+        self.image_format = image_format
+        self.quality = quality
+        self.stats = self.empty_stats()
+
+    @staticmethod
+    def empty_stats() -> Dict[str, int]:
+        """编码统计初始值"""
+        return {"pages": 0, "pixels": 0, "baseline_pixels": 0, "encoded_bytes": 0, "baseline_bytes": 0}
+
+    def page_scale(self, page: fitz.Page) -> float:
+        """根据页面尺寸计算渲染倍率，使输出像素数刚好不超过预算"""
+        if not self.max_pixels:
+            return self.scale_factor
+        width, height = page.rect.width, page.rect.height
+        if width * height <= 0:
+            return self.scale_factor
+        scale = min(self.scale_factor, math.sqrt(self.max_pixels / (width * height)))
+        # 像素图尺寸按整数向上取整，微调倍率保证不超出预算
+        while scale > 0 and math.ceil(width * scale) * math.ceil(height * scale) > self.max_pixels:
+            scale *= 0.999
+        return scale
+
+    def render(self, page: fitz.Page) -> bytes:
+        """渲染并编码单页，同时累计编码统计"""
+        scale = self.page_scale(page)
+        pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale))
+        encoded = self.encode(pix)
+
+        baseline_pixels = int(page.rect.width * self.scale_factor) * int(page.rect.height * self.scale_factor)
+        self.stats["pages"] += 1
+        self.stats["pixels"] += pix.width * pix.height
+        self.stats["baseline_pixels"] += baseline_pixels
+        self.stats["encoded_bytes"] += len(encoded)
+        self.stats["baseline_bytes"] += baseline_pixels * pix.n
+        return encoded
+
+    def encode(self, pix: fitz.Pixmap) -> bytes:
+        """按配置格式编码像素图"""
+        if self.image_format == "png":
+            return pix.tobytes(output="png")
+        if self.image_format == "jpeg":
+            return pix.tobytes(output="jpeg", jpg_quality=self.quality)
+        mode = "RGBA" if pix.alpha else "RGB"
+        image = Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+        with io.BytesIO() as buffer:
+            image.save(buffer, format="WEBP", quality=self.quality)
+            return buffer.getvalue()
+
+    def merge_stats(self, stats: Dict[str, int]) -> None:
+        """合并其他进程回传的编码统计"""
+        for key, value in stats.items():
+            self.stats[key] = self.stats.get(key, 0) + value
+
+    @staticmethod
+    def bytes_saved(stats: Dict[str, int]) -> int:
+        """相对固定倍率未压缩像素节省的字节数"""
+        return stats["baseline_bytes"] - stats["encoded_bytes"]
@@ -0,0 +1,123 @@
+import logging
+from typing import Any, Dict, List, Optional
+
+import fitz  # PyMuPDF
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class PageFilter:
+    """
+    OCR前页面过滤器（单个文档内有效，每个文档创建一个实例）
+
+    - 空白页：灰度缩略图的墨迹占比（暗像素比例）或标准差低于阈值时判定为近空白页（分隔页、空白背面）
+    - 重复页：缩略图差值哈希（dHash）与本文档已保留页面的汉明距离不超过阈值，且低分辨率灰度图逐块最大差值
+      不超过阈值时判定为重复页（哈希只做粗筛，逐块比较避免同一模板、内容不同的证件页被误判）
+    - 每页的判定结果（含统计值）保存在 decisions 中，便于写入任务结果审计
+    """
+
+    THUMBNAIL_SHRINK = 3  # 统计前缩小 2^3 倍，统计量对分辨率不敏感
+    INK_LEVEL = 200  # 灰度低于该值的像素视为墨迹
+    HASH_SIZE = 16  # dHash 为 HASH_SIZE x HASH_SIZE 位
+    SIGNATURE_SHAPE = (64, 48)  # 重复页复核使用的块平均灰度图尺寸（行, 列）
+
+    def __init__(
+        self,
+        blank_ink_ratio: float = 0.002,
+        blank_std: float = 2.0,
+        duplicate_distance: int = 10,
+        duplicate_max_diff: float = 30.0
+    ):
+        """
+        Args:
+            blank_ink_ratio: 墨迹占比低于该值视为空白页
+            blank_std: 灰度标准差低于该值视为空白页（纯色页）
+            duplicate_distance: dHash 汉明距离不超过该值视为疑似重复页，负数表示不检测重复
+            duplicate_max_diff: 疑似重复页的块平均灰度图逐块最大差值不超过该值才判定为重复页
+        """
+        self.blank_ink_ratio = blank_ink_ratio
+        self.blank_std = blank_std
+        self.duplicate_distance = duplicate_distance
+        self.duplicate_max_diff = duplicate_max_diff
+        self.decisions: List[Dict[str, Any]] = []
+        self._kept_pages: List[tuple] = []  # [(页码, 哈希, 块平均灰度图), ...]
+
+    def check(self, page_num: int, image: bytes) -> Optional[Dict[str, Any]]:
+        """
+        判定单页是否需要丢弃
+
+        Args:
+            page_num: 页码（从0开始）
+            image: 渲染后的页面图片字节流
+
+        Returns:
+            丢弃时返回判定记录（reason 为 blank / duplicate），保留时返回None
+        """
+        gray = self._thumbnail(image)
+        ink_ratio = float(np.count_nonzero(gray < self.INK_LEVEL)) / gray.size
+        std = float(gray.std())
+        page_hash = self._dhash(gray)
+        signature = self._block_mean(gray, *self.SIGNATURE_SHAPE)
+        decision = {
+            "page_num": page_num,
+            "reason": None,
+            "ink_ratio": round(ink_ratio, 5),
+            "std": round(std, 2),
+            "hash": f"{page_hash:0{self.HASH_SIZE * self.HASH_SIZE // 4}x}",
+        }
+
+        if ink_ratio < self.blank_ink_ratio or std < self.blank_std:
+            decision["reason"] = "blank"
+        elif self.duplicate_distance >= 0:
+            for kept_page, kept_hash, kept_signature in self._kept_pages:
+                distance = (page_hash ^ kept_hash).bit_count()
+                if distance > self.duplicate_distance:
+                    continue
+                max_diff = float(np.abs(signature - kept_signature).max())
+                if max_diff <= self.duplicate_max_diff:
+                    decision.update(
+                        reason="duplicate", duplicate_of=kept_page, distance=distance, max_diff=round(max_diff, 2)
+                    )
+                    break
+
+        self.decisions.append(decision)
+        if decision["reason"] is None:
+            self._kept_pages.append((page_num, page_hash, signature))
+            return None
+        logger.info(f"页面过滤: 第{page_num + 1}页判定为{decision['reason']}，已跳过OCR")
+        return decision
+
+    def summary(self) -> Dict[str, Any]:
+        """文档级过滤摘要：总页数与被丢弃页面的判定记录"""
+        return {
+            "pages": len(self.decisions),
+            "dropped": [decision for decision in self.decisions if decision["reason"] is not None],
+        }
+
+    def _thumbnail(self, image: bytes) -> np.ndarray:
+        """解码并缩小为灰度矩阵"""
+        pix = fitz.Pixmap(image)
+        if pix.colorspace is None or pix.colorspace.n != 1 or pix.alpha:
+            pix = fitz.Pixmap(fitz.csGRAY, pix)
+        if min(pix.width, pix.height) >> self.THUMBNAIL_SHRINK >= max(self.SIGNATURE_SHAPE):
+            pix.shrink(self.THUMBNAIL_SHRINK)
+        # samples 按行连续存放，每像素1字节
+        return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+
+    def _dhash(self, gray: np.ndarray) -> int:
+        """差值哈希：按块平均缩放到 (HASH_SIZE) x (HASH_SIZE+1)，比较水平相邻像素"""
+        small = self._block_mean(gray, self.HASH_SIZE, self.HASH_SIZE + 1)
+        bits = (small[:, 1:] > small[:, :-1]).flatten()
+        return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+    @staticmethod
+    def _block_mean(gray: np.ndarray, rows: int, cols: int) -> np.ndarray:
+        """按块平均缩放灰度矩阵（不依赖图像库）"""
+        height, width = gray.shape
+        row_starts = (np.arange(rows) * height) // rows
+        col_starts = (np.arange(cols) * width) // cols
+        sums = np.add.reduceat(np.add.reduceat(gray.astype(np.float64), row_starts, axis=0), col_starts, axis=1)
+        row_sizes = np.diff(np.append(row_starts, height))
+        col_sizes = np.diff(np.append(col_starts, width))
+        return sums / np.outer(row_sizes, col_sizes)
@@ -0,0 +1,126 @@
+import time
+import bisect
+import logging
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, Optional
+from redis import Redis
+from src.configs.redis_config import get_redis_pool
+
+logger = logging.getLogger("celery")
+
+
+class PayloadSizeHistogram:
+    """
+    Celery消息体大小直方图（按序列化格式分桶，存储于Redis，多个进程共享）
+
+    - 记录：序列化后、压缩前的字节数，进程内累计后批量写入（不为每条消息增加Redis往返）
+    - 分桶：上界为1KB、4KB、16KB、64KB、256KB、1MB、4MB，超出计入 inf
+    - 统计：各格式的消息数、总字节数与分桶计数
+    """
+
+    STATS_KEY = "ocr:payload:sizes"  # HASH: 格式:count / 格式:bytes / 格式:le_上界
+    BUCKETS = (1024, 4 * 1024, 16 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024)
+
+    def __init__(self, redis_client: Optional[Redis] = None, flush_every: int = 100, flush_interval: float = 10.0):
+        """
+        :param redis_client: Redis客户端，默认使用全局连接池
+        :param flush_every: 进程内累计到该条数时写入Redis
+        :param flush_interval: 距上次写入超过该时间（秒）时写入Redis
+        """
+        self._redis = redis_client
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._pending: Counter = Counter()
+        self._pending_count = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def redis(self) -> Redis:
+        # 延迟创建客户端：序列化器在Celery应用初始化时安装，此时无需连接Redis
+        if self._redis is None:
+            self._redis = Redis(connection_pool=get_redis_pool())
+        return self._redis
+
+    @classmethod
+    def bucket_label(cls, size: int) -> str:
+        """字节数所在分桶的标签"""
+        index = bisect.bisect_left(cls.BUCKETS, size)
+        return f"le_{cls.BUCKETS[index]}" if index < len(cls.BUCKETS) else "le_inf"
+
+    def record(self, serializer: str, size: int) -> None:
+        """记录一条消息体大小（异常只记录日志，不影响消息发送）"""
+        with self._lock:
+            self._pending[f"{serializer}:count"] += 1
+            self._pending[f"{serializer}:bytes"] += size
+            self._pending[f"{serializer}:{self.bucket_label(size)}"] += 1
+            self._pending_count += 1
+            due = self._pending_count >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """将进程内累计的计数写入Redis（写入失败时放回，下次重试）"""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._pending_count = 0
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for field, value in pending.items():
+                pipe.hincrby(self.STATS_KEY, field, value)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"消息体大小统计写入失败: {str(e)}")
+            with self._lock:
+                self._pending.update(pending)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取各序列化格式的消息数、平均大小与分桶计数"""
+        self.flush()
+        result: Dict[str, Dict[str, Any]] = {}
+        for field, value in self.redis.hgetall(self.STATS_KEY).items():
+            serializer, name = field.rsplit(":", 1)
+            result.setdefault(serializer, {"count": 0, "bytes": 0, "buckets": {}})
+            if name in ("count", "bytes"):
+                result[serializer][name] = int(value)
+            else:
+                result[serializer]["buckets"][name] = int(value)
+        for item in result.values():
+            item["avg_bytes"] = int(item["bytes"] / item["count"]) if item["count"] else 0
+            labels = [f"le_{bound}" for bound in self.BUCKETS] + ["le_inf"]
+            item["buckets"] = {label: item["buckets"].get(label, 0) for label in labels}
+        return result
+
+
+# 进程内共享的直方图（由 install_size_histogram 安装到序列化器）
+histogram = PayloadSizeHistogram()
+
+
+def install_size_histogram(serializers: Iterable[str]) -> None:
+    """
+    为kombu已注册的序列化器包装大小统计（任务消息与任务结果均经过kombu序列化）
+
+    :param serializers: 需要统计的序列化格式（未注册的格式忽略）
+    """
+    from kombu.serialization import registry
+
+    for name in set(serializers):
+        codec = registry._encoders.get(name)
+        if codec is None or getattr(codec.encoder, "_size_histogram", False):
+            continue
+        decoder = registry._decoders.get(codec.content_type)
+
+        def measured(obj, _encode=codec.encoder, _name=name):
+            payload = _encode(obj)
+            try:
+                histogram.record(_name, len(payload.encode("utf-8")) if isinstance(payload, str) else len(payload))
+            except Exception as e:
+                logger.warning(f"消息体大小统计失败: {str(e)}")
+            return payload
+
+        measured._size_histogram = True
+        registry.register(name, measured, decoder, codec.content_type, codec.content_encoding)
@@ -1,12 +1,19 @@
 import fitz  # PyMuPDF
 import requests
+import httpx
 import os
 from pathlib import Path
 from io import BytesIO
 from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import tempfile
-from typing import List, Union, Optional, Dict, Any, Callable
+from typing import List, Union, Optional, Dict, Any, Callable, Iterator
 import logging
+from src.configs.http_config import get_http_session
+from src.tools.download_cache import DownloadCache
+from src.tools.pdf_render_pool import ProcessPoolPdfRenderer
+from src.tools.page_encoder import PageEncoder
+from src.tools.page_filter import PageFilter
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -21,7 +28,15 @@ class PdfToImageConverter:
         scale_factor: float = 2.0,
         workers: int = 4,
         timeout: int = 15,
-        temp_dir: str = None
+        temp_dir: str = None,
+        download_cache_max_bytes: Optional[int] = None,
+        render_backend: str = "thread",
+        render_processes: int = 0,
+        render_pages_per_task: int = 4,
+        max_pixels: Optional[int] = None,
+        image_format: str = "png",
+        image_quality: int = 85,
+        page_filter_options: Optional[Dict[str, Any]] = None
     ):
         """
         初始化PDF转图片转换器
@@ -32,6 +47,14 @@ class PdfToImageConverter:
             workers: 并行处理的线程数
             timeout: 网络请求超时时间(秒)
             temp_dir: 临时文件存储目录
+            download_cache_max_bytes: 下载缓存总大小上限（字节），为None时不启用temp_dir下的下载缓存
+            render_backend: 渲染后端，"thread"为当前进程内渲染，"process"为多进程渲染（共享内存回传）
+            render_processes: 多进程渲染的进程数，0表示使用CPU核数
+            render_pages_per_task: 多进程渲染时每个渲染任务负责的页数
+            max_pixels: 单页像素预算（按页面尺寸下调渲染倍率），为None时固定使用scale_factor
+            image_format: 图片流编码格式 png / jpeg / webp
+            image_quality: jpeg/webp 编码质量
+            page_filter_options: 空白页/重复页过滤参数（PageFilter构造参数），为None时不过滤
         """
         self.user_agent = user_agent
         self.scale_factor = scale_factor
@@ -40,8 +63,25 @@ class PdfToImageConverter:
         self.temp_dir = temp_dir or tempfile.gettempdir()
         self.common_headers = {"User-Agent": self.user_agent}
         
+        self.max_pixels = max_pixels
+        self.image_quality = image_quality
+        # 归一化后的图片格式（如webp缺少Pillow时回退为jpeg），用于VLM请求中的MIME类型
+        self.image_format = PageEncoder(scale_factor, max_pixels, image_format, image_quality).image_format
+        self.encode_stats = PageEncoder.empty_stats()
+        self.page_filter_options = page_filter_options
+        self.render_backend = render_backend
+        self.process_renderer = None
+        if render_backend == "process":
+            self.process_renderer = ProcessPoolPdfRenderer(render_processes, render_pages_per_task)
+        
         # 初始化临时目录
         self._init_temp_dir()
+        self.download_cache = None
+        if download_cache_max_bytes:
+            self.download_cache = DownloadCache(
+                os.path.join(self.temp_dir, "pdf_download_cache"),
+                max_bytes=download_cache_max_bytes
+            )
     
     def _init_temp_dir(self) -> None:
         """初始化临时目录"""
@@ -54,17 +94,28 @@ class PdfToImageConverter:
             logger.warning(f"使用默认临时目录: {self.temp_dir}")
     
     def _download_pdf(self, pdf_url: str) -> bytes:
-        """下载PDF内容，统一处理网络请求和错误"""
+        """下载PDF内容，统一处理网络请求和错误（启用下载缓存时先做条件请求重新验证）"""
+        cached, meta = self.download_cache.lookup(pdf_url) if self.download_cache else (None, None)
+        headers = {**self.common_headers, **DownloadCache.conditional_headers(meta)} if cached else self.common_headers
         try:
             logger.info(f"开始下载: {pdf_url}")
-            response = requests.get(
+            response = get_http_session().get(
                 pdf_url, 
-                headers=self.common_headers, 
+                headers=headers, 
                 stream=True, 
                 timeout=self.timeout
             )
+            if response.status_code == 304 and cached is not None:
+                self.download_cache.touch(pdf_url)
+                logger.info(f"缓存未变更，复用本地副本: {pdf_url}，大小: {len(cached)} bytes")
+                return cached
             response.raise_for_status()
             logger.info(f"下载成功: {pdf_url}，大小: {len(response.content)} bytes")
+            if self.download_cache:
+                self.download_cache.store(
+                    pdf_url, response.content,
+                    response.headers.get("ETag"), response.headers.get("Last-Modified")
+                )
             return response.content
         except requests.exceptions.ConnectionError as e:
             logger.error(f"连接失败: {pdf_url}, 错误: {str(e)}")
@@ -75,6 +126,37 @@ class PdfToImageConverter:
         except Exception as e:
             logger.error(f"下载失败: {pdf_url}, 错误: {str(e)}")
         return b""
+
+    async def _adownload_pdf(self, pdf_url: str, client: httpx.AsyncClient) -> bytes:
+        """异步下载PDF内容（与_download_pdf保持一致的缓存与错误处理语义，失败返回空字节）"""
+        cached, meta = (
+            await asyncio.to_thread(self.download_cache.lookup, pdf_url) if self.download_cache else (None, None)
+        )
+        headers = {**self.common_headers, **DownloadCache.conditional_headers(meta)} if cached else self.common_headers
+        try:
+            logger.info(f"开始异步下载: {pdf_url}")
+            response = await client.get(pdf_url, headers=headers, timeout=self.timeout)
+            if response.status_code == 304 and cached is not None:
+                self.download_cache.touch(pdf_url)
+                logger.info(f"缓存未变更，复用本地副本: {pdf_url}，大小: {len(cached)} bytes")
+                return cached
+            response.raise_for_status()
+            logger.info(f"异步下载成功: {pdf_url}，大小: {len(response.content)} bytes")
+            if self.download_cache:
+                await asyncio.to_thread(
+                    self.download_cache.store, pdf_url, response.content,
+                    response.headers.get("ETag"), response.headers.get("Last-Modified")
+                )
+            return response.content
+        except httpx.TimeoutException as e:
+            logger.error(f"请求超时: {pdf_url}, 错误: {str(e)}")
+        except httpx.HTTPStatusError as e:
+            logger.error(f"HTTP错误 ({e.response.status_code}): {pdf_url}, 错误: {str(e)}")
+        except httpx.HTTPError as e:
+            logger.error(f"连接失败: {pdf_url}, 错误: {str(e)}")
+        except Exception as e:
+            logger.error(f"下载失败: {pdf_url}, 错误: {str(e)}")
+        return b""
     
     def _pdf_to_images(
         self, 
@@ -97,27 +179,142 @@ class PdfToImageConverter:
         scale = scale_factor or self.scale_factor
         
         try:
-            with fitz.open(stream=pdf_content, filetype="pdf") as doc:
-                for page_num in range(len(doc)):
-                    page = doc.load_page(page_num)
-                    matrix = fitz.Matrix(scale, scale)
-                    pix = page.get_pixmap(matrix=matrix)
-                    
-                    if output_dir:
+            if output_dir:
+                with fitz.open(stream=pdf_content, filetype="pdf") as doc:
+                    for page_num in range(len(doc)):
+                        page = doc.load_page(page_num)
+                        matrix = fitz.Matrix(scale, scale)
+                        pix = page.get_pixmap(matrix=matrix)
                         # 保存到文件
                         image_path = os.path.join(output_dir, f"page_{page_num+1}.png")
                         pix.save(image_path)
                         results.append(image_path)
-                    else:
-                        # 保存到内存
-                        with BytesIO() as img_buffer:
-                            img_buffer.write(pix.tobytes(output="png"))
-                            results.append(img_buffer.getvalue())
+            else:
+                # 保存到内存
+                results.extend(self.iter_page_images(pdf_content, scale))
             logger.info(f"PDF转换完成，共生成{len(results)}张图片")
             return results
         except Exception as e:
             logger.error(f"PDF转换失败: {str(e)}")
             return results
+
+    def iter_page_images(
+        self,
+        pdf_content: bytes,
+        scale_factor: float = None
+    ) -> Iterator[bytes]:
+        """
+        逐页渲染PDF并按页产出图片字节流（生成器）
+
+        调用方可在第N页识别的同时渲染第N+1页，内存占用只与在途页数有关，与文档总页数无关
+
+        Args:
+            pdf_content: PDF文件内容字节流
+            scale_factor: 最大缩放因子，默认为初始化时的设置（配置了max_pixels时按页面尺寸下调）
+
+        Yields:
+            单页图片字节流（按页码顺序，格式见 self.image_format）
+        """
+        for page in self.iter_pdf_pages(pdf_content, scale_factor):
+            if page["skipped"] is None:
+                yield page["image"]
+
+    def iter_pdf_pages(
+        self,
+        pdf_content: bytes,
+        scale_factor: float = None,
+        min_text_chars: int = 0,
+        page_filter: Optional[PageFilter] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        逐页产出PDF页面内容（生成器）：文本层足够的页面直接产出文本，其余页面渲染为图片
+
+        电子版PDF（带文本层）无需光栅化即可识别，扫描件页面仍走图片识别；
+        配置了页面过滤时，近空白页与文档内重复页标记为跳过
+
+        Args:
+            pdf_content: PDF文件内容字节流
+            scale_factor: 最大缩放因子，默认为初始化时的设置
+            min_text_chars: 文本层有效字符数（字母、数字、汉字）达到该值时使用文本，0表示不提取文本层
+            page_filter: 本文档的页面过滤器，默认按 page_filter_options 创建（调用方传入时可读取其判定记录）
+
+        Yields:
+            {"page_num": 页码(从0开始), "text": 文本层内容或None, "image": 图片字节流或None,
+             "skipped": 被过滤时为判定记录，否则为None}（按页码顺序）
+        """
+        if page_filter is None:
+            page_filter = self.new_page_filter()
+        page_texts = self._extract_text_layer(pdf_content, min_text_chars)
+        scan_pages = [page_num for page_num, text in enumerate(page_texts) if text is None]
+        encoder = PageEncoder(scale_factor or self.scale_factor, self.max_pixels, self.image_format, self.image_quality)
+        images = self._iter_encoded_pages(pdf_content, encoder, scan_pages)
+        try:
+            for page_num, text in enumerate(page_texts):
+                if text is not None:
+                    yield {"page_num": page_num, "text": text, "image": None, "skipped": None}
+                    continue
+                image = next(images)
+                skipped = page_filter.check(page_num, image) if page_filter is not None else None
+                yield {"page_num": page_num, "text": None, "image": image, "skipped": skipped}
+        finally:
+            images.close()
+            stats = encoder.stats
+            for key, value in stats.items():
+                self.encode_stats[key] = self.encode_stats.get(key, 0) + value
+            if min_text_chars > 0:
+                logger.info(f"文本层识别: {len(page_texts) - len(scan_pages)}/{len(page_texts)}页无需渲染")
+            if stats["pages"]:
+                logger.info(
+                    f"页面编码完成: {stats['pages']}页，格式: {self.image_format}，"
+                    f"像素 {stats['pixels']}/{stats['baseline_pixels']}（预算/固定倍率），"
+                    f"输出 {stats['encoded_bytes']} bytes，节省 {PageEncoder.bytes_saved(stats)} bytes"
+                )
+
+    def new_page_filter(self) -> Optional[PageFilter]:
+        """按配置为单个文档创建页面过滤器，未启用过滤时返回None"""
+        if self.page_filter_options is None:
+            return None
+        return PageFilter(**self.page_filter_options)
+
+    @staticmethod
+    def _extract_text_layer(pdf_content: bytes, min_text_chars: int) -> List[Optional[str]]:
+        """
+        提取各页文本层
+
+        Returns:
+            按页码排列的文本列表，文本层不足（扫描件、乱码字体）的页面为None
+        """
+        with fitz.open(stream=pdf_content, filetype="pdf") as doc:
+            if min_text_chars <= 0:
+                return [None] * len(doc)
+            page_texts = []
+            for page in doc:
+                text = page.get_text("text").strip()
+                usable_chars = sum(1 for ch in text if ch.isalnum())
+                page_texts.append(text if usable_chars >= min_text_chars else None)
+            return page_texts
+
+    def _iter_encoded_pages(
+        self,
+        pdf_content: bytes,
+        encoder: PageEncoder,
+        page_numbers: List[int]
+    ) -> Iterator[bytes]:
+        """按渲染后端逐页渲染编码指定页码"""
+        rendered = 0
+        if self.process_renderer is not None:
+            try:
+                for image in self.process_renderer.iter_page_images(pdf_content, encoder, page_numbers):
+                    rendered += 1
+                    yield image
+                return
+            except (OSError, RuntimeError) as e:
+                # 进程池不可用（如受限环境无法创建子进程/共享内存）时从未产出的页开始回退到进程内渲染
+                logger.warning(f"多进程渲染不可用，回退到进程内渲染: {str(e)}")
+                self.process_renderer = None
+        with fitz.open(stream=pdf_content, filetype="pdf") as doc:
+            for page_num in page_numbers[rendered:]:
+                yield encoder.render(doc.load_page(page_num))
     
     def local_pdf_to_images(
         self, 
@@ -0,0 +1,159 @@
+import os
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+from src.tools.page_encoder import PageEncoder
+
+logger = logging.getLogger(__name__)
+
+# 每个进程一个渲染进程池（Celery prefork 子进程 fork 后按 pid 重建）
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_pid: Optional[int] = None
+_executor_size: Optional[int] = None
+
+
+def get_render_executor(processes: int) -> ProcessPoolExecutor:
+    """获取当前进程共享的PDF渲染进程池（单例，使用spawn启动以避免fork继承线程状态）"""
+    global _executor, _executor_pid, _executor_size
+    broken = _executor is not None and getattr(_executor, "_broken", False)
+    if _executor is None or broken or _executor_pid != os.getpid() or _executor_size != processes:
+        _executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        _executor_pid = os.getpid()
+        _executor_size = processes
+        logger.info(f"PDF渲染进程池已创建，进程数: {processes}")
+    return _executor
+
+
+def _render_page_range(
+    pdf_shm_name: str,
+    pdf_size: int,
+    page_numbers: List[int],
+    encoder: PageEncoder
+) -> Tuple[str, List[Tuple[int, int]], Dict[str, int]]:
+    """
+    渲染进程入口：打开一次文档并渲染编码指定页码
+
+    PDF内容从共享内存读取，编码后的页面写入新的共享内存段，仅返回段名与各页偏移，避免大块字节经pickle传输
+
+    :return: (结果共享内存段名, [(偏移, 长度), ...], 编码统计)
+    """
+    pdf_shm = shared_memory.SharedMemory(name=pdf_shm_name)
+    try:
+        pdf_content = bytes(pdf_shm.buf[:pdf_size])
+    finally:
+        pdf_shm.close()
+
+    encoder.stats = PageEncoder.empty_stats()
+    pages = []
+    with fitz.open(stream=pdf_content, filetype="pdf") as doc:
+        for page_num in page_numbers:
+            pages.append(encoder.render(doc.load_page(page_num)))
+
+    spans = []
+    offset = 0
+    for page in pages:
+        spans.append((offset, len(page)))
+        offset += len(page)
+    out_shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    try:
+        for page, (page_offset, length) in zip(pages, spans):
+            out_shm.buf[page_offset:page_offset + length] = page
+        return out_shm.name, spans, encoder.stats
+    finally:
+        # 仅关闭映射，段的生命周期由父进程负责（读取后unlink）
+        out_shm.close()
+
+
+class ProcessPoolPdfRenderer:
+    """
+    多进程PDF渲染器：按页段分发到进程池，突破GIL对 get_pixmap 的串行限制
+
+    - 源PDF通过共享内存下发，每个渲染进程对所负责的页段只打开一次文档
+    - 渲染结果通过共享内存回传，父进程按页序产出
+    - 在途页段数不超过进程数，内存占用不随文档页数增长
+    """
+
+    def __init__(self, processes: int = 0, pages_per_task: int = 4):
+        """
+        :param processes: 渲染进程数，0表示使用CPU核数
+        :param pages_per_task: 每个渲染任务负责的页数
+        """
+        self.processes = processes or os.cpu_count() or 1
+        self.pages_per_task = max(1, pages_per_task)
+
+    def iter_page_images(
+        self,
+        pdf_content: bytes,
+        encoder: PageEncoder,
+        page_numbers: Optional[List[int]] = None
+    ) -> Iterator[bytes]:
+        """
+        多进程渲染并按页序产出编码后的图片字节流
+
+        :param pdf_content: PDF文件内容字节流
+        :param encoder: 页面编码器（渲染倍率、格式、质量），各进程回传的编码统计合并到该对象
+        :param page_numbers: 需要渲染的页码列表，默认渲染全部页面
+        """
+        if page_numbers is None:
+            with fitz.open(stream=pdf_content, filetype="pdf") as doc:
+                page_numbers = list(range(len(doc)))
+        ranges = deque(
+            page_numbers[start:start + self.pages_per_task]
+            for start in range(0, len(page_numbers), self.pages_per_task)
+        )
+        if not ranges:
+            return
+
+        executor = get_render_executor(self.processes)
+        pdf_shm = shared_memory.SharedMemory(create=True, size=len(pdf_content))
+        pdf_shm.buf[:len(pdf_content)] = pdf_content
+        in_flight: deque[Future] = deque()
+        try:
+            def submit_next() -> None:
+                in_flight.append(executor.submit(
+                    _render_page_range, pdf_shm.name, len(pdf_content), ranges.popleft(), encoder
+                ))
+
+            while ranges and len(in_flight) < self.processes:
+                submit_next()
+            while in_flight:
+                shm_name, spans, stats = in_flight.popleft().result()
+                encoder.merge_stats(stats)
+                if ranges:
+                    submit_next()
+                yield from self._read_pages(shm_name, spans)
+        finally:
+            # 调用方提前结束迭代时，回收仍在渲染中的页段对应的共享内存
+            for future in in_flight:
+                try:
+                    shm_name, _, _ = future.result()
+                    self._release(shm_name)
+                except Exception as e:
+                    logger.warning(f"回收渲染结果共享内存失败: {str(e)}")
+            pdf_shm.close()
+            pdf_shm.unlink()
+
+    @staticmethod
+    def _read_pages(shm_name: str, spans: List[Tuple[int, int]]) -> List[bytes]:
+        """从结果共享内存段读取各页字节并释放该段"""
+        out_shm = shared_memory.SharedMemory(name=shm_name)
+        try:
+            return [bytes(out_shm.buf[offset:offset + length]) for offset, length in spans]
+        finally:
+            out_shm.close()
+            out_shm.unlink()
+
+    @staticmethod
+    def _release(shm_name: str) -> None:
+        """释放未读取的结果共享内存段"""
+        out_shm = shared_memory.SharedMemory(name=shm_name)
+        out_shm.close()
+        out_shm.unlink()
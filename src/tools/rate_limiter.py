@@ -0,0 +1,342 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+from redis import Redis
+from src.configs import ApiConfig
+from src.configs.redis_config import get_redis_pool
+
+logger = logging.getLogger("celery")
+
+# 获取令牌与并发租约（原子操作，时间取Redis服务器时间，保证多主机时钟一致）
+_ACQUIRE_SCRIPT = """
+local state_key, lease_key = KEYS[1], KEYS[2]
+local rate, burst, initial_limit = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local lease_id, lease_ttl = ARGV[4], tonumber(ARGV[5])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', lease_key, '-inf', now)
+local limit = tonumber(redis.call('HGET', state_key, 'limit') or initial_limit)
+if redis.call('ZCARD', lease_key) >= math.floor(limit) then
+    return {0, '0.05'}
+end
+local tokens = tonumber(redis.call('HGET', state_key, 'tokens') or burst)
+local ts = tonumber(redis.call('HGET', state_key, 'ts') or now)
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+if tokens < 1 then
+    redis.call('HSET', state_key, 'tokens', tostring(tokens), 'ts', tostring(now))
+    return {0, tostring((1 - tokens) / rate)}
+end
+redis.call('HSET', state_key, 'tokens', tostring(tokens - 1), 'ts', tostring(now), 'limit', tostring(limit))
+redis.call('ZADD', lease_key, now + lease_ttl, lease_id)
+redis.call('EXPIRE', state_key, 86400)
+redis.call('EXPIRE', lease_key, 86400)
+return {1, '0'}
+"""
+
+# 归还租约并按调用结果调整并发上限（AIMD）
+_RELEASE_SCRIPT = """
+local state_key, lease_key = KEYS[1], KEYS[2]
+local lease_id, outcome = ARGV[1], ARGV[2]
+local min_limit, max_limit, cooldown = tonumber(ARGV[3]), tonumber(ARGV[4]), tonumber(ARGV[5])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call('ZREM', lease_key, lease_id)
+local limit = tonumber(redis.call('HGET', state_key, 'limit') or max_limit)
+local last_decrease = tonumber(redis.call('HGET', state_key, 'last_decrease') or 0)
+if outcome == 'ok' then
+    limit = math.min(max_limit, limit + 1 / limit)
+elseif now - last_decrease >= cooldown then
+    local factor = 0.8
+    if outcome == 'throttled' then factor = 0.5 end
+    limit = math.max(min_limit, limit * factor)
+    redis.call('HSET', state_key, 'last_decrease', tostring(now))
+end
+redis.call('HSET', state_key, 'limit', tostring(limit))
+return tostring(limit)
+"""
+
+
+def is_throttled_error(error: BaseException) -> bool:
+    """判断异常是否为模型服务限流（HTTP 429），兼容openai与requests异常"""
+    if getattr(error, "status_code", None) == 429:
+        return True
+    return getattr(getattr(error, "response", None), "status_code", None) == 429
+
+
+class _LocalBackend:
+    """进程内后端（Redis不可用或配置为local时使用，算法与Redis脚本一致）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tokens: Optional[float] = None
+        self.ts = time.monotonic()
+        self.limit: Optional[float] = None
+        self.last_decrease = 0.0
+        self.leases: Dict[str, float] = {}
+
+    def acquire(self, rate: float, burst: int, initial_limit: int, lease_id: str, lease_ttl: int) -> Tuple[bool, float]:
+        with self.lock:
+            now = time.monotonic()
+            self.leases = {lease: expiry for lease, expiry in self.leases.items() if expiry > now}
+            if self.limit is None:
+                self.limit = float(initial_limit)
+            if len(self.leases) >= int(self.limit):
+                return False, 0.05
+            tokens = burst if self.tokens is None else self.tokens
+            tokens = min(burst, tokens + max(0.0, now - self.ts) * rate)
+            self.ts = now
+            if tokens < 1:
+                self.tokens = tokens
+                return False, (1 - tokens) / rate
+            self.tokens = tokens - 1
+            self.leases[lease_id] = now + lease_ttl
+            return True, 0.0
+
+    def release(self, lease_id: str, outcome: str, min_limit: int, max_limit: int, cooldown: float) -> float:
+        with self.lock:
+            now = time.monotonic()
+            self.leases.pop(lease_id, None)
+            limit = float(max_limit) if self.limit is None else self.limit
+            if outcome == "ok":
+                limit = min(max_limit, limit + 1 / limit)
+            elif now - self.last_decrease >= cooldown:
+                limit = max(min_limit, limit * (0.5 if outcome == "throttled" else 0.8))
+                self.last_decrease = now
+            self.limit = limit
+            return limit
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            now = time.monotonic()
+            return {
+                "limit": self.limit,
+                "in_flight": sum(1 for expiry in self.leases.values() if expiry > now),
+                "tokens": self.tokens,
+            }
+
+
+class ModelRateLimiter:
+    """
+    模型调用限流器（集群共享：令牌桶限速 + 并发租约 + AIMD自适应并发上限）
+
+    - 令牌桶：所有进程共享每秒请求数配额（rate）与突发容量（burst）
+    - 并发租约：同时进行中的调用数不超过当前并发上限，租约带过期时间，进程崩溃后自动回收
+    - AIMD：调用成功时并发上限加性增长（每轮+1），遇到429乘性减半、延迟超过目标时降为0.8倍（冷却期内只调整一次）
+    - 后端：默认使用Redis（Lua脚本原子执行），Redis不可用时回退到进程内限流
+    """
+
+    KEY_PREFIX = "ratelimit:"
+    REDIS_RETRY_INTERVAL = 30  # Redis失败后回退到进程内限流的时长（秒），避免每次调用都等待连接超时
+
+    def __init__(
+        self,
+        name: str,
+        redis_client: Optional[Redis] = None,
+        rate: float = 10.0,
+        burst: int = 20,
+        max_concurrency: int = 16,
+        min_concurrency: int = 1,
+        latency_target: float = 20.0,
+        lease_ttl: int = 120,
+        cooldown: float = 2.0,
+        acquire_timeout: float = 300.0,
+        backend: str = "redis"
+    ):
+        """
+        :param name: 限流资源名（如 dashscope、dify），同名限流器在集群内共享配额
+        :param redis_client: Redis客户端，默认使用全局连接池
+        :param rate: 每秒请求数配额
+        :param burst: 令牌桶容量（允许的突发请求数）
+        :param max_concurrency: 并发上限的最大值（初始值）
+        :param min_concurrency: 并发上限的最小值
+        :param latency_target: 单次调用耗时超过该值（秒）视为服务过载
+        :param lease_ttl: 并发租约过期时间（秒），应大于单次调用的最长耗时
+        :param cooldown: 两次下调并发上限的最小间隔（秒），避免同一波限流被重复惩罚
+        :param acquire_timeout: 等待配额的最长时间（秒）
+        :param backend: redis（集群共享）| local（仅进程内）
+        """
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = max(1, min_concurrency)
+        self.latency_target = latency_target
+        self.lease_ttl = lease_ttl
+        self.cooldown = cooldown
+        self.acquire_timeout = acquire_timeout
+        self.keys = [f"{self.KEY_PREFIX}{name}:state", f"{self.KEY_PREFIX}{name}:leases"]
+        self.local = _LocalBackend()
+        self.redis = None
+        self._redis_retry_at = 0.0
+        if backend == "redis":
+            self.redis = redis_client or Redis(connection_pool=get_redis_pool())
+            self._acquire_script = self.redis.register_script(_ACQUIRE_SCRIPT)
+            self._release_script = self.redis.register_script(_RELEASE_SCRIPT)
+
+    def _try_acquire(self, lease_id: str) -> Tuple[bool, float, bool]:
+        """尝试获取一次配额，返回 (是否成功, 建议等待秒数, 是否使用Redis后端)"""
+        if self.redis is not None and time.monotonic() >= self._redis_retry_at:
+            try:
+                acquired, wait = self._acquire_script(
+                    keys=self.keys,
+                    args=[self.rate, self.burst, self.max_concurrency, lease_id, self.lease_ttl]
+                )
+                return bool(int(acquired)), float(wait), True
+            except Exception as e:
+                self._redis_retry_at = time.monotonic() + self.REDIS_RETRY_INTERVAL
+                logger.warning(
+                    f"限流器[{self.name}] Redis不可用，{self.REDIS_RETRY_INTERVAL}秒内回退到进程内限流: {str(e)}"
+                )
+        acquired, wait = self.local.acquire(self.rate, self.burst, self.max_concurrency, lease_id, self.lease_ttl)
+        return acquired, wait, False
+
+    def acquire(self) -> Tuple[str, bool]:
+        """
+        阻塞获取调用配额
+
+        :return: (租约ID, 是否为Redis租约)
+        :raises TimeoutError: 超过 acquire_timeout 仍未获得配额
+        """
+        lease_id = f"{os.getpid()}:{uuid.uuid4().hex}"
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            acquired, wait, remote = self._try_acquire(lease_id)
+            if acquired:
+                return lease_id, remote
+            if time.monotonic() + wait > deadline:
+                raise TimeoutError(f"等待模型调用配额超时: {self.name}")
+            time.sleep(wait)
+
+    async def aacquire(self) -> Tuple[str, bool]:
+        """异步获取调用配额（Redis调用在线程中执行，等待期间不阻塞事件循环）"""
+        lease_id = f"{os.getpid()}:{uuid.uuid4().hex}"
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            acquired, wait, remote = await asyncio.to_thread(self._try_acquire, lease_id)
+            if acquired:
+                return lease_id, remote
+            if time.monotonic() + wait > deadline:
+                raise TimeoutError(f"等待模型调用配额超时: {self.name}")
+            await asyncio.sleep(wait)
+
+    def release(self, lease: Tuple[str, bool], latency: float, error: Optional[BaseException] = None) -> None:
+        """归还配额并按调用结果调整并发上限"""
+        if error is not None and is_throttled_error(error):
+            outcome = "throttled"
+        elif latency > self.latency_target:
+            outcome = "slow"
+        else:
+            # 非限流类错误（参数错误、解析失败等）不代表服务过载，按正常完成处理
+            outcome = "ok"
+        lease_id, remote = lease
+        args = [lease_id, outcome, self.min_concurrency, self.max_concurrency, self.cooldown]
+        if remote:
+            try:
+                limit = float(self._release_script(keys=self.keys, args=args))
+            except Exception as e:
+                # 租约会在 lease_ttl 后自动过期
+                logger.warning(f"限流器[{self.name}] 归还租约失败: {str(e)}")
+                return
+        else:
+            limit = self.local.release(*args)
+        if outcome != "ok":
+            logger.warning(f"限流器[{self.name}] 调用{outcome}（耗时{latency:.2f}秒），并发上限调整为 {limit:.2f}")
+
+    @contextmanager
+    def slot(self):
+        """同步调用配额上下文：进入时获取配额，退出时按耗时与异常类型归还"""
+        lease = self.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            self.release(lease, time.monotonic() - start, e)
+            raise
+        self.release(lease, time.monotonic() - start)
+
+    @asynccontextmanager
+    async def aslot(self):
+        """异步调用配额上下文"""
+        lease = await self.aacquire()
+        start = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            await asyncio.to_thread(self.release, lease, time.monotonic() - start, e)
+            raise
+        await asyncio.to_thread(self.release, lease, time.monotonic() - start)
+
+    def stats(self) -> Dict[str, Any]:
+        """当前并发上限、进行中的调用数与剩余令牌（Redis后端读取集群共享状态）"""
+        if self.redis is None:
+            return {"name": self.name, "backend": "local", **self.local.stats()}
+        state = self.redis.hgetall(self.keys[0])
+        self.redis.zremrangebyscore(self.keys[1], "-inf", time.time())
+        return {
+            "name": self.name,
+            "backend": "redis",
+            "limit": float(state["limit"]) if "limit" in state else None,
+            "in_flight": self.redis.zcard(self.keys[1]),
+            "tokens": float(state["tokens"]) if "tokens" in state else None,
+        }
+
+
+# 每个进程按资源名缓存限流器（单例模式，fork 后按 pid 重建）
+_limiters: Dict[str, ModelRateLimiter] = {}
+_limiters_pid: Optional[int] = None
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name: str) -> Optional["ModelRateLimiter"]:
+    """
+    获取当前进程共享的模型调用限流器（按RATE_LIMIT_*配置创建，未启用时返回None）
+
+    :param name: 限流资源名（dashscope、dify）
+    """
+    global _limiters, _limiters_pid
+    with _limiters_lock:
+        if _limiters_pid != os.getpid():
+            _limiters = {}
+            _limiters_pid = os.getpid()
+        if name not in _limiters:
+            config = ApiConfig().rate_limit
+            _limiters[name] = None if not config.ENABLED else ModelRateLimiter(
+                name,
+                rate=config.RATE,
+                burst=config.BURST,
+                max_concurrency=config.MAX_CONCURRENCY,
+                min_concurrency=config.MIN_CONCURRENCY,
+                latency_target=config.LATENCY_TARGET,
+                lease_ttl=config.LEASE_TTL,
+                acquire_timeout=config.ACQUIRE_TIMEOUT,
+                backend=config.BACKEND,
+            )
+        return _limiters[name]
+
+
+@contextmanager
+def rate_limited(name: str):
+    """按资源名限流的同步调用上下文（未启用限流时直接执行）"""
+    limiter = get_rate_limiter(name)
+    if limiter is None:
+        yield
+        return
+    with limiter.slot():
+        yield
+
+
+@asynccontextmanager
+async def arate_limited(name: str):
+    """按资源名限流的异步调用上下文（未启用限流时直接执行）"""
+    limiter = get_rate_limiter(name)
+    if limiter is None:
+        yield
+        return
+    async with limiter.aslot():
+        yield
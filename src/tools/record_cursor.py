@@ -0,0 +1,44 @@
+import logging
+from typing import Optional
+from redis import Redis
+from src.configs.redis_config import get_redis_pool
+
+logger = logging.getLogger("celery")
+
+
+class RecordScanCursor:
+    """
+    记录增量扫描游标（按主键id区间推进，高水位保存在Redis，多个拉取实例共享）
+
+    每轮从上次停下的id之后继续扫描，到达表尾后从头开始（环绕），保证每条待处理记录最终都会被访问到
+    """
+
+    KEY_PREFIX = "ocr:fetch:cursor:"
+
+    def __init__(self, name: str, redis_client: Optional[Redis] = None, range_size: int = 5000, max_ranges: int = 20):
+        """
+        :param name: 游标名称（不同分区使用不同游标）
+        :param redis_client: Redis客户端，默认使用全局连接池
+        :param range_size: 每次查询覆盖的id区间大小（限制单次查询扫描的行数）
+        :param max_ranges: 每轮最多扫描的区间数
+        """
+        self.redis = redis_client or Redis(connection_pool=get_redis_pool())
+        self.key = f"{self.KEY_PREFIX}{name}"
+        self.range_size = max(1, range_size)
+        self.max_ranges = max(1, max_ranges)
+
+    def get(self) -> int:
+        """读取高水位（上次扫描停止处的id），Redis异常时从头扫描"""
+        try:
+            value = self.redis.get(self.key)
+            return int(value) if value else 0
+        except Exception as e:
+            logger.warning(f"读取扫描游标失败，从头扫描: {str(e)}")
+            return 0
+
+    def set(self, position: int) -> None:
+        """保存高水位"""
+        try:
+            self.redis.set(self.key, position)
+        except Exception as e:
+            logger.warning(f"保存扫描游标失败: {str(e)}")
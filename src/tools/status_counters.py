@@ -0,0 +1,341 @@
+import time
+import logging
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+from redis import Redis
+from src.configs import get_api_config
+from src.configs.redis_config import get_redis_pool
+
+logger = logging.getLogger("celery")
+
+STATUSES = ("-1", "0", "1", "2")
+
+# 将一批状态变更（ARGV[first]起每3个一组：业务ID、字段、增量）累加到指定代的计数键：
+# 业务ID计数，以及按电站映射（公司|省份;公司|省份）累加到公司、省份、公司+省份计数
+_APPLY_FUNCTION = """
+local function apply(base, deltas, first)
+    for i = first, #deltas, 3 do
+        local business, field, delta = deltas[i], deltas[i + 1], tonumber(deltas[i + 2])
+        redis.call('HINCRBY', base .. 'business:' .. business, field, delta)
+        local plants = redis.call('HGET', base .. 'plants', business)
+        if plants then
+            for company, province in string.gmatch(plants, '([^|;]*)|([^;]*)') do
+                redis.call('HINCRBY', base .. 'company:' .. company, field, delta)
+                redis.call('HINCRBY', base .. 'province:' .. province, field, delta)
+                redis.call('HINCRBY', base .. 'cp:' .. company .. ':' .. province, field, delta)
+            end
+        end
+    end
+end
+"""
+
+# 原子地应用一批状态变更到当前代（尚未对账时不记录）；对账重建期间同时追加到增量日志，切换时补记到新一代
+_APPLY_SCRIPT = _APPLY_FUNCTION + """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    for i = 2, #ARGV, 3 do
+        redis.call('RPUSH', KEYS[3], ARGV[i], ARGV[i + 1], ARGV[i + 2])
+    end
+end
+local generation = redis.call('GET', KEYS[1])
+if generation then
+    apply(ARGV[1] .. 'g' .. generation .. ':', ARGV, 2)
+end
+return 1
+"""
+
+# 对账完成：补记重建期间的增量后切换到新一代（重建已被更新的对账接管时放弃）
+_SWITCH_SCRIPT = _APPLY_FUNCTION + """
+if redis.call('GET', KEYS[2]) ~= ARGV[2] then
+    return -1
+end
+local deltas = redis.call('LRANGE', KEYS[3], 0, -1)
+apply(ARGV[1] .. 'g' .. ARGV[2] .. ':', deltas, 1)
+redis.call('SET', KEYS[1], ARGV[2])
+redis.call('DEL', KEYS[2], KEYS[3])
+return #deltas / 3
+"""
+
+# 多个组合计时的电站数：各组电站集合求并集后计数（同一电站跨组只计一次）
+_UNION_COUNT_SCRIPT = """
+return #redis.call('SUNION', unpack(KEYS))
+"""
+
+
+class OCRStatusCounters:
+    """
+    OCR记录ai_status计数器（增量维护于Redis，定时与MySQL对账）
+
+    - 计数：按业务ID、公司、省份、公司+省份分别存储HASH（字段为各ai_status的记录数，plants为有记录的电站数）
+    - 增量：每次状态变更（回写结果、领取、释放、重置）提交后按 (业务ID, 原状态, 新状态) 原子地增减
+    - 对账：计数键按代存放（ocr:status:g<代>:...），对账将MySQL中GROUP BY聚合的结果流式写入新一代，
+      重建期间的增量同时记入增量日志，切换时补记到新一代，再删除旧代的键
+    - 查询：按请求的公司/省份键读取当前代，不访问OCR表；首次对账完成前不维护计数
+    """
+
+    PREFIX = "ocr:status:"
+    GENERATION_KEY = "ocr:status:generation"  # STRING: 当前代
+    GENERATION_SEQ_KEY = "ocr:status:generation_seq"  # STRING: 代序号
+    BUILDING_KEY = "ocr:status:building"  # STRING: 正在重建的代（存在时增量同时记入增量日志）
+    DELTAS_KEY = "ocr:status:deltas"  # LIST: 重建期间的增量（业务ID、字段、增量依次排列）
+    META_KEY = "ocr:status:meta"  # HASH: reconciled_at / duration_ms / generation / businesses / companies / provinces / replayed_deltas
+    BUILD_TTL = 3600  # 重建标记的过期时间（秒），对账进程崩溃后停止记录增量日志
+
+    # 每代的键（相对 ocr:status:g<代>: 前缀）：
+    # plants                         HASH: 业务ID -> 公司|省份;公司|省份（与电站表关联的行，与SQL统计的关联口径一致）
+    # business:/company:/province:/cp:  HASH: 各状态记录数与电站数
+    # members:<组>                    SET: 各组有记录的电站编号（多组合计时去重电站数）
+    # company_provinces:/province_companies:  SET: 公司的省份 / 省份的公司
+
+    def __init__(self, redis_client: Optional[Redis] = None):
+        """
+        :param redis_client: Redis客户端，默认使用全局连接池
+        """
+        self.redis = redis_client or Redis(connection_pool=get_redis_pool())
+        self._apply = self.redis.register_script(_APPLY_SCRIPT)
+        self._switch = self.redis.register_script(_SWITCH_SCRIPT)
+        self._union_count = self.redis.register_script(_UNION_COUNT_SCRIPT)
+
+    @classmethod
+    def from_config(cls, redis_client: Optional[Redis] = None) -> Optional["OCRStatusCounters"]:
+        """按OCR配置创建计数器，未启用时返回None"""
+        if not get_api_config().ocr.STATUS_COUNTERS_ENABLED:
+            return None
+        return cls(redis_client)
+
+    @staticmethod
+    def status_field(status: Optional[int]) -> str:
+        """ai_status对应的计数字段（None归为未处理0，与SQL统计一致）"""
+        return str(status if status is not None else 0)
+
+    def apply(self, transitions: Iterable[Tuple[str, Optional[int], Optional[int]]]) -> None:
+        """
+        应用一批状态变更（一次脚本调用，原子执行；异常只记录日志，偏差由对账修正）
+
+        :param transitions: (业务ID, 原状态, 新状态)
+        """
+        deltas: Counter = Counter()
+        for business_id, old_status, new_status in transitions:
+            old_field, new_field = self.status_field(old_status), self.status_field(new_status)
+            if old_field == new_field or not business_id:
+                continue
+            deltas[(business_id, old_field)] -= 1
+            deltas[(business_id, new_field)] += 1
+        args: List[str] = [self.PREFIX]
+        for (business_id, field), delta in deltas.items():
+            if delta:
+                args.extend([business_id, field, str(delta)])
+        if len(args) == 1:
+            return
+        try:
+            self._apply(keys=[self.GENERATION_KEY, self.BUILDING_KEY, self.DELTAS_KEY], args=args)
+        except Exception as e:
+            logger.warning(f"OCR状态计数更新失败，等待对账修正: {str(e)}")
+
+    def ready(self) -> bool:
+        """是否已完成过对账（未对账时计数不完整，统计应查询数据库）"""
+        return bool(self.redis.exists(self.GENERATION_KEY))
+
+    def begin_reconcile(self) -> int:
+        """
+        开始对账：分配新一代并开始记录增量日志（须在读取数据库快照之前调用）
+
+        快照开始后提交的状态变更都会记入日志并在切换时补记；仅快照开始前已提交、尚未应用的增量可能被重复计入，由下次对账修正
+
+        :return: 新一代序号
+        """
+        generation = int(self.redis.incr(self.GENERATION_SEQ_KEY))
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.delete(self.DELTAS_KEY)
+        pipe.set(self.BUILDING_KEY, generation, ex=self.BUILD_TTL)
+        pipe.execute()
+        return generation
+
+    def reconcile(
+        self,
+        generation: int,
+        plant_rows: Iterable[Tuple[str, object, str]],
+        business_rows: Iterable[Tuple],
+        company_rows: Iterable[Tuple],
+        province_rows: Iterable[Tuple],
+        cp_rows: Iterable[Tuple],
+        member_rows: Iterable[Tuple[str, object, str]]
+    ) -> Dict[str, int]:
+        """
+        以MySQL聚合结果重建计数（各结果集依次流式写入新一代，不在内存中汇总），补记增量后切换
+
+        计数行的最后5列依次为 ai_status -1/0/1/2 的记录数与电站数，之前为分组列
+
+        :param generation: begin_reconcile 分配的代
+        :param plant_rows: 电站表 (电站编号, 公司ID, 省份)，按电站编号排序
+        :param business_rows: 按业务ID聚合的未删除记录 (业务ID, ...)
+        :param company_rows: 按公司聚合 (公司ID, ...)
+        :param province_rows: 按省份聚合 (省份, ...)
+        :param cp_rows: 按公司+省份聚合 (公司ID, 省份, ...)
+        :param member_rows: 有未删除记录的电站与其关联 (业务ID, 公司ID, 省份)，去重
+        :return: 对账摘要
+        """
+        started = time.time()
+        base = f"{self.PREFIX}g{generation}:"
+        pipe = self.redis.pipeline(transaction=False)
+        pending = 0
+
+        def queued(count: int = 1) -> None:
+            nonlocal pending
+            pending += count
+            if pending >= 1000:
+                pipe.execute()
+                pending = 0
+
+        # 电站映射：按电站编号排序流式读取，同一电站的多行合并为一个字段
+        pairs_seen = set()
+        current, pairs = None, []
+        for power_number, company_id, province in plant_rows:
+            if power_number != current:
+                if pairs:
+                    pipe.hset(f"{base}plants", current, ";".join(f"{c}|{p}" for c, p in pairs))
+                    queued()
+                current, pairs = power_number, []
+            pair = (str(company_id), str(province))
+            pairs.append(pair)
+            pairs_seen.add(pair)
+        if pairs:
+            pipe.hset(f"{base}plants", current, ";".join(f"{c}|{p}" for c, p in pairs))
+        for company, province in pairs_seen:
+            pipe.sadd(f"{base}company_provinces:{company}", province)
+            pipe.sadd(f"{base}province_companies:{province}", company)
+            queued(2)
+
+        businesses = 0
+        for row in business_rows:
+            pipe.hset(f"{base}business:{row[0]}", mapping=self._fields(row))
+            businesses += 1
+            queued()
+        for row in company_rows:
+            pipe.hset(f"{base}company:{row[0]}", mapping=self._fields(row))
+            queued()
+        for row in province_rows:
+            pipe.hset(f"{base}province:{row[0]}", mapping=self._fields(row))
+            queued()
+        for row in cp_rows:
+            pipe.hset(f"{base}cp:{row[0]}:{row[1]}", mapping=self._fields(row))
+            queued()
+        for business_id, company_id, province in member_rows:
+            pipe.sadd(f"{base}members:company:{company_id}", business_id)
+            pipe.sadd(f"{base}members:province:{province}", business_id)
+            pipe.sadd(f"{base}members:cp:{company_id}:{province}", business_id)
+            queued(3)
+        pipe.execute()
+
+        replayed = self._switch(
+            keys=[self.GENERATION_KEY, self.BUILDING_KEY, self.DELTAS_KEY],
+            args=[self.PREFIX, generation]
+        )
+        if replayed < 0:
+            # 重建期间已有更新的对账开始，放弃本次结果
+            logger.warning(f"OCR状态计数第{generation}代重建期间已有更新的对账，放弃本次结果")
+            self._delete_generations(lambda other: other == generation)
+            return {"generation": generation, "superseded": 1}
+        self._delete_generations(lambda other: other < generation)
+        summary = {
+            "reconciled_at": int(time.time()),
+            "duration_ms": int((time.time() - started) * 1000),
+            "generation": generation,
+            "businesses": businesses,
+            "companies": len({company for company, _ in pairs_seen}),
+            "provinces": len({province for _, province in pairs_seen}),
+            "replayed_deltas": replayed,
+        }
+        self.redis.hset(self.META_KEY, mapping=summary)
+        logger.info(f"OCR状态计数对账完成：{summary}")
+        return summary
+
+    @staticmethod
+    def _fields(row: Tuple) -> Dict[str, int]:
+        """计数行最后5列转为计数字段"""
+        return dict(zip((*STATUSES, "plants"), (int(value or 0) for value in row[-5:])))
+
+    def _delete_generations(self, matches) -> None:
+        """删除符合条件的代的全部键（旧代或被放弃的代）"""
+        batch = []
+        for key in self.redis.scan_iter(match=f"{self.PREFIX}g*", count=1000):
+            generation = key[len(self.PREFIX) + 1:].split(":", 1)[0]
+            if generation.isdigit() and matches(int(generation)):
+                batch.append(key)
+                if len(batch) >= 1000:
+                    self.redis.delete(*batch)
+                    batch = []
+        if batch:
+            self.redis.delete(*batch)
+
+    def _base(self) -> Optional[str]:
+        generation = self.redis.get(self.GENERATION_KEY)
+        return f"{self.PREFIX}g{generation}:" if generation is not None else None
+
+    def statistics(
+        self,
+        company_ids: Optional[List] = None,
+        province_ids: Optional[List[str]] = None,
+        breakdowns: Optional[List[str]] = None
+    ) -> Dict:
+        """
+        按公司/省份读取状态分布（与 OCRService.get_ai_status_statistics 返回结构一致）
+
+        同时指定公司与省份时按公司+省份计数求和；多个组合计时电站数按各组电站集合的并集计算
+        """
+        companies = [str(company) for company in company_ids or []]
+        provinces = [str(province) for province in province_ids or []]
+        base = self._base() or f"{self.PREFIX}g0:"
+
+        def pairs_of(company_list: List[str], province_list: List[str]) -> List[Tuple[str, str]]:
+            if company_list and province_list:
+                return [(company, province) for company in company_list for province in province_list]
+            if company_list:
+                return [(company, province) for company in company_list
+                        for province in self.redis.smembers(f"{base}company_provinces:{company}")]
+            return [(company, province) for province in province_list
+                    for company in self.redis.smembers(f"{base}province_companies:{province}")]
+
+        if companies and provinces:
+            scopes = [f"cp:{company}:{province}" for company, province in pairs_of(companies, provinces)]
+        elif companies:
+            scopes = [f"company:{company}" for company in companies]
+        else:
+            scopes = [f"province:{province}" for province in provinces]
+        result = self._sum(base, scopes)
+
+        for breakdown in breakdowns or []:
+            if breakdown == "company":
+                if provinces:
+                    grouped = defaultdict(list)
+                    for company, province in pairs_of(companies, provinces):
+                        grouped[company].append(f"cp:{company}:{province}")
+                else:
+                    grouped = {company: [f"company:{company}"] for company in companies}
+            else:
+                if companies:
+                    grouped = defaultdict(list)
+                    for company, province in pairs_of(companies, provinces):
+                        grouped[province].append(f"cp:{company}:{province}")
+                else:
+                    grouped = {province: [f"province:{province}"] for province in provinces}
+            items = [{"key": key, **self._sum(base, group_scopes)} for key, group_scopes in sorted(grouped.items())]
+            # 与SQL分组一致，不返回没有记录的组
+            result[f"by_{breakdown}"] = [item for item in items if any(value for name, value in item.items() if name != "key")]
+        return result
+
+    def _sum(self, base: str, scopes: List[str]) -> Dict[str, int]:
+        totals: Counter = Counter()
+        pipe = self.redis.pipeline(transaction=False)
+        for scope in scopes:
+            pipe.hgetall(f"{base}{scope}")
+        for counts in pipe.execute() if scopes else []:
+            totals.update({field: int(value) for field, value in counts.items()})
+        if len(scopes) > 1:
+            totals["plants"] = self._union_count(keys=[f"{base}members:{scope}" for scope in scopes])
+        return {
+            "ai_status_neg_1_count": totals["-1"],
+            "ai_status_0_count": totals["0"],
+            "ai_status_1_count": totals["1"],
+            "ai_status_2_count": totals["2"],
+            "total_power_plants": totals["plants"],
+        }
@@ -0,0 +1,147 @@
+import uuid
+import logging
+from typing import Dict, List, Optional
+from redis import Redis
+from src.configs import get_api_config
+from src.configs.redis_config import get_redis_pool
+
+logger = logging.getLogger("celery")
+
+# 处理时占用：键不存在或处于queued状态时切换为running并设置处理租约
+_BEGIN_SCRIPT = """
+local value = redis.call('GET', KEYS[1])
+if value and string.sub(value, 1, 8) == 'running:' then
+    return 0
+end
+redis.call('SET', KEYS[1], 'running:' .. ARGV[1], 'EX', ARGV[2])
+return 1
+"""
+
+# 释放：仅删除自己持有的租约（租约过期后被其他副本接管时不误删）
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# 转回排队：仅在仍持有租约时将running切换回queued（失败等待重试期间不被重复发布，重试时可重新占用）
+_REQUEUE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('SET', KEYS[1], 'queued', 'EX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+class InFlightTaskRegistry:
+    """
+    在途任务去重登记表（以任务ID为键，存储于Redis）
+
+    - 发布时：SET NX 登记为 queued（带排队租约），已登记的任务ID不再重复发布
+    - 处理时：原子地从 queued/未登记 切换为 running（带处理租约），已有副本在处理时跳过
+    - 处理成功或最终失败后释放；失败等待重试时转回queued；进程崩溃时由租约过期自动回收
+    - 统计：发布时跳过、处理时跳过的重复任务数
+    """
+
+    KEY_PREFIX = "ocr:inflight:"
+    STATS_KEY = "ocr:inflight:stats"  # HASH: publish_skipped / process_skipped
+
+    def __init__(self, redis_client: Optional[Redis] = None, queued_ttl: int = 3600, running_ttl: int = 3600):
+        """
+        :param redis_client: Redis客户端，默认使用全局连接池
+        :param queued_ttl: 已发布未开始处理（含失败等待重试）的登记过期时间（秒），与broker的visibility_timeout一致
+        :param running_ttl: 处理租约过期时间（秒），应大于单个任务最长处理时间
+        """
+        self.redis = redis_client or Redis(connection_pool=get_redis_pool())
+        self.queued_ttl = queued_ttl
+        self.running_ttl = running_ttl
+        self._begin = self.redis.register_script(_BEGIN_SCRIPT)
+        self._release = self.redis.register_script(_RELEASE_SCRIPT)
+        self._requeue = self.redis.register_script(_REQUEUE_SCRIPT)
+
+    @classmethod
+    def from_config(
+        cls,
+        redis_client: Optional[Redis] = None,
+        visibility_timeout: Optional[int] = None
+    ) -> Optional["InFlightTaskRegistry"]:
+        """
+        按OCR配置创建登记表，未启用去重时返回None
+
+        :param visibility_timeout: Celery broker的visibility_timeout（秒），OCR_DEDUP_QUEUED_TTL为0时作为排队登记的过期时间
+        """
+        config = get_api_config().ocr
+        if not config.DEDUP_ENABLED:
+            return None
+        queued_ttl = config.DEDUP_QUEUED_TTL or visibility_timeout or config.DEDUP_RUNNING_TTL
+        return cls(redis_client, queued_ttl=queued_ttl, running_ttl=config.DEDUP_RUNNING_TTL)
+
+    def reserve_many(self, task_ids: List[str]) -> List[str]:
+        """
+        发布前批量登记任务（一次pipeline往返）
+
+        :return: 登记成功、需要发布的任务ID（已在途的任务ID被跳过并计数）
+        """
+        if not task_ids:
+            return []
+        pipe = self.redis.pipeline(transaction=False)
+        for task_id in task_ids:
+            pipe.set(f"{self.KEY_PREFIX}{task_id}", "queued", nx=True, ex=self.queued_ttl)
+        replies = pipe.execute()
+        reserved = [task_id for task_id, ok in zip(task_ids, replies) if ok]
+        skipped = len(task_ids) - len(reserved)
+        if skipped:
+            self.redis.hincrby(self.STATS_KEY, "publish_skipped", skipped)
+            logger.info(f"跳过{skipped}个已在途的重复任务")
+        return reserved
+
+    def unreserve_many(self, task_ids: List[str]) -> None:
+        """撤销发布失败任务的排队登记（仅删除仍处于queued状态的登记）"""
+        for task_id in task_ids:
+            self._release(keys=[f"{self.KEY_PREFIX}{task_id}"], args=["queued"])
+
+    def begin(self, task_id: str) -> Optional[str]:
+        """
+        处理前占用任务
+
+        :return: 占用令牌（释放时使用），已有副本在处理时返回None
+        """
+        token = uuid.uuid4().hex
+        if self._begin(keys=[f"{self.KEY_PREFIX}{task_id}"], args=[token, self.running_ttl]):
+            return token
+        self.redis.hincrby(self.STATS_KEY, "process_skipped", 1)
+        logger.warning(f"任务{task_id}已有副本在处理中，跳过本次处理")
+        return None
+
+    def release(self, task_id: str, token: str) -> None:
+        """处理成功或最终失败后释放占用（异常只记录日志，租约过期后自动回收）"""
+        try:
+            self._release(keys=[f"{self.KEY_PREFIX}{task_id}"], args=[f"running:{token}"])
+        except Exception as e:
+            logger.warning(f"释放任务{task_id}在途登记失败: {str(e)}")
+
+    def requeue(self, task_id: str, token: str) -> None:
+        """处理失败等待重试时转回排队登记（异常只记录日志，租约过期后自动回收）"""
+        try:
+            self._requeue(keys=[f"{self.KEY_PREFIX}{task_id}"], args=[f"running:{token}", self.queued_ttl])
+        except Exception as e:
+            logger.warning(f"任务{task_id}在途登记转回排队失败: {str(e)}")
+
+    def finish(self, task_id: str, token: Optional[str], success: bool, final_attempt: bool = True) -> None:
+        """处理结束：成功或最终失败时释放占用，失败且还会重试时转回排队"""
+        if token is None:
+            return
+        if success or final_attempt:
+            self.release(task_id, token)
+        else:
+            self.requeue(task_id, token)
+
+    def stats(self) -> Dict[str, int]:
+        """获取去重统计（发布时跳过、处理时跳过的重复任务数）"""
+        raw = self.redis.hgetall(self.STATS_KEY)
+        return {
+            "publish_skipped": int(raw.get("publish_skipped", 0)),
+            "process_skipped": int(raw.get("process_skipped", 0)),
+        }
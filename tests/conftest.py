@@ -1,8 +1,95 @@
 from pathlib import Path
+import os
 import sys
+import pytest
 
 # 将项目根目录添加到 Python 搜索路径
 project_root = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(project_root))
 
-print(f"项目根目录: {project_root} 已添加到 Python 搜索路径")
\ No newline at end of file
+print(f"项目根目录: {project_root} 已添加到 Python 搜索路径")
+
+# 测试环境的必填配置（未提供.env时使用占位值，不会实际连接MySQL或调用模型接口）
+for _key, _value in {
+    "DB_PASSWORD": "test",
+    "DB_DB_NAME": "test",
+    "DIFY_BASE_URL": "http://dify.test/v1",
+    "DIFY_API_KEY": "test",
+    "DIFY_OCR_BASE_URL": "http://files.test/",
+    "DASHSCOPE_BASE_URL": "http://dashscope.test/v1",
+    "DASHSCOPE_API_KEY": "test",
+    "CELERY_BROKER_POOL_LIMIT": "10",
+    "CELERY_FETCH_TASKS_ENABLED": "false",
+    "CELERY_FETCH_TASKS_INTERVAL": "15",
+    "CELERY_FETCH_TASKS_LIMIT": "100",
+    "CELERY_FETCH_TASKS_AI_STATUS": "-2",
+}.items():
+    os.environ.setdefault(_key, _value)
+
+
+@pytest.fixture
+def redis_client():
+    """
+    测试用Redis客户端（需支持Lua脚本）
+
+    安装了fakeredis（及lupa）时使用内存实现，否则连接 REDIS_HOST/REDIS_PORT 指定的Redis（测试前清空当前库），都不可用时跳过
+    """
+    try:
+        import fakeredis
+        client = fakeredis.FakeRedis(decode_responses=True)
+        client.eval("return 1", 0)
+    except Exception:
+        from redis import Redis
+        client = Redis(
+            host=os.environ.get("REDIS_HOST", "localhost"),
+            port=int(os.environ.get("REDIS_PORT", 6379)),
+            password=os.environ.get("REDIS_PASSWORD") or None,
+            db=int(os.environ.get("REDIS_TEST_DB", 15)),
+            decode_responses=True,
+        )
+        try:
+            client.ping()
+        except Exception:
+            pytest.skip("测试需要fakeredis[lua]或可连接的Redis")
+    client.flushdb()
+    yield client
+    client.flushdb()
+
+
+@pytest.fixture
+def db_session():
+    """测试用数据库会话（SQLite内存库，建立OCR记录表与电站表；SQLite忽略FOR UPDATE子句）"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker, Session
+    from src.models import OCRModel, PompPowerPlantBasic
+
+    engine = create_engine("sqlite://")
+    OCRModel.__table__.create(engine)
+    PompPowerPlantBasic.__table__.create(engine)
+    session = sessionmaker(bind=engine, autoflush=False, class_=Session)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+@pytest.fixture
+def add_ocr_records(db_session):
+    """写入OCR记录：按 id 顺序（默认从1开始）为每个ai_status创建一条记录"""
+    from src.models import OCRModel
+
+    def add(statuses, business_id="b1", start_id=1, is_delete=0):
+        records = [
+            OCRModel(
+                id=record_id, status=0, business_id=business_id, object_id=f"obj{record_id}",
+                url=f"/f/{record_id}.jpg", ai_status=ai_status, is_delete=is_delete,
+                creator="test", update_by="test"
+            )
+            for record_id, ai_status in enumerate(statuses, start=start_id)
+        ]
+        db_session.add_all(records)
+        db_session.commit()
+        return records
+
+    return add
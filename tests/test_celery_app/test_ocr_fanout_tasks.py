@@ -0,0 +1,36 @@
+from src.celery_app import ocr_fanout_tasks
+from src.celery_app.app import get_celery_config
+from src.tools.fetch_backpressure import FetchBackpressure
+from src.tools.task_dedup import InFlightTaskRegistry
+
+
+def test_fan_out_links_error_callback_to_aggregate(monkeypatch):
+    launched = {}
+
+    def fake_chord(header):
+        launched["header"] = header
+        return lambda body: launched.setdefault("body", body)
+
+    monkeypatch.setattr(ocr_fanout_tasks, "chord", fake_chord)
+    ocr_fanout_tasks.fan_out_record("1_a", ["a.pdf", "b.jpg"], "token")
+
+    assert [part.args for part in launched["header"]] == [("1_a", 0, "a.pdf"), ("1_a", 1, "b.jpg")], \
+        "每个URL应对应一个子任务"
+    errbacks = launched["body"].options.get("link_error", [])
+    assert [(errback["task"], tuple(errback["args"])) for errback in errbacks] == [
+        (ocr_fanout_tasks.ocr_record_failed.name, ("1_a", "token"))
+    ], "汇总任务应挂载错误回调，chord失败时释放在途登记"
+
+
+def test_error_callback_releases_token_and_marks_completed(redis_client, monkeypatch):
+    monkeypatch.setattr(ocr_fanout_tasks, "Redis", lambda connection_pool=None: redis_client)
+    monkeypatch.setattr(ocr_fanout_tasks, "get_redis_pool", lambda: None)
+    registry = InFlightTaskRegistry.from_config(redis_client)
+    token = registry.begin("1_a")
+    backpressure = FetchBackpressure.from_config(get_celery_config(), redis_client)
+    backpressure.mark_started("1_a")
+
+    ocr_fanout_tasks.ocr_record_failed(None, RuntimeError("part failed"), None, "1_a", token)
+
+    assert redis_client.get("ocr:inflight:1_a") is None, "chord失败后应释放在途登记"
+    assert backpressure.in_flight() == 0, "chord失败后应结束处理中登记"
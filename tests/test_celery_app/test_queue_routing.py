@@ -0,0 +1,56 @@
+import importlib
+
+from src.celery_app.app import CeleryConfig, queue_options
+from src.configs.config import OCRConfig
+from src.services.tasks.ocr_cert_task import OCRCertTask
+
+# src.celery_app 包导出了同名的Celery实例，按模块路径取配置所在模块
+app_module = importlib.import_module("src.celery_app.app")
+
+
+def test_classify_queue_by_url_type_and_pdf_count():
+    ocr_config = OCRConfig(QUEUE_LARGE_PDF_COUNT=3, QUEUE_SIZE_PROBE=False)
+
+    assert OCRCertTask.classify_queue(["a.jpg", "b.png"], ocr_config) == "ocr_image", "不含PDF时应归入图片队列"
+    assert OCRCertTask.classify_queue(["a.jpg", " b.PDF "], ocr_config) == "ocr_pdf", "含PDF时应归入PDF队列"
+    assert OCRCertTask.classify_queue(["a.pdf", "b.pdf", "c.pdf"], ocr_config) == "ocr_pdf_large", \
+        "PDF数量达到阈值时应归入大PDF队列"
+
+
+def test_classify_queue_by_probed_pdf_size(monkeypatch):
+    ocr_config = OCRConfig(QUEUE_LARGE_PDF_COUNT=10, QUEUE_SIZE_PROBE=True, QUEUE_LARGE_PDF_BYTES=100)
+    sizes = {"a.pdf": 60, "b.pdf": 50, "c.pdf": 10}
+    monkeypatch.setattr(OCRCertTask, "_probe_size", staticmethod(lambda url: sizes[url]))
+
+    assert OCRCertTask.classify_queue(["a.pdf", "b.pdf"], ocr_config) == "ocr_pdf_large", \
+        "PDF总大小达到阈值时应归入大PDF队列"
+    assert OCRCertTask.classify_queue(["a.pdf", "c.pdf"], ocr_config) == "ocr_pdf", "未达阈值时应归入PDF队列"
+
+
+def test_queue_options_follow_routing_switch(monkeypatch):
+    assert CeleryConfig.model_fields["CELERY_OCR_QUEUE_ROUTING"].default is False, "队列路由默认应关闭"
+
+    monkeypatch.setattr(app_module, "config", CeleryConfig(CELERY_OCR_QUEUE_ROUTING=False))
+    assert queue_options("ocr_pdf") == {}, "未开启队列路由时应走默认路由"
+
+    monkeypatch.setattr(app_module, "config", CeleryConfig(CELERY_OCR_QUEUE_ROUTING=True))
+    assert queue_options("ocr_pdf_large") == {"queue": "ocr_pdf_large", "time_limit": 3000, "soft_time_limit": 2700}, \
+        "应使用队列配置的执行时间限制，软超时为其90%"
+    assert queue_options(None) == {} and queue_options("unknown") == {}, "未分类或未配置的队列应走默认路由"
+
+
+def test_queue_worker_rejects_unknown_queue(monkeypatch):
+    import pytest
+    from src.celery_app import queue_worker
+
+    started = []
+    monkeypatch.setattr(queue_worker.app, "worker_main", lambda argv: started.append(argv))
+
+    for args in ([], ["ocr_unknown"], ["ocr_pdf", "ocr_image"]):
+        with pytest.raises(SystemExit) as exc_info:
+            queue_worker.main(args)
+        assert exc_info.value.code != 0, f"参数{args}无效时应以非零状态码退出"
+    assert started == [], "参数无效时不应启动Worker"
+
+    queue_worker.main(["ocr_pdf"])
+    assert "--queues=ocr_pdf" in started[0], "应启动指定队列的Worker"
@@ -0,0 +1,24 @@
+import importlib
+
+from src.celery_app.app import CeleryConfig, resolve_compression, resolve_serializer
+
+app_module = importlib.import_module("src.celery_app.app")
+
+
+def test_defaults_are_json_without_compression():
+    defaults = {name: field.default for name, field in CeleryConfig.model_fields.items()}
+
+    assert defaults["CELERY_TASK_SERIALIZER"] == "json", "任务默认使用json序列化"
+    assert defaults["CELERY_RESULT_SERIALIZER"] == "json", "结果默认使用json序列化"
+    assert defaults["CELERY_ACCEPT_CONTENT"] == ["json"], "默认只接收json"
+    assert defaults["CELERY_TASK_COMPRESSION"] is None, "任务消息默认不压缩"
+
+
+def test_optional_codecs_fall_back_when_not_installed(monkeypatch):
+    monkeypatch.setattr(app_module, "MSGPACK_AVAILABLE", False)
+    monkeypatch.setattr(app_module, "ZSTD_AVAILABLE", False)
+
+    assert resolve_serializer("msgpack") == "json", "未安装msgpack时应回退为json"
+    assert resolve_serializer("json") == "json", "json不受影响"
+    assert resolve_compression("zstd") == "zlib", "未安装zstandard时应回退为zlib"
+    assert resolve_compression("") is None and resolve_compression(None) is None, "空值表示不压缩"
@@ -0,0 +1,58 @@
+import json
+
+from src.celery_app import subscriber_tasks
+from src.celery_app.app import CeleryConfig
+from src.services.task_service import TaskService
+
+
+def test_dispatch_entries_dead_letters_failures_and_keeps_going(redis_client, monkeypatch):
+    config = CeleryConfig(CELERY_TASK_TRANSPORT="stream")
+    TaskService.ensure_stream_group(redis_client, config)
+    for payload in [json.dumps({"task_id": "1_1"}), "not json", json.dumps({"task_id": "2_1"}),
+                    json.dumps({"task_id": "3_1"})]:
+        TaskService.publish_payload(redis_client, payload, config)
+    entries = TaskService.read_stream_tasks(redis_client, "dispatcher-a", config)
+
+    dispatched = []
+
+    def fake_dispatch(task_data):
+        if task_data["task_id"] == "2_1":
+            raise RuntimeError("broker rejected")
+        dispatched.append(task_data["task_id"])
+
+    monkeypatch.setattr(subscriber_tasks, "dispatch_task", fake_dispatch)
+    subscriber_tasks._dispatch_entries(redis_client, entries, config)
+
+    assert dispatched == ["1_1", "3_1"], "单条投递失败不应影响后续条目"
+    dead = [fields for _, fields in redis_client.xrange(config.CELERY_TASK_STREAM_DEAD_LETTER)]
+    assert [fields["error"] for fields in dead] == ["invalid payload", "broker rejected"], \
+        "无法解析与投递失败的条目应转存死信"
+    stats = TaskService.stream_stats(redis_client)
+    assert stats["length"] == 0 and stats["pending"] == 0, "所有条目都应确认，不再反复接管"
+
+
+def test_redis_subscriber_only_starts_on_default_queue_worker(redis_client, monkeypatch):
+    started = []
+
+    class FakeThread:
+        def __init__(self, target=None, **kwargs):
+            started.append(target)
+
+        def start(self):
+            pass
+
+    def fake_redis_client():
+        yield redis_client
+
+    monkeypatch.setattr(subscriber_tasks, "get_redis_client", fake_redis_client)
+    monkeypatch.setattr(subscriber_tasks.threading, "Thread", FakeThread)
+    queues = subscriber_tasks.app.amqp.queues
+
+    monkeypatch.setattr(queues, "_consume_from", {"ocr_image": None})
+    subscriber_tasks.start_redis_subscriber()
+    assert started == [], "只消费OCR分类队列的Worker不应订阅任务频道"
+
+    monkeypatch.setattr(queues, "_consume_from", {subscriber_tasks.app.conf.task_default_queue: None})
+    subscriber_tasks.start_redis_subscriber()
+    assert len(started) == 1, "消费默认队列的Worker应订阅任务频道并投递任务"
+    assert redis_client.pubsub_numsub(CeleryConfig().CELERY_TASK_QUEUE_CHANNEL)[0][1] == 1, "应订阅一次任务频道"
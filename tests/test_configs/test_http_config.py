@@ -0,0 +1,34 @@
+from src.configs import http_config
+from src.configs.http_config import get_http_session, get_vlm_http_client
+
+
+def test_http_session_rebuilt_per_process(monkeypatch):
+    monkeypatch.setattr(http_config, "_session", None)
+    monkeypatch.setattr(http_config, "_vlm_client", None)
+    pid = [2000]
+    monkeypatch.setattr(http_config.os, "getpid", lambda: pid[0])
+
+    # 同一进程内下载与VLM调用分别复用同一个会话/客户端
+    session = get_http_session()
+    client = get_vlm_http_client()
+    assert get_http_session() is session, "同一进程应复用HTTP会话"
+    assert get_vlm_http_client() is client, "同一进程应复用VLM客户端"
+
+    # 按主机复用的连接池大小来自HTTP_*配置
+    adapter = session.get_adapter("https://files.test/")
+    assert adapter._pool_maxsize == http_config.ApiConfig().http.POOL_MAXSIZE, "连接池大小与配置不一致"
+
+    # pid变化（Celery prefork子进程）后重建，不复用父进程的socket
+    pid[0] = 2001
+    assert get_http_session() is not session, "pid变化后应重建HTTP会话"
+    assert get_vlm_http_client() is not client, "pid变化后应重建VLM客户端"
+
+
+def test_reset_after_fork_drops_inherited_session(monkeypatch):
+    monkeypatch.setattr(http_config, "_session", None)
+    session = get_http_session()
+
+    # fork钩子只丢弃引用、不关闭父进程仍在使用的连接
+    http_config._reset_after_fork()
+    assert http_config._session is None, "fork后应丢弃继承的会话"
+    assert get_http_session() is not session, "fork后应创建新的会话"
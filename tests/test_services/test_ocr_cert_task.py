@@ -0,0 +1,114 @@
+from src.services.tasks import ocr_cert_task
+from src.services.tasks.ocr_cert_task import OCRCertTask
+from src.tools.async_runner import run_async
+
+
+class FakeConverter:
+    """模拟PDF转换器：每个PDF产出固定的页面，内容为b"bad"的页面识别失败"""
+    image_format = "png"
+    timeout = 5
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    def new_page_filter(self):
+        return None
+
+    def _download_pdf(self, pdf_url):
+        return b"%PDF"
+
+    async def _adownload_pdf(self, pdf_url, client):
+        return b"%PDF"
+
+    def iter_pdf_pages(self, pdf_content, scale_factor=None, min_text_chars=0, page_filter=None):
+        for page_num, image in enumerate(self.pages):
+            yield {"page_num": page_num, "text": None, "image": image, "skipped": None}
+
+
+class FakeExtractor:
+    """模拟OCR提取器：返回页面内容，遇到b"bad"时抛出异常"""
+
+    def from_file(self, image_source, image_format="jpeg"):
+        content = image_source.read()
+        if content == b"bad":
+            raise RuntimeError("OCR提取失败: 模型返回格式错误")
+        return {"page": content.decode()}
+
+    async def afrom_file(self, image_source, image_format="jpeg"):
+        return self.from_file(image_source, image_format)
+
+
+def _stub(monkeypatch, pages):
+    extractor = FakeExtractor()
+    monkeypatch.setattr(OCRCertTask, "_build_pdf_converter", staticmethod(lambda **kwargs: FakeConverter(pages)))
+    monkeypatch.setattr(ocr_cert_task.OCRCertInfoExtractor, "get_instance", classmethod(lambda cls, *a, **k: extractor))
+
+
+def test_failed_page_handled_the_same_in_sync_and_async_modes(monkeypatch):
+    _stub(monkeypatch, [b"p1", b"bad", b"p3"])
+    pdf_urls = ["http://files.test/a.pdf", "http://files.test/b.pdf"]
+
+    sync_results = OCRCertTask("1_B1", {"urls": pdf_urls}).pdf_urls_to_ocr_results(pdf_urls, window=2)
+    async_results = run_async(OCRCertTask("1_B1", {"urls": pdf_urls}).aurls_to_ocr_results(pdf_urls, [], window=2))
+
+    # 识别失败的页面在两种模式下都被丢弃，其余页面按PDF与页码顺序返回
+    expected = [{"page": "p1"}, {"page": "p3"}] * 2
+    assert sync_results == expected, "同步模式结果不正确"
+    assert async_results == expected, "异步模式与同步模式结果不一致"
+    assert not any("error" in result for result in async_results), "异步模式不应记录单页错误"
+
+
+class WindowProbe:
+    """记录已渲染未识别完成的页数峰值"""
+
+    def __init__(self):
+        self.rendered = 0
+        self.completed = 0
+        self.peak = 0
+
+
+def _stub_window(monkeypatch, page_count):
+    import time
+    import threading
+    probe = WindowProbe()
+    lock = threading.Lock()
+
+    class ProbeConverter(FakeConverter):
+        def iter_pdf_pages(self, pdf_content, scale_factor=None, min_text_chars=0, page_filter=None):
+            for page_num in range(page_count):
+                with lock:
+                    probe.rendered += 1
+                    probe.peak = max(probe.peak, probe.rendered - probe.completed)
+                yield {"page_num": page_num, "text": None, "image": f"p{page_num}".encode(), "skipped": None}
+
+    class SlowExtractor(FakeExtractor):
+        def from_file(self, image_source, image_format="jpeg"):
+            time.sleep(0.01)
+            result = super().from_file(image_source, image_format)
+            with lock:
+                probe.completed += 1
+            return result
+
+    extractor = SlowExtractor()
+    monkeypatch.setattr(OCRCertTask, "_build_pdf_converter", staticmethod(lambda **kwargs: ProbeConverter([])))
+    monkeypatch.setattr(ocr_cert_task.OCRCertInfoExtractor, "get_instance", classmethod(lambda cls, *a, **k: extractor))
+    return probe
+
+
+def test_page_stream_respects_in_flight_window(monkeypatch):
+    pdf_urls = ["http://files.test/a.pdf"]
+
+    # 同步模式：4个识别线程，窗口为3，渲染领先识别的页数不超过窗口
+    probe = _stub_window(monkeypatch, 12)
+    results = OCRCertTask("1_B1", {"urls": pdf_urls}).pdf_urls_to_ocr_results(pdf_urls, workers=4, window=3)
+    assert [r["page"] for r in results] == [f"p{i}" for i in range(12)], "同步模式页序不正确"
+    assert probe.peak <= 3, f"同步模式在途页数超过窗口: {probe.peak}"
+
+    # 异步模式：并发预算大于窗口时仍受窗口限制
+    probe = _stub_window(monkeypatch, 12)
+    results = run_async(OCRCertTask("1_B1", {"urls": pdf_urls}).aurls_to_ocr_results(
+        pdf_urls, [], concurrency=8, window=3
+    ))
+    assert [r["page"] for r in results] == [f"p{i}" for i in range(12)], "异步模式页序不正确"
+    assert probe.peak <= 3, f"异步模式在途页数超过窗口: {probe.peak}"
+    assert probe.peak > 1, "异步模式应并行识别窗口内的页面"
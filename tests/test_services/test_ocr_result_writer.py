@@ -0,0 +1,134 @@
+import json
+import time
+from sqlalchemy.orm import sessionmaker
+from src.models import OCRModel
+from src.services.ocr_service import OCRService
+from src.services.ocr_result_writer import OCRResultWriteBuffer
+from src.tools.task_dedup import InFlightTaskRegistry
+from src.tools.fetch_backpressure import FetchBackpressure
+
+
+def _buffer(monkeypatch, redis_client, db_session, max_attempts=5):
+    buffer = OCRResultWriteBuffer(
+        sessionmaker(bind=db_session.get_bind()),
+        redis_client,
+        max_attempts=max_attempts,
+        registry=InFlightTaskRegistry(redis_client),
+        backpressure=FetchBackpressure(redis_client)
+    )
+    # 测试中不启动后台线程，由用例显式回写
+    monkeypatch.setattr(buffer, "_ensure_thread", lambda: None)
+    return buffer
+
+
+def _submit(buffer, record_id):
+    """模拟任务处理：占用在途登记、登记开始处理后提交结果"""
+    task_id = f"{record_id}_b1"
+    token = buffer.registry.begin(task_id)
+    buffer.backpressure.mark_started(task_id)
+    buffer.submit(record_id, task_id, [{"url": "", "content": {"id": record_id}}], 1, token)
+    return task_id, token
+
+
+def _ai_status(db_session, record_id):
+    db_session.expire_all()
+    return db_session.get(OCRModel, record_id).ai_status
+
+
+def _fail_for(monkeypatch, record_ids):
+    """回写包含指定记录的批次时抛出异常"""
+    original = OCRService.bulk_update_ai_results
+
+    def bulk_update(results, db):
+        if any(row["id"] in record_ids for row in results):
+            raise RuntimeError("db error")
+        return original(results, db)
+
+    monkeypatch.setattr(OCRService, "bulk_update_ai_results", staticmethod(bulk_update))
+
+
+def test_flush_releases_token_after_results_are_written(monkeypatch, redis_client, db_session, add_ocr_records):
+    add_ocr_records([0, 0])
+    buffer = _buffer(monkeypatch, redis_client, db_session)
+    task_id, token = _submit(buffer, 1)
+    _submit(buffer, 2)
+
+    assert redis_client.get(f"ocr:inflight:{task_id}") == f"running:{token}", "结果落库前不应释放在途登记"
+    assert redis_client.zscore(FetchBackpressure.RUNNING_KEY, task_id) is not None, "结果落库前任务应仍处于处理中"
+
+    assert buffer.flush() == 2, "应回写全部结果"
+    assert [_ai_status(db_session, 1), _ai_status(db_session, 2)] == [1, 1], "结果应写入数据库"
+    assert redis_client.get(f"ocr:inflight:{task_id}") is None, "落库后应释放在途登记"
+    assert redis_client.zcard(FetchBackpressure.RUNNING_KEY) == 0, "落库后应结束处理中登记"
+    assert redis_client.hlen(OCRResultWriteBuffer.JOURNAL_KEY) == 0, "落库后应删除日志条目"
+
+
+def test_flush_failure_keeps_results_and_token(monkeypatch, redis_client, db_session, add_ocr_records):
+    add_ocr_records([0])
+    buffer = _buffer(monkeypatch, redis_client, db_session)
+    task_id, token = _submit(buffer, 1)
+    failing = {1}
+    _fail_for(monkeypatch, failing)
+
+    assert buffer.flush() == 0, "回写失败时不应计为已回写"
+    assert _ai_status(db_session, 1) == 0, "回写失败时数据库不应变化"
+    assert redis_client.get(f"ocr:inflight:{task_id}") == f"running:{token}", "回写失败时不应释放在途登记"
+    assert json.loads(redis_client.hget(OCRResultWriteBuffer.JOURNAL_KEY, "1"))["attempts"] == 1, "日志应记录失败次数"
+    assert buffer.flush() == 0, "退避时间内不应重试"
+
+    failing.clear()
+    assert buffer.flush(force=True) == 1, "恢复后应重试回写"
+    assert _ai_status(db_session, 1) == 1, "重试后结果应写入数据库"
+    assert redis_client.get(f"ocr:inflight:{task_id}") is None, "重试成功后应释放在途登记"
+    assert buffer.stats()["flush_failures"] == 1, "应统计回写失败次数"
+
+
+def test_partial_batch_failure_dead_letters_poison_row(monkeypatch, redis_client, db_session, add_ocr_records):
+    add_ocr_records([0, 0, 0])
+    buffer = _buffer(monkeypatch, redis_client, db_session, max_attempts=2)
+    task_ids = [_submit(buffer, record_id)[0] for record_id in (1, 2, 3)]
+    _fail_for(monkeypatch, {2})
+
+    assert buffer.flush() == 2, "批量回写失败时应逐条回写其余结果"
+    assert [_ai_status(db_session, record_id) for record_id in (1, 2, 3)] == [1, 0, 1], "只有出错的记录未回写"
+    assert redis_client.get(f"ocr:inflight:{task_ids[0]}") is None, "已落库的结果应释放在途登记"
+    assert redis_client.get(f"ocr:inflight:{task_ids[1]}") is not None, "待重试的结果应保留在途登记"
+
+    assert buffer.flush(force=True) == 0, "出错的记录仍回写失败"
+    dead = json.loads(redis_client.hget(OCRResultWriteBuffer.DEAD_LETTER_KEY, "2"))
+    assert dead["attempts"] == 1 and dead["error"] == "db error", "重试耗尽的结果应转入死信并记录错误"
+    assert redis_client.hlen(OCRResultWriteBuffer.JOURNAL_KEY) == 0, "转入死信后应删除日志条目"
+    assert redis_client.get(f"ocr:inflight:{task_ids[1]}") is None, "转入死信后应释放在途登记"
+    assert buffer.flush(force=True) == 0 and not buffer._pending, "转入死信的结果不再重试"
+    stats = buffer.stats()
+    assert stats["dead_lettered"] == 1 and stats["dead_letter_pending"] == 1, "应统计死信条数"
+
+
+def test_bulk_update_skips_missing_records(db_session, add_ocr_records):
+    add_ocr_records([0])
+    rows = [
+        {"id": record_id, "ai_task_id": f"{record_id}_b1", "ai_status": 1, "ai_content": "[]"}
+        for record_id in (1, 99)
+    ]
+
+    assert OCRService.bulk_update_ai_results(rows, db_session) == 1, "不存在的记录应跳过而不是整批失败"
+    assert _ai_status(db_session, 1) == 1, "存在的记录应正常回写"
+
+
+def test_replay_journal_writes_stale_entries_only(monkeypatch, redis_client, db_session, add_ocr_records):
+    add_ocr_records([0, 0])
+    registry = InFlightTaskRegistry(redis_client)
+    token = registry.begin("1_b1")
+    now = time.time()
+    for record_id, queued_at, entry_token in ((1, now - 120, token), (2, now, None)):
+        redis_client.hset(OCRResultWriteBuffer.JOURNAL_KEY, str(record_id), json.dumps({
+            "id": record_id, "ai_task_id": f"{record_id}_b1", "ai_status": 1, "ai_content": "[]",
+            "token": entry_token, "attempts": 0, "queued_at": queued_at,
+        }))
+    buffer = _buffer(monkeypatch, redis_client, db_session)
+
+    assert buffer.replay_journal(60) == 1, "只补写等待超过指定时间的条目"
+    assert [_ai_status(db_session, 1), _ai_status(db_session, 2)] == [1, 0], "Worker仍可能回写的新条目不应补写"
+    assert redis_client.hkeys(OCRResultWriteBuffer.JOURNAL_KEY) == ["2"], "补写后应删除对应日志条目"
+    assert redis_client.get("ocr:inflight:1_b1") is None, "补写后应释放遗留的在途登记"
+    assert buffer.stats()["replayed_rows"] == 1, "应统计补写条数"
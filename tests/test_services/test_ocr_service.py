@@ -0,0 +1,281 @@
+import asyncio
+
+from src.models import OCRModel
+from src.services.ocr_service import OCRService
+from src.tools.record_cursor import RecordScanCursor
+
+
+def test_scan_ocr_records_wraps_around_table_end(db_session, add_ocr_records, redis_client):
+    add_ocr_records([0] * 10)
+    cursor = RecordScanCursor("test", redis_client=redis_client, range_size=3)
+    cursor.set(7)
+
+    records = asyncio.run(OCRService.scan_ocr_records(5, db_session, cursor, ai_status=0))
+
+    assert [record.id for record in records] == [8, 9, 10, 1, 2], "到达表尾后应从表头继续扫描"
+    assert cursor.get() == 2, "游标应停在本轮最后一条记录处"
+
+
+def test_scan_ocr_records_stops_after_one_full_lap(db_session, add_ocr_records, redis_client):
+    add_ocr_records([1, 1, 1, 1, 0, 1, 1, 1, 1, 1])
+    cursor = RecordScanCursor("test", redis_client=redis_client, range_size=3)
+    cursor.set(6)
+
+    records = asyncio.run(OCRService.scan_ocr_records(5, db_session, cursor, ai_status=0))
+
+    assert [record.id for record in records] == [5], "环绕一整圈后应停止，每条记录只返回一次"
+    assert cursor.get() == 6, "扫描满一圈后游标回到起点"
+
+
+def test_scan_ocr_records_restarts_when_cursor_past_table_end(db_session, add_ocr_records, redis_client):
+    add_ocr_records([0] * 4)
+    cursor = RecordScanCursor("test", redis_client=redis_client, range_size=3)
+    cursor.set(100)
+
+    records = asyncio.run(OCRService.scan_ocr_records(2, db_session, cursor, ai_status=0))
+
+    assert [record.id for record in records] == [1, 2], "游标超出最大id时应从头扫描"
+    assert cursor.get() == 2, "游标应推进到本轮最后一条记录"
+
+
+def _claim_mode(monkeypatch, enabled: bool):
+    from src.celery_app.app import CeleryConfig
+    monkeypatch.setattr(
+        "src.services.ocr_service.get_celery_config", lambda: CeleryConfig(CELERY_FETCH_CLAIM=enabled)
+    )
+
+
+def test_claim_ocr_records_skips_active_leases(db_session, add_ocr_records, monkeypatch):
+    _claim_mode(monkeypatch, True)
+    add_ocr_records([0, 0, 1, 0, -1])
+
+    first = asyncio.run(OCRService.claim_ocr_records(2, db_session, owner="a", lease_seconds=600))
+    second = asyncio.run(OCRService.claim_ocr_records(5, db_session, owner="b", lease_seconds=600))
+
+    assert [record.id for record in first] == [1, 2], "应按id顺序领取未完成的记录"
+    assert [record.id for record in second] == [4, 5], "租约未到期的记录不应被重复领取"
+    assert all(record.ai_status == 2 and record.ai_lease_owner == "a" for record in first), "领取后应置为处理中并写入租约"
+    assert asyncio.run(OCRService.claim_ocr_records(5, db_session, owner="c", lease_seconds=600)) == [], \
+        "全部记录都在租约内时应领取不到记录"
+
+    partitioned = asyncio.run(OCRService.claim_ocr_records(
+        5, db_session, owner="d", lease_seconds=600, ai_status=1, partitions=2, partition=1
+    ))
+    assert [record.id for record in partitioned] == [3], "应只领取本分区（id取模）的记录"
+
+
+def test_release_and_reclaim_expired_leases(db_session, add_ocr_records, monkeypatch):
+    _claim_mode(monkeypatch, True)
+    add_ocr_records([0, 0, 0])
+    asyncio.run(OCRService.claim_ocr_records(2, db_session, owner="a", lease_seconds=600))
+    asyncio.run(OCRService.claim_ocr_records(1, db_session, owner="b", lease_seconds=-1))
+
+    assert asyncio.run(OCRService.release_ocr_claims([1], db_session)) == 1, "应释放未能发布的记录"
+    assert asyncio.run(OCRService.reclaim_expired_ocr_leases(db_session)) == 1, "应只回收租约已到期的记录"
+
+    db_session.expire_all()
+    records = {record.id: record for record in db_session.query(OCRModel).all()}
+    assert (records[1].ai_status, records[1].ai_lease_owner) == (0, None), "释放后应重置为未处理并清除租约"
+    assert (records[2].ai_status, records[2].ai_lease_owner) == (2, "a"), "租约未到期的记录不应被回收"
+    assert (records[3].ai_status, records[3].ai_lease_until) == (0, None), "租约到期的记录应重置为未处理"
+
+
+def test_non_claim_mode_does_not_touch_lease_columns(db_session, add_ocr_records, monkeypatch):
+    """未执行租约迁移的库（无租约列）在未启用领取时仍可查询与回写"""
+    _claim_mode(monkeypatch, False)
+    add_ocr_records([0, 0, 0])
+    connection = db_session.connection()
+    connection.exec_driver_sql("DROP INDEX idx_ai_status_lease")
+    connection.exec_driver_sql("ALTER TABLE t_gec_file_ocr_record DROP COLUMN ai_lease_owner")
+    connection.exec_driver_sql("ALTER TABLE t_gec_file_ocr_record DROP COLUMN ai_lease_until")
+    db_session.commit()
+
+    records = asyncio.run(OCRService.fetch_ocr_records(10, db_session))
+    assert [record.id for record in records] == [1, 2, 3], "查询不应访问租约列"
+    OCRService.update_ai_result(1, "1_b1", [], 1, db_session)
+    OCRService.bulk_update_ai_results(
+        [{"id": 2, "ai_task_id": "2_b1", "ai_status": -1, "ai_content": "[]"}], db_session
+    )
+    asyncio.run(OCRService.reset_ai_status(db_session, business_ids=["b1"], chunk_size=2))
+
+    db_session.expire_all()
+    assert [record.ai_status for record in db_session.query(OCRModel).order_by(OCRModel.id)] == [0, 0, 0], \
+        "回写与重置不应访问租约列"
+
+
+def test_reset_ai_status_updates_in_keyset_chunks(db_session, add_ocr_records, monkeypatch):
+    _claim_mode(monkeypatch, False)
+    add_ocr_records([1, -1, 1, 2, 1])
+    add_ocr_records([1], business_id="b2", start_id=6)
+    add_ocr_records([1], start_id=7, is_delete=1)
+    chunks = []
+
+    async def on_chunk(rows):
+        chunks.append([(row.id, row.url) for row in rows])
+
+    result = asyncio.run(OCRService.reset_ai_status(db_session, business_ids=["b1"], chunk_size=2, on_chunk=on_chunk))
+
+    assert result == {"matched": 5, "updated": 5, "chunks": 3}, "应按块重置全部匹配的记录"
+    assert [[record_id for record_id, _ in chunk] for chunk in chunks] == [[1, 2], [3, 4], [5]], \
+        "应按id升序分块，每块提交后回调该块的记录"
+    assert chunks[0][0][1] == "/f/1.jpg", "回调的行应包含发布所需的url"
+    db_session.expire_all()
+    statuses = {record.id: record.ai_status for record in db_session.query(OCRModel).all()}
+    assert statuses == {1: 0, 2: 0, 3: 0, 4: 0, 5: 0, 6: 1, 7: 1}, "只重置指定业务下未删除的记录"
+
+
+def test_reset_ai_status_by_company_ids(db_session, add_ocr_records, monkeypatch):
+    from src.models import PompPowerPlantBasic
+
+    _claim_mode(monkeypatch, False)
+    db_session.add_all([
+        PompPowerPlantBasic(id="p1", power_number="b1", company_id=10, company_name="c10", province="32"),
+        PompPowerPlantBasic(id="p2", power_number="b2", company_id=20, company_name="c20", province="33"),
+    ])
+    add_ocr_records([1, 1])
+    add_ocr_records([1], business_id="b2", start_id=3)
+
+    result = asyncio.run(OCRService.reset_ai_status(db_session, company_ids=["10"], chunk_size=1))
+
+    assert (result["updated"], result["chunks"]) == (2, 2), "应通过电站表关联公司下的业务记录"
+    db_session.expire_all()
+    assert [record.ai_status for record in db_session.query(OCRModel).order_by(OCRModel.id)] == [0, 0, 1], \
+        "其他公司的记录不应重置"
+
+
+def _add_statistics_fixture(db_session, add_ocr_records):
+    """两家公司、两个省份的电站；b3同时关联两家公司，b4没有电站，含已删除与ai_status为空的记录"""
+    from src.models import PompPowerPlantBasic
+
+    db_session.add_all([
+        PompPowerPlantBasic(id="p1", power_number="b1", company_id=10, company_name="c10", province="32"),
+        PompPowerPlantBasic(id="p2", power_number="b2", company_id=10, company_name="c10", province="33"),
+        PompPowerPlantBasic(id="p3", power_number="b3", company_id=10, company_name="c10", province="32"),
+        PompPowerPlantBasic(id="p4", power_number="b3", company_id=20, company_name="c20", province="33"),
+    ])
+    add_ocr_records([-1, 0, 1, 1, 2, None], business_id="b1", start_id=1)
+    add_ocr_records([0, 2], business_id="b2", start_id=7)
+    add_ocr_records([1, 1, -1], business_id="b3", start_id=9)
+    add_ocr_records([0, 1], business_id="b4", start_id=12)
+    add_ocr_records([1, 2], business_id="b2", start_id=14, is_delete=1)
+
+
+def _per_status_counts(db_session, company_ids=None, province_ids=None):
+    """原实现：关联查询出全部记录后逐条计数（按关联行计数，作为SQL聚合结果的对照）"""
+    from src.models import PompPowerPlantBasic
+
+    query = db_session.query(OCRModel).join(
+        PompPowerPlantBasic, OCRModel.business_id == PompPowerPlantBasic.power_number
+    ).filter(OCRModel.is_delete == 0)
+    if company_ids:
+        query = query.filter(PompPowerPlantBasic.company_id.in_(company_ids))
+    if province_ids:
+        query = query.filter(PompPowerPlantBasic.province.in_(province_ids))
+    status_counts = {-1: 0, 0: 0, 1: 0, 2: 0}
+    business_ids = set()
+    for record in db_session.execute(query.statement).scalars().all():
+        status = record.ai_status or 0
+        status_counts[status] += 1
+        business_ids.add(record.business_id)
+    return {
+        "ai_status_neg_1_count": status_counts[-1],
+        "ai_status_0_count": status_counts[0],
+        "ai_status_1_count": status_counts[1],
+        "ai_status_2_count": status_counts[2],
+        "total_power_plants": len(business_ids),
+    }
+
+
+def test_statistics_aggregation_matches_per_status_counts(db_session, add_ocr_records):
+    _add_statistics_fixture(db_session, add_ocr_records)
+
+    for company_ids, province_ids in (([10], None), ([20], None), ([10, 20], None), (None, ["32"]),
+                                      (None, ["32", "33"]), ([10], ["33"]), ([30], None)):
+        statistics = asyncio.run(OCRService.get_ai_status_statistics(
+            company_ids, province_ids, db_session, use_counters=False
+        ))
+        assert statistics.pop("source") == "database", "未启用计数时应在数据库中聚合"
+        assert statistics == _per_status_counts(db_session, company_ids, province_ids), \
+            f"公司{company_ids}、省份{province_ids}的SQL聚合结果应与逐条计数一致"
+
+
+def test_statistics_breakdowns_match_per_group_counts(db_session, add_ocr_records):
+    _add_statistics_fixture(db_session, add_ocr_records)
+
+    statistics = asyncio.run(OCRService.get_ai_status_statistics(
+        [10, 20], None, db_session, breakdowns=["company", "province"], use_counters=False
+    ))
+
+    assert [group["key"] for group in statistics["by_company"]] == ["10", "20"], "应按公司分组"
+    for group in statistics["by_company"]:
+        expected = _per_status_counts(db_session, company_ids=[int(group.pop("key"))])
+        assert group == expected, "各公司的分布应与按该公司逐条计数一致"
+    assert [group["key"] for group in statistics["by_province"]] == ["32", "33"], "应按省份分组"
+    for group in statistics["by_province"]:
+        expected = _per_status_counts(db_session, company_ids=[10, 20], province_ids=[group.pop("key")])
+        assert group == expected, "各省份的分布应与按该省份逐条计数一致"
+
+
+def test_reconciled_counters_match_database_statistics(db_session, add_ocr_records, redis_client):
+    from src.tools.status_counters import OCRStatusCounters
+
+    _add_statistics_fixture(db_session, add_ocr_records)
+    counters = OCRStatusCounters(redis_client)
+
+    summary = asyncio.run(OCRService.reconcile_status_counters(db_session, counters))
+
+    assert (summary["businesses"], summary["companies"], summary["provinces"]) == (4, 2, 2), "对账摘要应包含各维度数量"
+    for company_ids, province_ids in (([10], None), ([10, 20], None), (None, ["32", "33"]), ([10, 20], ["33"])):
+        expected = asyncio.run(OCRService.get_ai_status_statistics(
+            company_ids, province_ids, db_session, breakdowns=["company", "province"], use_counters=False
+        ))
+        expected.pop("source")
+        assert counters.statistics(company_ids, province_ids, ["company", "province"]) == expected, \
+            f"公司{company_ids}、省份{province_ids}的计数应与数据库聚合一致"
+
+
+def _add_plants(db_session):
+    from src.models import PompPowerPlantBasic
+
+    db_session.add_all([
+        PompPowerPlantBasic(id="p1", power_number="b1", company_id=10, company_name="c10", province="32"),
+        PompPowerPlantBasic(id="p2", power_number="b2", company_id=20, company_name="c20", province="33"),
+        PompPowerPlantBasic(id="p3", power_number="b2", company_id=30, company_name="c30", province="33"),
+    ])
+    db_session.commit()
+
+
+def test_resolve_by_business_ids_returns_companies_without_pending_records(db_session, add_ocr_records):
+    _add_plants(db_session)
+    add_ocr_records([0, 1], business_id="b1")
+    add_ocr_records([1], business_id="b2", start_id=3)
+    add_ocr_records([0], business_id="b9", start_id=4)
+
+    records, business_ids, company_ids = asyncio.run(
+        OCRService.resolve_ocr_records(db_session, business_ids=["b1", "b2", "b9"])
+    )
+
+    assert sorted(record.id for record in records) == [1, 4], "只返回待处理记录（含没有电站的业务）"
+    assert sorted(business_ids) == ["b1", "b9"], "业务ID为有待处理记录的业务"
+    assert sorted(company_ids) == ["10", "20", "30"], "公司ID应包含没有待处理记录的业务关联的公司"
+    assert sorted(company_ids) == sorted(set(asyncio.run(
+        OCRService.fetch_company_ids_by_business_ids(["b1", "b2", "b9"], db_session)
+    ))), "公司ID应与按业务ID直接查询电站表一致"
+
+
+def test_resolve_by_company_ids_and_fetched_records(db_session, add_ocr_records):
+    _add_plants(db_session)
+    add_ocr_records([0, 1], business_id="b1")
+    add_ocr_records([0, 0], business_id="b2", start_id=3)
+
+    records, business_ids, company_ids = asyncio.run(
+        OCRService.resolve_ocr_records(db_session, company_ids=["10", "30"])
+    )
+    assert sorted(record.id for record in records) == [1, 3, 4], "多条电站记录关联同一业务时记录不重复"
+    assert sorted(business_ids) == ["b1", "b2"] and sorted(company_ids) == ["10", "30"], "应返回关联的业务ID与公司ID"
+
+    fetched = asyncio.run(OCRService.fetch_ocr_records(10, db_session))
+    records, business_ids, company_ids = asyncio.run(OCRService.resolve_ocr_records(db_session, records=fetched))
+    assert records == fetched, "已获取的记录应原样返回"
+    assert sorted(business_ids) == ["b1", "b2"] and sorted(company_ids) == ["10", "20", "30"], \
+        "应通过关联查询补全已获取记录的业务ID与公司ID"
@@ -0,0 +1,206 @@
+import json
+import asyncio
+
+from src.celery_app.app import CeleryConfig
+from src.services.task_service import TaskService
+from src.services.tasks.base_task import DataProcessingTask
+from src.tools.task_dedup import InFlightTaskRegistry
+
+
+def _stream_config(**overrides) -> CeleryConfig:
+    return CeleryConfig(CELERY_TASK_TRANSPORT="stream", CELERY_TASK_STREAM_CLAIM_IDLE_MS=0, **overrides)
+
+
+def _subscribe(redis_client, config: CeleryConfig):
+    """订阅任务频道（pubsub模式没有订阅者时发布视为失败）"""
+    pubsub = redis_client.pubsub()
+    pubsub.subscribe(config.CELERY_TASK_QUEUE_CHANNEL)
+    return pubsub
+
+
+def _tasks(count: int):
+    return [TaskService.create_task(DataProcessingTask.task_type, {"n": i}, task_id=f"{i}_1") for i in range(count)]
+
+
+def test_stream_publish_read_and_ack(redis_client, monkeypatch):
+    config = _stream_config()
+    monkeypatch.setattr("src.services.task_service.get_celery_config", lambda: config)
+    TaskService.ensure_stream_group(redis_client, config)
+
+    result = TaskService.publish_tasks_bulk(_tasks(5), redis_client, chunk_size=2)
+    assert result["published"] == 5 and result["failed"] == 0, "全部任务应发布成功"
+    assert [chunk["size"] for chunk in result["chunks"]] == [2, 2, 1], "应按块发布"
+    assert redis_client.xlen(config.CELERY_TASK_STREAM) == 5, "任务应写入Stream"
+
+    entries = TaskService.read_stream_tasks(redis_client, "dispatcher-a", config)
+    assert [json.loads(fields["data"])["task_id"] for _, fields in entries] == [f"{i}_1" for i in range(5)], \
+        "应按发布顺序读取任务条目"
+    assert TaskService.stream_stats(redis_client)["pending"] == 5, "读取后未确认的条目应处于待确认状态"
+
+    TaskService.ack_stream_tasks(redis_client, [entry_id for entry_id, _ in entries], config)
+    stats = TaskService.stream_stats(redis_client)
+    assert stats["length"] == 0 and stats["pending"] == 0, "确认后的条目应从Stream删除"
+
+
+def test_claim_stale_entries_from_other_dispatcher(redis_client):
+    config = _stream_config()
+    TaskService.ensure_stream_group(redis_client, config)
+    for i in range(3):
+        TaskService.publish_payload(redis_client, json.dumps({"i": i}), config)
+    read = TaskService.read_stream_tasks(redis_client, "dispatcher-a", config)
+    # 条目被另一分发器删除后，接管时跳过
+    redis_client.xdel(config.CELERY_TASK_STREAM, read[0][0])
+
+    claimed = TaskService.claim_stale_stream_tasks(redis_client, "dispatcher-b", config)
+    assert [entry_id for entry_id, _ in claimed] == [entry_id for entry_id, _ in read[1:]], \
+        "应接管其他分发器未确认的条目并跳过已删除的条目"
+    consumers = {c["name"]: c["pending"] for c in TaskService.stream_stats(redis_client)["consumers"]}
+    assert consumers.get("dispatcher-b") == 2, "接管的条目应归属新的分发器"
+
+
+def test_dead_letter_acks_original_entries(redis_client):
+    config = _stream_config()
+    TaskService.ensure_stream_group(redis_client, config)
+    TaskService.publish_payload(redis_client, "payload", config)
+    (entry_id, fields), = TaskService.read_stream_tasks(redis_client, "dispatcher-a", config)
+
+    TaskService.dead_letter_stream_tasks(redis_client, [(entry_id, fields, "boom")], config)
+    (_, dead), = redis_client.xrange(config.CELERY_TASK_STREAM_DEAD_LETTER)
+    assert dead == {"entry_id": entry_id, "data": "payload", "error": "boom"}, "死信条目应保留原始消息与错误"
+    assert redis_client.xlen(config.CELERY_TASK_STREAM) == 0, "转存死信后原条目应确认并删除"
+
+
+class _FlakyPipeline:
+    """按块模拟pipeline：指定序号的块连接失败，指定任务的命令单条失败"""
+
+    def __init__(self, client, state, fail_chunks, fail_payload_ids):
+        self.client, self.state = client, state
+        self.fail_chunks, self.fail_payload_ids = fail_chunks, fail_payload_ids
+        self.payloads = []
+
+    def publish(self, channel, payload):
+        self.payloads.append(payload)
+
+    def execute(self, raise_on_error=True):
+        index = self.state["chunks"]
+        self.state["chunks"] += 1
+        if index in self.fail_chunks:
+            raise ConnectionError("connection reset")
+        replies = []
+        for payload in self.payloads:
+            if json.loads(payload)["task_id"] in self.fail_payload_ids:
+                replies.append(RuntimeError("OOM command not allowed"))
+            else:
+                replies.append(self.client.publish(CeleryConfig().CELERY_TASK_QUEUE_CHANNEL, payload))
+        return replies
+
+
+def test_bulk_publish_reports_failed_and_skipped_ids_per_chunk(redis_client, monkeypatch):
+    config = CeleryConfig(CELERY_TASK_TRANSPORT="pubsub")
+    monkeypatch.setattr("src.services.task_service.get_celery_config", lambda: config)
+    subscriber = _subscribe(redis_client, config)  # 保持引用，测试期间持续订阅
+    state = {"chunks": 0}
+
+    class FlakyClient:
+        def pipeline(self, transaction=False):
+            return _FlakyPipeline(redis_client, state, fail_chunks={1}, fail_payload_ids={"5_1"})
+
+    registry = InFlightTaskRegistry(redis_client)
+    registry.reserve_many(["0_1"])  # 已在途
+
+    tasks = _tasks(7) + _tasks(1)  # 末尾重复一个0_1
+    result = TaskService.publish_tasks_bulk(tasks, FlakyClient(), chunk_size=2, registry=registry)
+
+    assert result["skipped_task_ids"] == ["0_1", "0_1"], "已在途与批内重复的任务应跳过"
+    assert result["task_ids"] == ["1_1", "2_1", "6_1"], "成功的块与块内成功的任务应计入发布"
+    assert result["failed_task_ids"] == ["3_1", "4_1", "5_1"], "连接失败的整块与单条失败的任务应计入失败"
+    assert (result["published"], result["failed"]) == (3, 3), "发布数与失败数应与任务ID列表一致"
+    assert [(chunk["index"], chunk["size"], chunk["published"], bool(chunk["error"])) for chunk in result["chunks"]] == [
+        (0, 2, 2, False), (1, 2, 0, True), (2, 2, 1, True)
+    ], "应按块报告发布数与错误"
+    assert redis_client.get("ocr:inflight:3_1") is None and redis_client.get("ocr:inflight:5_1") is None, \
+        "发布失败的任务应撤销在途登记，下次可重新发布"
+    assert redis_client.get("ocr:inflight:1_1") == "queued", "发布成功的任务应保持在途登记"
+
+
+class _FailingPublishClient:
+    """转发到真实Redis客户端；包含指定任务的发布pipeline执行时抛出连接错误"""
+
+    def __init__(self, client, fail_task_ids):
+        self._client, self._fail_task_ids = client, fail_task_ids
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def pipeline(self, transaction=False):
+        client, fail_task_ids = self._client, self._fail_task_ids
+
+        class Pipeline:
+            def __init__(self):
+                self._pipe, self._task_ids = client.pipeline(transaction=transaction), set()
+
+            def __getattr__(self, name):
+                return getattr(self._pipe, name)
+
+            def publish(self, channel, payload):
+                self._task_ids.add(json.loads(payload)["task_id"])
+                return self._pipe.publish(channel, payload)
+
+            def execute(self, raise_on_error=True):
+                if self._task_ids & fail_task_ids:
+                    raise ConnectionError("connection reset")
+                return self._pipe.execute(raise_on_error=raise_on_error)
+
+        return Pipeline()
+
+
+def test_reset_and_republish_publishes_each_chunk(db_session, add_ocr_records, redis_client, monkeypatch):
+    from src.models import OCRModel
+
+    config = CeleryConfig(CELERY_TASK_TRANSPORT="pubsub", CELERY_FETCH_CLAIM=True)
+    monkeypatch.setattr("src.services.task_service.get_celery_config", lambda: config)
+    monkeypatch.setattr("src.services.ocr_service.get_celery_config", lambda: config)
+    monkeypatch.setenv("OCR_RESET_CHUNK_SIZE", "2")
+    add_ocr_records([1, 1, -1, 1, 1])
+    subscriber = _subscribe(redis_client, config)  # 保持引用，测试期间持续订阅
+    client = _FailingPublishClient(redis_client, fail_task_ids={"3_b1"})
+
+    result = asyncio.run(TaskService.reset_and_republish_ocr_records(db_session, client, True, business_ids=["b1"]))
+
+    assert result == {"updated": 5, "chunks": 3, "published": 3, "publish_failed": 2}, \
+        "应按块重新发布，发布失败的整块计入失败数"
+    db_session.expire_all()
+    records = {record.id: record for record in db_session.query(OCRModel).all()}
+    assert [records[i].ai_status for i in range(1, 6)] == [2, 2, 0, 0, 2], \
+        "领取模式下已发布的记录置为处理中，发布失败的记录释放为未处理"
+    assert records[1].ai_lease_owner.startswith("reset:"), "重新发布的记录应写入重置实例的租约"
+    assert redis_client.get("ocr:inflight:1_b1") == "queued", "已发布的任务应登记在途"
+    assert redis_client.get("ocr:inflight:3_b1") is None, "发布失败的任务应撤销在途登记"
+
+
+def test_reset_without_publish_only_resets(db_session, add_ocr_records, redis_client, monkeypatch):
+    monkeypatch.setattr("src.services.ocr_service.get_celery_config", lambda: CeleryConfig())
+    add_ocr_records([1, 1, 1])
+
+    result = asyncio.run(TaskService.reset_and_republish_ocr_records(db_session, redis_client, False, business_ids=["b1"]))
+
+    assert result == {"updated": 3, "chunks": 1}, "不发布时只返回重置结果"
+    assert redis_client.keys("ocr:inflight:*") == [], "不发布时不应登记在途任务"
+
+
+def test_pubsub_publish_without_subscriber_releases_reservation(redis_client, monkeypatch):
+    config = CeleryConfig(CELERY_TASK_TRANSPORT="pubsub")
+    monkeypatch.setattr("src.services.task_service.get_celery_config", lambda: config)
+    registry = InFlightTaskRegistry(redis_client, queued_ttl=3600, running_ttl=120)
+
+    result = TaskService.publish_tasks_bulk(_tasks(2), redis_client, registry=registry)
+
+    assert result["published"] == 0 and result["failed_task_ids"] == ["0_1", "1_1"], "没有订阅者时消息被丢弃，应计为发布失败"
+    assert result["chunks"][0]["error"], "应记录失败原因"
+    assert registry.reserve_many(["0_1", "1_1"]) == ["0_1", "1_1"], "发布失败的任务应撤销登记，可重新发布"
+
+    pubsub = _subscribe(redis_client, config)
+    registry.unreserve_many(["0_1", "1_1"])
+    result = TaskService.publish_tasks_bulk(_tasks(2), redis_client, registry=registry)
+    assert result["task_ids"] == ["0_1", "1_1"] and not result["failed_task_ids"], "有订阅者时应发布成功"
+    pubsub.close()
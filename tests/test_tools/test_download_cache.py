@@ -0,0 +1,62 @@
+import os
+import time
+from src.tools.download_cache import DownloadCache
+
+
+def test_store_and_lookup_with_validators(tmp_path):
+    # 创建临时缓存目录
+    cache = DownloadCache(str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    url = "https://xuntian-pv.tcl.com/group1/M00/2C/72/test.pdf"
+
+    # 未缓存时返回空
+    content, meta = cache.lookup(url)
+    assert content is None and meta is None, "未缓存的URL不应返回内容"
+
+    # 写入带ETag的副本后可读出
+    cache.store(url, b"%PDF-1.7 test", etag='"abc"', last_modified="Wed, 01 Jan 2025 00:00:00 GMT")
+    content, meta = cache.lookup(url)
+    assert content == b"%PDF-1.7 test", "缓存内容不匹配"
+
+    # 条件请求头包含ETag与Last-Modified
+    headers = DownloadCache.conditional_headers(meta)
+    assert headers["If-None-Match"] == '"abc"', "缺少If-None-Match请求头"
+    assert headers["If-Modified-Since"] == "Wed, 01 Jan 2025 00:00:00 GMT", "缺少If-Modified-Since请求头"
+
+
+def test_skip_store_without_validators(tmp_path):
+    cache = DownloadCache(str(tmp_path / "cache"))
+    url = "https://example.com/no-validators.pdf"
+
+    # 无ETag/Last-Modified的响应无法重新验证，不应缓存
+    cache.store(url, b"content")
+    assert cache.lookup(url) == (None, None), "无验证信息的响应不应被缓存"
+    assert DownloadCache.conditional_headers(None) == {}, "无元数据时不应生成条件请求头"
+
+
+def test_inconsistent_meta_is_treated_as_miss(tmp_path):
+    cache = DownloadCache(str(tmp_path / "cache"))
+    url = "https://example.com/race.pdf"
+    cache.store(url, b"version-1", etag='"v1"')
+
+    # 模拟并发写入导致数据文件与元数据版本不一致
+    data_path, _ = cache._paths(url)
+    data_path.write_bytes(b"version-2-longer")
+    assert cache.lookup(url) == (None, None), "数据与元数据大小不一致时应视为未缓存"
+
+
+def test_lru_eviction_by_total_size(tmp_path):
+    cache = DownloadCache(str(tmp_path / "cache"), max_bytes=25)
+    urls = [f"https://example.com/{i}.pdf" for i in range(3)]
+
+    # 依次写入并拉开mtime，第一个文件随后被访问（touch）
+    for i, url in enumerate(urls[:2]):
+        cache.store(url, b"x" * 10, etag=f'"{i}"')
+        data_path, _ = cache._paths(url)
+        os.utime(data_path, (time.time() - 100 + i, time.time() - 100 + i))
+    cache.touch(urls[0])
+
+    # 写入第三个文件后总大小30 > 25，应淘汰最久未使用的第二个文件
+    cache.store(urls[2], b"x" * 10, etag='"2"')
+    assert cache.lookup(urls[0])[0] is not None, "最近访问的文件不应被淘汰"
+    assert cache.lookup(urls[1]) == (None, None), "最久未使用的文件应被淘汰"
+    assert cache.lookup(urls[2])[0] is not None, "新写入的文件不应被淘汰"
@@ -0,0 +1,30 @@
+import time
+
+from src.celery_app.app import CeleryConfig
+from src.tools.fetch_backpressure import FetchBackpressure
+
+
+def test_from_config_uses_caller_config(redis_client):
+    config = CeleryConfig(CELERY_FETCH_TARGET_BACKLOG=7, CELERY_FETCH_HIGH_WATER=9, CELERY_FETCH_RATE_WINDOW=120)
+    backpressure = FetchBackpressure.from_config(config, redis_client)
+
+    assert (backpressure.target_backlog, backpressure.high_water, backpressure.rate_window) == (7, 9, 120), \
+        "应使用调用方传入的配置"
+
+
+def test_only_successful_completions_count_towards_rate(redis_client, monkeypatch):
+    backpressure = FetchBackpressure(redis_client, rate_window=60)
+    now = [1_000_000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    for task_id in ["1_a", "2_a", "3_a"]:
+        backpressure.mark_started(task_id)
+    assert backpressure.in_flight() == 3, "开始处理的任务应计入处理中"
+
+    backpressure.mark_completed("1_a")
+    backpressure.mark_completed("2_a", success=False)
+    backpressure.mark_completed("3_a", success=False)
+    assert backpressure.in_flight() == 0, "成功与失败的任务都应结束处理中登记"
+
+    # 完成速率按完整分钟统计，推进到下一分钟后读取
+    now[0] += 60
+    assert backpressure.completion_rate() == 1 / 60, "只有成功完成的任务计入完成速率"
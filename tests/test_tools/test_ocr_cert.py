@@ -0,0 +1,33 @@
+import threading
+import time
+
+from src.configs import get_api_config
+from src.tools.ocr_cert import OCRCertInfoExtractor
+
+
+def test_from_urls_max_workers_is_per_call(monkeypatch):
+    extractor = OCRCertInfoExtractor.get_instance()
+    shared_workers = extractor.max_workers
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def fake_from_url(url):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        return {"url": url}
+
+    monkeypatch.setattr(extractor, "from_url", fake_from_url)
+    urls = [f"http://files.test/{i}.jpg" for i in range(6)]
+    results = extractor.from_urls(urls, max_workers=1)
+
+    assert results == [{"url": url} for url in urls], "结果应与输入URL顺序对应"
+    assert peak[0] == 1, "本次调用应按传入的max_workers并发"
+    assert extractor.max_workers == shared_workers, "按调用传入的线程数不应修改共享实例"
+
+
+def test_api_config_cached_per_process():
+    assert get_api_config() is get_api_config(), "全局配置应在进程内复用"
@@ -0,0 +1,30 @@
+import fitz
+from src.tools.page_encoder import PageEncoder
+
+
+def test_large_page_scaled_to_pixel_budget():
+    # 创建一页大幅面（A0级别）与一页普通尺寸的PDF
+    doc = fitz.open()
+    doc.new_page(width=2384, height=3370)
+    doc.new_page(width=595, height=842)
+    large, small = doc.load_page(0), doc.load_page(1)
+    encoder = PageEncoder(scale_factor=2.0, max_pixels=28 * 28 * 8192, image_format="jpeg")
+
+    # 大幅面页面按预算降低倍率，普通页面保持固定倍率
+    assert encoder.page_scale(large) < 2.0, "大幅面页面应降低渲染倍率"
+    assert encoder.page_scale(small) == 2.0, "普通页面应使用固定倍率"
+
+    pix = fitz.Pixmap(encoder.render(large))
+    assert pix.width * pix.height <= 28 * 28 * 8192, "渲染像素数不应超过预算"
+
+
+def test_encode_stats_accumulate():
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "test")
+    encoder = PageEncoder(scale_factor=1.0, image_format="jpg")
+
+    # jpg 归一化为 jpeg，统计累计页数与字节节省
+    assert encoder.image_format == "jpeg", "jpg应归一化为jpeg"
+    encoder.render(doc.load_page(0))
+    assert encoder.stats["pages"] == 1, "页数统计不正确"
+    assert PageEncoder.bytes_saved(encoder.stats) > 0, "编码后字节数应小于未压缩像素"
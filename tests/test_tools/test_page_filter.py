@@ -0,0 +1,37 @@
+import fitz
+from src.tools.page_filter import PageFilter
+
+
+def _render_pages(contents, scales):
+    # 按给定内容生成同一模板的证件页（空内容为空白页），并以不同倍率渲染为JPEG
+    doc = fitz.open()
+    for lines in contents:
+        page = doc.new_page()
+        if lines:
+            page.draw_rect(fitz.Rect(40, 40, 555, 800), color=(0, 0, 0), width=2)
+        for i, line in enumerate(lines):
+            page.insert_text((80, 120 + 40 * i), line, fontname="china-s", fontsize=16)
+    return [
+        doc.load_page(i).get_pixmap(matrix=fitz.Matrix(scale, scale)).tobytes(output="jpeg")
+        for i, scale in enumerate(scales)
+    ]
+
+
+def test_blank_and_duplicate_pages_are_dropped():
+    cert_a = ("备案证明", "项目编号 2024-0001", "企业名称 深圳某某新能源有限公司", "地址 南山区科技园")
+    cert_b = ("备案证明", "项目编号 2025-9876", "企业名称 广州另一家光伏科技公司", "地址 天河区珠江新城")
+    images = _render_pages([cert_a, cert_b, (), cert_a], [2.0, 2.0, 2.0, 1.7])
+    page_filter = PageFilter()
+
+    decisions = [page_filter.check(i, image) for i, image in enumerate(images)]
+
+    # 同一模板、内容不同的证件页应保留
+    assert decisions[0] is None and decisions[1] is None, "内容不同的证件页不应被过滤"
+    assert decisions[2]["reason"] == "blank", "空白页应被过滤"
+    assert decisions[3]["reason"] == "duplicate", "以不同倍率重复出现的页面应被过滤"
+    assert decisions[3]["duplicate_of"] == 0, "重复页应指向首次出现的页码"
+
+    # 摘要中记录全部页数与被丢弃页面的判定
+    summary = page_filter.summary()
+    assert summary["pages"] == 4, "摘要页数不正确"
+    assert [d["page_num"] for d in summary["dropped"]] == [2, 3], "摘要中的丢弃页不正确"
@@ -0,0 +1,53 @@
+from src.tools import pdf_render_pool
+from src.tools.pdf_render_pool import get_render_executor
+
+
+def test_render_executor_rebuilt_per_process(monkeypatch):
+    monkeypatch.setattr(pdf_render_pool, "_executor", None)
+    pid = [1000]
+    monkeypatch.setattr(pdf_render_pool.os, "getpid", lambda: pid[0])
+    executors = []
+    try:
+        # 同一进程内复用同一个进程池
+        first = get_render_executor(2)
+        executors.append(first)
+        assert get_render_executor(2) is first, "同一进程应复用渲染进程池"
+
+        # fork后的子进程（pid变化）重建进程池，不使用继承自父进程的实例
+        pid[0] = 1001
+        child = get_render_executor(2)
+        executors.append(child)
+        assert child is not first, "pid变化后应重建渲染进程池"
+
+        # 进程数配置变化时同样重建
+        resized = get_render_executor(3)
+        executors.append(resized)
+        assert resized is not child, "进程数变化后应重建渲染进程池"
+    finally:
+        for executor in executors:
+            executor.shutdown(wait=False)
+
+
+def test_process_renderer_matches_in_process_render(monkeypatch):
+    import fitz
+    from src.tools.page_encoder import PageEncoder
+    from src.tools.pdf_render_pool import ProcessPoolPdfRenderer
+
+    doc = fitz.open()
+    for i in range(5):
+        doc.new_page().insert_text((72, 72), f"page {i}")
+    pdf_content = doc.tobytes()
+
+    expected = [PageEncoder(1.0, None, "png").render(page) for page in fitz.open(stream=pdf_content, filetype="pdf")]
+    monkeypatch.setattr(pdf_render_pool, "_executor", None)
+    renderer = ProcessPoolPdfRenderer(processes=2, pages_per_task=2)
+    encoder = PageEncoder(1.0, None, "png")
+    try:
+        pages = list(renderer.iter_page_images(pdf_content, encoder))
+    finally:
+        pdf_render_pool._executor.shutdown()
+        monkeypatch.setattr(pdf_render_pool, "_executor", None)
+
+    # 多进程渲染按页序产出，内容与进程内渲染一致，编码统计合并回父进程的编码器
+    assert pages == expected, "多进程渲染结果与进程内渲染不一致"
+    assert encoder.stats["pages"] == 5, "渲染进程的编码统计未合并"
@@ -0,0 +1,70 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src.tools.rate_limiter import ModelRateLimiter, is_throttled_error
+
+
+class FakeThrottleError(Exception):
+    """模拟模型服务返回的HTTP 429"""
+    status_code = 429
+
+
+class FakeModelAPI:
+    """本地模拟的模型接口：同时处理的请求数超过容量时返回429"""
+
+    def __init__(self, capacity: int, latency: float = 0.01):
+        self.capacity = capacity
+        self.latency = latency
+        self.in_flight = 0
+        self.peak = 0
+        self.throttled = 0
+        self.lock = threading.Lock()
+
+    def call(self):
+        with self.lock:
+            if self.in_flight >= self.capacity:
+                self.throttled += 1
+                raise FakeThrottleError("Too Many Requests")
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            time.sleep(self.latency)
+            return {"ok": True}
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+def test_token_bucket_limits_request_rate():
+    # 突发容量5，之后每秒50个请求：15次调用至少需要约0.2秒
+    limiter = ModelRateLimiter("test-rate", rate=50, burst=5, max_concurrency=100, backend="local")
+    start = time.monotonic()
+    for _ in range(15):
+        with limiter.slot():
+            pass
+    assert time.monotonic() - start >= 0.18, "令牌桶未限制请求速率"
+
+
+def test_aimd_backs_off_on_throttling():
+    # 模拟接口只能同时处理3个请求，限流器初始并发上限为12
+    api = FakeModelAPI(capacity=3)
+    limiter = ModelRateLimiter(
+        "test-aimd", rate=1000, burst=1000, max_concurrency=12, min_concurrency=1, cooldown=0.02, backend="local"
+    )
+
+    def call_with_retry():
+        while True:
+            try:
+                with limiter.slot():
+                    return api.call()
+            except FakeThrottleError as e:
+                assert is_throttled_error(e), "429异常应被识别为限流"
+
+    with ThreadPoolExecutor(max_workers=12) as executor:
+        results = list(executor.map(lambda _: call_with_retry(), range(120)))
+
+    # 全部调用最终成功，429触发并发上限乘性下调
+    assert all(result == {"ok": True} for result in results), "存在未完成的调用"
+    assert api.throttled > 0, "模拟接口应出现限流"
+    assert limiter.stats()["limit"] < 12, "遇到429后并发上限应下调"
+    assert limiter.stats()["in_flight"] == 0, "调用结束后应归还全部租约"
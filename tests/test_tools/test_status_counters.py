@@ -0,0 +1,63 @@
+from src.tools.status_counters import OCRStatusCounters
+
+
+def _snapshot(neg_1=0, pending=2, done=1, processing=0):
+    """b1（公司10、省份32）的数据库快照"""
+    counts = (neg_1, pending, done, processing, 1)
+    return dict(
+        plant_rows=[("b1", 10, "32")],
+        business_rows=[("b1", *counts)],
+        company_rows=[(10, *counts)],
+        province_rows=[("32", *counts)],
+        cp_rows=[(10, "32", *counts)],
+        member_rows=[("b1", 10, "32")],
+    )
+
+
+def _company_counts(counters):
+    statistics = counters.statistics(company_ids=[10])
+    return statistics["ai_status_0_count"], statistics["ai_status_1_count"]
+
+
+def test_apply_is_ignored_before_first_reconcile(redis_client):
+    counters = OCRStatusCounters(redis_client)
+
+    counters.apply([("b1", 0, 1)])
+
+    assert not counters.ready(), "未对账前计数不可用"
+    assert redis_client.keys("ocr:status:*") == [], "未对账前不应写入不完整的计数"
+
+
+def test_reconcile_replays_deltas_recorded_during_rebuild(redis_client):
+    counters = OCRStatusCounters(redis_client)
+    counters.reconcile(counters.begin_reconcile(), **_snapshot())
+    assert _company_counts(counters) == (2, 1), "对账后应读取到快照计数"
+
+    generation = counters.begin_reconcile()
+    # 快照读取之后提交的状态变更：当前代立即生效，同时记入增量日志
+    counters.apply([("b1", 0, 1)])
+    assert _company_counts(counters) == (1, 2), "重建期间当前代仍应实时更新"
+    summary = counters.reconcile(generation, **_snapshot())
+
+    assert summary["replayed_deltas"] == 2, "切换时应补记重建期间的增量"
+    assert _company_counts(counters) == (1, 2), "新一代应包含重建期间的状态变更"
+    assert redis_client.hgetall(f"ocr:status:g{generation}:business:b1")["1"] == "2", "业务计数也应补记"
+    assert redis_client.keys("ocr:status:g1:*") == [], "切换后应删除旧代的键"
+    assert not redis_client.exists(OCRStatusCounters.BUILDING_KEY, OCRStatusCounters.DELTAS_KEY), \
+        "切换后应停止记录增量日志"
+
+    counters.apply([("b1", 0, 1)])
+    assert _company_counts(counters) == (0, 3), "切换后的增量应累加到新一代"
+
+
+def test_superseded_reconcile_is_discarded(redis_client):
+    counters = OCRStatusCounters(redis_client)
+    first = counters.begin_reconcile()
+    second = counters.begin_reconcile()
+
+    assert counters.reconcile(first, **_snapshot()) == {"generation": first, "superseded": 1}, \
+        "已有更新的对账开始时应放弃本次结果"
+    assert not counters.ready() and redis_client.keys(f"ocr:status:g{first}:*") == [], "被放弃的代不应生效且应删除"
+
+    counters.reconcile(second, **_snapshot(pending=1, done=2))
+    assert _company_counts(counters) == (1, 2), "更新的对账应正常切换"
@@ -0,0 +1,56 @@
+from src.tools.task_dedup import InFlightTaskRegistry
+
+
+def _registry(redis_client):
+    return InFlightTaskRegistry(redis_client, queued_ttl=600, running_ttl=120)
+
+
+def test_reserve_many_skips_in_flight_tasks(redis_client):
+    registry = _registry(redis_client)
+
+    assert registry.reserve_many(["1_a", "2_a"]) == ["1_a", "2_a"], "未登记的任务应全部登记"
+    assert registry.reserve_many(["2_a", "3_a"]) == ["3_a"], "已在途的任务不应重复登记"
+    assert redis_client.get("ocr:inflight:3_a") == "queued", "登记状态应为queued"
+    assert 0 < redis_client.ttl("ocr:inflight:3_a") <= 600, "排队登记应带过期时间"
+    assert registry.stats()["publish_skipped"] == 1, "应统计发布时跳过的任务数"
+
+    registry.unreserve_many(["3_a"])
+    assert redis_client.get("ocr:inflight:3_a") is None, "发布失败的任务应撤销登记"
+
+
+def test_begin_and_release_lua_scripts(redis_client):
+    registry = _registry(redis_client)
+    registry.reserve_many(["1_a"])
+
+    token = registry.begin("1_a")
+    assert token is not None, "queued状态的任务应能占用"
+    assert redis_client.get("ocr:inflight:1_a") == f"running:{token}", "占用后应切换为running"
+    assert 0 < redis_client.ttl("ocr:inflight:1_a") <= 120, "处理租约应带过期时间"
+    assert registry.begin("1_a") is None, "已有副本在处理时应跳过"
+    assert registry.stats()["process_skipped"] == 1, "应统计处理时跳过的任务数"
+
+    registry.release("1_a", "other-token")
+    assert redis_client.get("ocr:inflight:1_a") == f"running:{token}", "不应释放其他副本持有的租约"
+    registry.release("1_a", token)
+    assert redis_client.get("ocr:inflight:1_a") is None, "持有者应能释放租约"
+    assert registry.begin("2_a") is not None, "未登记的任务也应能直接占用"
+
+
+def test_finish_requeues_until_final_attempt(redis_client):
+    registry = _registry(redis_client)
+    token = registry.begin("1_a")
+
+    # 失败且还会重试：转回排队，期间不会被重复发布，重试时可重新占用
+    registry.finish("1_a", token, success=False, final_attempt=False)
+    assert redis_client.get("ocr:inflight:1_a") == "queued", "等待重试时应转回queued"
+    assert 120 < redis_client.ttl("ocr:inflight:1_a") <= 600, "转回排队后应使用排队登记的过期时间"
+    assert registry.reserve_many(["1_a"]) == [], "等待重试的任务不应被重复发布"
+
+    retry_token = registry.begin("1_a")
+    assert retry_token is not None, "重试时应能重新占用"
+    registry.finish("1_a", token, success=False, final_attempt=False)
+    assert redis_client.get("ocr:inflight:1_a") == f"running:{retry_token}", "过期令牌不应改动新的租约"
+
+    # 最终失败：释放登记，下次拉取可重新发布
+    registry.finish("1_a", retry_token, success=False, final_attempt=True)
+    assert redis_client.get("ocr:inflight:1_a") is None, "最终失败后应释放登记"